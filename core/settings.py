@@ -4,8 +4,6 @@ import os
 from pathlib import Path
 
 import environ
-import sentry_sdk
-from sentry_sdk.integrations.django import DjangoIntegration
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -27,6 +25,10 @@ CSRF_TRUSTED_ORIGINS = env.list("DJANGO_CSRF_TRUSTED_ORIGINS", default=[])
 
 sentry_dsn = env("SENTRY_DSN", default=None)
 if sentry_dsn:
+    # Imported lazily: the SDK and its integrations add noticeably to boot time.
+    import sentry_sdk
+    from sentry_sdk.integrations.django import DjangoIntegration
+
     sentry_sdk.init(
         dsn=sentry_dsn,
         integrations=[DjangoIntegration()],
@@ -53,11 +55,13 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "crm.compression.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
+    "crm.profiling.ProfilingMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
@@ -147,15 +151,156 @@ EMAIL_BACKEND = env(
 DEFAULT_FROM_EMAIL = env("DJANGO_DEFAULT_FROM_EMAIL", default="noreply@clientescrm.local")
 
 REST_FRAMEWORK = {
-    "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
+    "DEFAULT_RENDERER_CLASSES": [
+        "crm.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "crm.renderers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
+    "DEFAULT_FILTER_BACKENDS": [
+        "django_filters.rest_framework.DjangoFilterBackend",
+        "rest_framework.filters.OrderingFilter",
+    ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
+        "crm.authentication.SignedTokenAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ],
 }
 
+CACHES = {"default": env.cache("CACHE_URL", default="locmemcache://")}
+
+# Sessions (crm.sessions skips writing back unchanged ones). SESSION_BACKEND is "db",
+# "cached_db" (cache in front of the table), "cache" or "signed_cookies" (no server
+# state, so a logout cannot revoke a copied cookie). Cache-backed sessions need a cache
+# shared by every worker, or a logout only clears the cache of the worker that served
+# it; the default is therefore "cached_db" only when CACHE_URL is not per-process.
+# Flash messages live in their own signed cookie and never touch the session.
+SESSION_BACKEND = env(
+    "SESSION_BACKEND",
+    default="db" if CACHES["default"]["BACKEND"].endswith("LocMemCache") else "cached_db",
+)
+SESSION_BASE_ENGINE = f"django.contrib.sessions.backends.{SESSION_BACKEND}"
+SESSION_ENGINE = "crm.sessions"
+SESSION_CACHE_ALIAS = env("SESSION_CACHE_ALIAS", default="default")
+MESSAGE_STORAGE = "django.contrib.messages.storage.cookie.CookieStorage"
+
+# Versioned fragment caching of lead cards and client rows (crm.fragments). Bump
+# FRAGMENT_CACHE_VERSION when a cached template changes to drop the old fragments.
+FRAGMENT_CACHE_ENABLED = env.bool("FRAGMENT_CACHE_ENABLED", default=True)
+FRAGMENT_CACHE_ALIAS = env("FRAGMENT_CACHE_ALIAS", default="default")
+FRAGMENT_CACHE_TIMEOUT = env.int("FRAGMENT_CACHE_TIMEOUT", default=24 * 3600)
+FRAGMENT_CACHE_VERSION = env("FRAGMENT_CACHE_VERSION", default="1")
+FRAGMENT_METRICS_FLUSH_SECONDS = env.float("FRAGMENT_METRICS_FLUSH_SECONDS", default=10.0)
+
+# ``API_TOKEN_KEYS=2026b=<secret>,2026a=<old secret>``: tokens are signed with the
+# active key and verified with any listed key, so keys can be rotated.
+API_TOKEN_KEYS = env.dict("API_TOKEN_KEYS", default={}) or {"default": SECRET_KEY}
+API_TOKEN_ACTIVE_KEY = env("API_TOKEN_ACTIVE_KEY", default=next(iter(API_TOKEN_KEYS)))
+API_TOKEN_TTL = env.int("API_TOKEN_TTL", default=3600)
+API_TOKEN_MAX_TTL = env.int("API_TOKEN_MAX_TTL", default=30 * 24 * 3600)
+
+COMPRESSION_MIN_SIZE = env.int("COMPRESSION_MIN_SIZE", default=500)
+COMPRESSION_GZIP_LEVEL = env.int("COMPRESSION_GZIP_LEVEL", default=6)
+COMPRESSION_BROTLI_QUALITY = env.int("COMPRESSION_BROTLI_QUALITY", default=4)
+LEAD_EXPORT_CHUNK_SIZE = env.int("LEAD_EXPORT_CHUNK_SIZE", default=2000)
+
+INTERACTION_INGEST_MAX_BATCH = env.int("INTERACTION_INGEST_MAX_BATCH", default=5000)
+INTERACTION_INGEST_CHUNK_SIZE = env.int("INTERACTION_INGEST_CHUNK_SIZE", default=1000)
+
+AUTOCOMPLETE_LIMIT = env.int("AUTOCOMPLETE_LIMIT", default=20)
+AUTOCOMPLETE_MIN_CHARS = env.int("AUTOCOMPLETE_MIN_CHARS", default=2)
+# Substring matches need the pg_trgm index from migration 0008; enable it only where
+# that migration could create it (it warns and skips the index otherwise).
+AUTOCOMPLETE_TRIGRAM = env.bool("AUTOCOMPLETE_TRIGRAM", default=False)
+
+# Bulk reassignment of a rep's book: rows per transaction, and how long a chunk may
+# wait for a row lock (PostgreSQL) before it gives up and the job retries.
+REASSIGN_CHUNK_SIZE = env.int("REASSIGN_CHUNK_SIZE", default=500)
+REASSIGN_LOCK_TIMEOUT_MS = env.int("REASSIGN_LOCK_TIMEOUT_MS", default=2000)
+
+# Background purge of deleted clients (crm.deletion): rows per transaction, the pause
+# between chunks that lets replicas catch up, and the row-lock wait (PostgreSQL).
+CLIENT_PURGE_CHUNK_SIZE = env.int("CLIENT_PURGE_CHUNK_SIZE", default=500)
+CLIENT_PURGE_PAUSE = env.float("CLIENT_PURGE_PAUSE", default=0.2)
+CLIENT_PURGE_LOCK_TIMEOUT_MS = env.int("CLIENT_PURGE_LOCK_TIMEOUT_MS", default=2000)
+
+# Automatic assignment of new leads without a rep (crm.assignment). A rep's load is
+# open leads / capacity plus ASSIGNMENT_VALUE_WEIGHT per ASSIGNMENT_VALUE_UNIT of open
+# pipeline; reps in the client's industry count ASSIGNMENT_INDUSTRY_BONUS less. Each
+# process re-reads the loads every ASSIGNMENT_REFRESH_SECONDS. Only reps given a
+# Profile.lead_capacity in the admin are picked.
+ASSIGNMENT_AUTO = env.bool("ASSIGNMENT_AUTO", default=True)
+ASSIGNMENT_VALUE_WEIGHT = env.float("ASSIGNMENT_VALUE_WEIGHT", default=0.5)
+ASSIGNMENT_VALUE_UNIT = env.float("ASSIGNMENT_VALUE_UNIT", default=100_000.0)
+ASSIGNMENT_INDUSTRY_BONUS = env.float("ASSIGNMENT_INDUSTRY_BONUS", default=0.25)
+ASSIGNMENT_REFRESH_SECONDS = env.float("ASSIGNMENT_REFRESH_SECONDS", default=30.0)
+ASSIGNMENT_CHUNK_SIZE = env.int("ASSIGNMENT_CHUNK_SIZE", default=500)
+ASSIGNMENT_MAX_BATCH = env.int("ASSIGNMENT_MAX_BATCH", default=1000)
+
+# Per-worker columnar snapshot of the leads behind the dashboard numbers (crm.snapshot):
+# checked for changes every LEAD_SNAPSHOT_REFRESH_SECONDS, re-read from the database
+# watermarks minus LEAD_SNAPSHOT_OVERLAP_SECONDS, and rebuilt in full hourly.
+LEAD_SNAPSHOT_ENABLED = env.bool("LEAD_SNAPSHOT_ENABLED", default=False)
+LEAD_SNAPSHOT_REFRESH_SECONDS = env.float("LEAD_SNAPSHOT_REFRESH_SECONDS", default=5.0)
+LEAD_SNAPSHOT_OVERLAP_SECONDS = env.int("LEAD_SNAPSHOT_OVERLAP_SECONDS", default=30)
+LEAD_SNAPSHOT_FULL_RELOAD_SECONDS = env.int("LEAD_SNAPSHOT_FULL_RELOAD_SECONDS", default=3600)
+LEAD_SNAPSHOT_LOAD_CHUNK = env.int("LEAD_SNAPSHOT_LOAD_CHUNK", default=50_000)
+
+# Change feed (``/api/<resource>/changes/``): rows newer than the settle horizon wait
+# for the next call so slow transactions are not skipped; tombstones of deleted rows
+# are kept for TOMBSTONE_RETENTION_DAYS, and older cursors must resync from scratch.
+CHANGE_FEED_PAGE_SIZE = env.int("CHANGE_FEED_PAGE_SIZE", default=500)
+CHANGE_FEED_MAX_PAGE_SIZE = env.int("CHANGE_FEED_MAX_PAGE_SIZE", default=2000)
+CHANGE_FEED_SETTLE_SECONDS = env.int("CHANGE_FEED_SETTLE_SECONDS", default=30)
+TOMBSTONE_RETENTION_DAYS = env.int("TOMBSTONE_RETENTION_DAYS", default=30)
+
+# Outbound webhooks (``manage.py run_webhook_dispatcher``): shared connection pool,
+# per-request timeout, how long a claimed delivery stays leased (more than the timeout
+# plus a few seconds: requests that could outlast the lease are not started), and
+# retry policy.
+# Endpoints may only point at public addresses; WEBHOOK_ALLOW_PRIVATE_URLS lifts that
+# for local testing against scripts/webhook_stub_server.py and must stay off in prod.
+WEBHOOK_ALLOW_PRIVATE_URLS = env.bool("WEBHOOK_ALLOW_PRIVATE_URLS", default=False)
+WEBHOOK_MAX_CONNECTIONS = env.int("WEBHOOK_MAX_CONNECTIONS", default=50)
+WEBHOOK_TIMEOUT = env.float("WEBHOOK_TIMEOUT", default=10.0)
+WEBHOOK_LEASE_SECONDS = env.int("WEBHOOK_LEASE_SECONDS", default=120)
+WEBHOOK_CLAIM_LIMIT = env.int("WEBHOOK_CLAIM_LIMIT", default=1000)
+WEBHOOK_POLL_INTERVAL = env.float("WEBHOOK_POLL_INTERVAL", default=1.0)
+WEBHOOK_MAX_ATTEMPTS = env.int("WEBHOOK_MAX_ATTEMPTS", default=10)
+WEBHOOK_RETRY_BASE_DELAY = env.int("WEBHOOK_RETRY_BASE_DELAY", default=15)
+WEBHOOK_RETRY_MAX_DELAY = env.int("WEBHOOK_RETRY_MAX_DELAY", default=6 * 3600)
+
+# Monte Carlo revenue forecast (crm.forecast). FORECAST_CHUNK_CELLS bounds both the
+# simulations x leads drawn at once and the simulations x reps x months of a block of
+# reps, i.e. the peak memory of a run.
+FORECAST_SIMULATIONS = env.int("FORECAST_SIMULATIONS", default=20_000)
+FORECAST_HORIZON_MONTHS = env.int("FORECAST_HORIZON_MONTHS", default=6)
+FORECAST_PRIOR_WEIGHT = env.float("FORECAST_PRIOR_WEIGHT", default=20.0)
+FORECAST_MIN_HISTORY = env.int("FORECAST_MIN_HISTORY", default=30)
+FORECAST_SLIP_DAYS = env.int("FORECAST_SLIP_DAYS", default=90)
+FORECAST_STALE_FACTOR = env.float("FORECAST_STALE_FACTOR", default=0.5)
+FORECAST_CHUNK_CELLS = env.int("FORECAST_CHUNK_CELLS", default=4_000_000)
+
+JOB_WORKER_CONCURRENCY = env.int("JOB_WORKER_CONCURRENCY", default=4)
+JOB_WORKER_POOL = env("JOB_WORKER_POOL", default="thread")
+JOB_POLL_INTERVAL = env.float("JOB_POLL_INTERVAL", default=1.0)
+JOB_STALE_TIMEOUT = env.int("JOB_STALE_TIMEOUT", default=900)
+JOB_RETRY_BASE_DELAY = env.int("JOB_RETRY_BASE_DELAY", default=10)
+JOB_RETRY_MAX_DELAY = env.int("JOB_RETRY_MAX_DELAY", default=3600)
+
+# The request profiler (crm.profiling) is opt-in: nothing is sampled unless enabled.
+PROFILING_ENABLED = env.bool("PROFILING_ENABLED", default=False)
+PROFILING_INTERVAL = env.float("PROFILING_INTERVAL", default=0.005)
+PROFILING_MAX_SECONDS = env.float("PROFILING_MAX_SECONDS", default=60.0)
+PROFILING_MAX_QUERIES = env.int("PROFILING_MAX_QUERIES", default=2000)
+PROFILING_TOKEN_MAX_AGE = env.int("PROFILING_TOKEN_MAX_AGE", default=3600)
+
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
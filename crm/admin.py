@@ -1,15 +1,137 @@
 """Admin registrations for CRM models."""
 from __future__ import annotations
 
-from django.contrib import admin
+import json
 
-from crm.models import Client, Interaction, Lead, Profile
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth import get_user_model
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import format_html, format_html_join
+
+from crm.forms import ReassignmentForm
+from crm.models import (
+    Client,
+    DeliveryStatus,
+    Interaction,
+    Job,
+    JobStatus,
+    Lead,
+    Profile,
+    RequestProfile,
+    WebhookDelivery,
+    WebhookEndpoint,
+)
+from crm.profiling import TOKEN_HEADER, TOKEN_PARAM, make_token, speedscope
+from crm.tasks import enqueue_reassignment, schedule_client_deletion, schedule_user_deletion
+
+User = get_user_model()
+
+admin.site.unregister(User)
+
+
+def _deletion_summary(model_admin, request, objs, counts: dict[str, int]):
+    """What ``get_deleted_objects`` returns, from counts instead of the full cascade.
+
+    Collecting every related row for the confirmation page is itself too slow for a
+    big book; the rows are purged in the background anyway (``crm.deletion``).
+    """
+    model = model_admin.model
+    perms_needed = (
+        set() if model_admin.has_delete_permission(request) else {model._meta.verbose_name}
+    )
+    deleted = [str(obj) for obj in objs]
+    model_count = {model._meta.verbose_name_plural: len(deleted)}
+    model_count.update({name: count for name, count in counts.items() if count})
+    return deleted, model_count, perms_needed, []
+
+
+@admin.register(User)
+class UserAdmin(BaseUserAdmin):
+    actions = ["reassign_book"]
+
+    def get_deleted_objects(self, objs, request):  # type: ignore[override]
+        ids = [obj.pk for obj in objs]
+        return _deletion_summary(
+            self,
+            request,
+            objs,
+            {
+                Client._meta.verbose_name_plural: Client.objects.filter(owner_id__in=ids).count(),
+                Lead._meta.verbose_name_plural: Lead.objects.filter(
+                    client__owner_id__in=ids
+                ).count(),
+                Interaction._meta.verbose_name_plural: Interaction.objects.filter(
+                    client__owner_id__in=ids
+                ).count(),
+            },
+        )
+
+    def delete_model(self, request, obj):  # type: ignore[override]
+        # Deactivated and hidden now; the cascade is purged by a background job.
+        schedule_user_deletion(obj.pk)
+
+    def delete_queryset(self, request, queryset):  # type: ignore[override]
+        for user_id in queryset.values_list("pk", flat=True):
+            schedule_user_deletion(user_id)
+
+    @admin.action(
+        description="Transferir carteira (clientes, leads e follow-ups)",
+        permissions=["change"],
+    )
+    def reassign_book(self, request, queryset):
+        form = ReassignmentForm(request.POST if "apply" in request.POST else None)
+        if form.is_valid():
+            to_user_ids = [user.pk for user in form.cleaned_data["to_users"]]
+            jobs = []
+            for user in queryset:
+                try:
+                    jobs.append(
+                        enqueue_reassignment(
+                            user.pk,
+                            to_user_ids,
+                            form.cleaned_data["strategy"],
+                            form.cleaned_data["chunk_size"],
+                        )
+                    )
+                except ValueError as exc:
+                    self.message_user(request, f"{user}: {exc}", messages.ERROR)
+            if jobs:
+                links = format_html_join(
+                    ", ",
+                    '<a href="{}">#{}</a>',
+                    ((reverse("admin:crm_job_change", args=[job.pk]), job.pk) for job in jobs),
+                )
+                self.message_user(
+                    request,
+                    format_html("Transferência em segundo plano: job(s) {}.", links),
+                    messages.SUCCESS,
+                )
+            return None
+        return TemplateResponse(
+            request,
+            "admin/crm/reassign_book.html",
+            {
+                **self.admin_site.each_context(request),
+                "title": "Transferir carteira",
+                "opts": self.model._meta,
+                "form": form,
+                "users": queryset,
+                "action_checkbox_name": ACTION_CHECKBOX_NAME,
+            },
+        )
 
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
-    list_display = ("user", "phone", "position")
-    search_fields = ("user__username", "user__email", "phone", "position")
+    list_display = ("user", "phone", "position", "lead_capacity", "industries")
+    search_fields = ("user__username", "user__email", "phone", "position", "industries")
 
 
 @admin.register(Client)
@@ -18,6 +140,26 @@ class ClientAdmin(admin.ModelAdmin):
     list_filter = ("owner", "industry")
     search_fields = ("name", "company", "email", "phone")
 
+    def get_deleted_objects(self, objs, request):  # type: ignore[override]
+        ids = [obj.pk for obj in objs]
+        return _deletion_summary(
+            self,
+            request,
+            objs,
+            {
+                Lead._meta.verbose_name_plural: Lead.objects.filter(client_id__in=ids).count(),
+                Interaction._meta.verbose_name_plural: Interaction.objects.filter(
+                    client_id__in=ids
+                ).count(),
+            },
+        )
+
+    def delete_model(self, request, obj):  # type: ignore[override]
+        schedule_client_deletion([obj.pk])
+
+    def delete_queryset(self, request, queryset):  # type: ignore[override]
+        schedule_client_deletion(queryset.values_list("pk", flat=True))
+
 
 @admin.register(Lead)
 class LeadAdmin(admin.ModelAdmin):
@@ -32,3 +174,147 @@ class InteractionAdmin(admin.ModelAdmin):
     list_filter = ("interaction_type", "occurred_at")
     search_fields = ("client__name", "notes", "subject")
     autocomplete_fields = ("client", "author")
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("task", "status", "priority", "attempts", "run_at", "finished_at")
+    list_filter = ("status", "task")
+    search_fields = ("task", "dedup_key", "locked_by")
+    readonly_fields = ("locked_by", "locked_at", "last_error", "progress", "result", "finished_at")
+    actions = ["requeue"]
+
+    @admin.action(description="Reenfileirar jobs selecionados")
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(status=JobStatus.RUNNING).update(
+            status=JobStatus.QUEUED,
+            run_at=timezone.now(),
+            attempts=0,
+            finished_at=None,
+            updated_at=timezone.now(),
+        )
+        self.message_user(request, f"{updated} job(s) reenfileirado(s).")
+
+
+@admin.register(WebhookEndpoint)
+class WebhookEndpointAdmin(admin.ModelAdmin):
+    list_display = ("url", "user", "group", "is_active", "max_concurrency", "batch_size")
+    list_filter = ("is_active",)
+    search_fields = ("url", "user__username")
+    readonly_fields = ("secret",)
+    autocomplete_fields = ("user",)
+
+
+@admin.register(WebhookDelivery)
+class WebhookDeliveryAdmin(admin.ModelAdmin):
+    list_display = ("event", "endpoint", "status", "attempts", "response_status", "next_attempt_at")
+    list_filter = ("status",)
+    search_fields = ("event__key", "endpoint__url")
+    list_select_related = ("event", "endpoint")
+    raw_id_fields = ("event", "endpoint")
+    readonly_fields = ("last_error", "delivered_at", "locked_until")
+    actions = ["retry_now"]
+
+    @admin.action(description="Reenviar entregas selecionadas")
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status=DeliveryStatus.DELIVERED).update(
+            status=DeliveryStatus.PENDING,
+            next_attempt_at=timezone.now(),
+            attempts=0,
+            locked_until=None,
+        )
+        self.message_user(request, f"{updated} entrega(s) reenfileirada(s).")
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    change_list_template = "admin/crm/requestprofile/change_list.html"
+    list_display = (
+        "created_at",
+        "method",
+        "path",
+        "status_code",
+        "duration_ms",
+        "cpu_ms",
+        "query_count",
+        "query_ms",
+        "user",
+    )
+    list_filter = ("method", "status_code")
+    search_fields = ("path", "view_name", "user__username")
+    date_hierarchy = "created_at"
+    exclude = ("stacks", "queries")
+    readonly_fields = (
+        "downloads",
+        "user",
+        "method",
+        "path",
+        "view_name",
+        "status_code",
+        "duration_ms",
+        "cpu_ms",
+        "sample_interval_ms",
+        "sample_count",
+        "query_count",
+        "query_ms",
+        "created_at",
+        "slowest_queries",
+    )
+
+    def has_add_permission(self, request) -> bool:
+        return False
+
+    def has_change_permission(self, request, obj=None) -> bool:
+        return False
+
+    def get_urls(self):
+        download = self.admin_site.admin_view(self.download)
+        return [
+            path("<int:pk>/download/<str:fmt>/", download, name="crm_requestprofile_download"),
+            *super().get_urls(),
+        ]
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {
+            **(extra_context or {}),
+            "profiling_enabled": settings.PROFILING_ENABLED,
+            "profile_token": make_token(request.user),
+            "profile_header": TOKEN_HEADER,
+            "profile_param": TOKEN_PARAM,
+        }
+        return super().changelist_view(request, extra_context)
+
+    def download(self, request, pk: int, fmt: str) -> HttpResponse:
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        if fmt == "speedscope":
+            response = HttpResponse(
+                json.dumps(speedscope(profile)), content_type="application/json"
+            )
+            filename = f"profile-{profile.pk}.speedscope.json"
+        else:
+            response = HttpResponse(profile.stacks, content_type="text/plain; charset=utf-8")
+            filename = f"profile-{profile.pk}.collapsed.txt"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    @admin.display(description="Downloads")
+    def downloads(self, obj: RequestProfile) -> str:
+        def url(fmt: str) -> str:
+            return reverse("admin:crm_requestprofile_download", args=[obj.pk, fmt])
+
+        return format_html(
+            '<a href="{}">speedscope</a> · <a href="{}">collapsed stacks</a>',
+            url("speedscope"),
+            url("collapsed"),
+        )
+
+    @admin.display(description="Consultas mais lentas")
+    def slowest_queries(self, obj: RequestProfile) -> str:
+        slowest = sorted(obj.queries, key=lambda query: query["duration_ms"], reverse=True)[:10]
+        return format_html(
+            "<pre>{}</pre>",
+            "\n\n".join(
+                f"{query['duration_ms']:.1f} ms @ {query['start_ms']:.1f} ms\n{query['sql']}"
+                for query in slowest
+            ),
+        )
@@ -1,20 +1,133 @@
 """REST API endpoints for the CRM app."""
 from __future__ import annotations
 
-from django.db.models import Q
-from rest_framework import viewsets
-from rest_framework.permissions import IsAuthenticated
+from datetime import UTC, datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import F, Q
+from django.http import StreamingHttpResponse
+from django.urls import path
+from django.utils.dateparse import parse_datetime
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import RetrieveAPIView
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
 from rest_framework.routers import DefaultRouter
+from rest_framework.views import APIView
+
+from crm import changefeed
+from crm.assignment import assign_leads, assignee_for
+from crm.authentication import (
+    SignedTokenAuthentication,
+    issue_token,
+    revoke_token,
+    revoke_user_tokens,
+)
+from crm.filters import ClientFilter, InteractionFilter, LeadFilter
+from crm.ingest import ingest_interactions
+from crm.models import (
+    Client,
+    Interaction,
+    Job,
+    Lead,
+    LeadStatus,
+    TombstoneResource,
+    WebhookEndpoint,
+    webhook_secret,
+)
+from crm.renderers import dumps
+from crm.serializers import (
+    ClientSerializer,
+    InteractionIngestSerializer,
+    InteractionSerializer,
+    JobSerializer,
+    LeadAutoAssignSerializer,
+    LeadSerializer,
+    ReassignmentSerializer,
+    TokenObtainSerializer,
+    WebhookEndpointSerializer,
+)
+from crm.stats import DIMENSIONS, GROUPINGS, MEASURES, lead_stats
+from crm.tasks import enqueue_reassignment, reassign_book, schedule_client_deletion
 
-from crm.models import Client, Interaction, Lead
-from crm.serializers import ClientSerializer, InteractionSerializer, LeadSerializer
+User = get_user_model()
 
 router = DefaultRouter()
 
 
-class ClientViewSet(viewsets.ModelViewSet):
+class ChangeFeedMixin:
+    """``GET <resource>/changes/``: rows changed and ids deleted since a cursor.
+
+    Start with no parameters (full sync) or ``?updated_since=<ISO datetime>``, then
+    pass back the returned ``cursor`` until ``has_more`` is false; keep the last
+    cursor for the next sync. List filters do not apply, because rows leaving a
+    filter leave no tombstone. ``410 Gone`` means the cursor is too old: resync.
+    """
+
+    feed_resource: str
+
+    @action(detail=False, methods=["get"])
+    def changes(self, request):
+        params = request.query_params
+        limit = self._feed_limit(params.get("limit"))
+        try:
+            if "cursor" in params:
+                cursor = changefeed.FeedCursor.decode(params["cursor"])
+            elif "updated_since" in params:
+                since = parse_datetime(params["updated_since"])
+                if since is None or since.tzinfo is None:
+                    raise ValueError("Informe updated_since como data ISO 8601 com fuso.")
+                cursor = changefeed.initial_cursor(since)
+            else:
+                cursor = changefeed.initial_cursor()
+        except ValueError as exc:
+            raise ValidationError({"cursor": str(exc)}) from exc
+        try:
+            page = changefeed.changes(
+                self.get_queryset(), self.feed_resource, request.user, cursor, limit
+            )
+        except changefeed.CursorExpired:
+            return Response(
+                {"detail": "Cursor expirado; sincronize tudo novamente."},
+                status=status.HTTP_410_GONE,
+            )
+        return Response(
+            {
+                "results": self.get_serializer(page["rows"], many=True).data,
+                "deleted": page["deleted"],
+                "cursor": page["cursor"].encode(),
+                "has_more": page["has_more"],
+            }
+        )
+
+    def _feed_limit(self, raw: str | None) -> int:
+        if raw is None:
+            return settings.CHANGE_FEED_PAGE_SIZE
+        if not raw.isdigit() or int(raw) < 1:
+            raise ValidationError({"limit": "Informe um inteiro positivo."})
+        return min(int(raw), settings.CHANGE_FEED_MAX_PAGE_SIZE)
+
+
+class ClientViewSet(ChangeFeedMixin, viewsets.ModelViewSet):
+    feed_resource = TombstoneResource.CLIENT
     serializer_class = ClientSerializer
     permission_classes = [IsAuthenticated]
+    filterset_class = ClientFilter
+    ordering_fields = [
+        "name",
+        "created_at",
+        "updated_at",
+        "interaction_count",
+        "last_interaction_at",
+        "next_follow_up_date",
+        "open_lead_count",
+        "open_lead_value",
+        "won_value",
+    ]
+    ordering = ["name"]
 
     def get_queryset(self):  # type: ignore[override]
         qs = Client.objects.select_related("owner")
@@ -26,25 +139,136 @@ class ClientViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):  # type: ignore[override]
         serializer.save(owner=self.request.user)
 
+    def perform_destroy(self, instance):  # type: ignore[override]
+        # Hidden now; leads and interactions are purged in the background.
+        schedule_client_deletion([instance.pk])
+
 
-class LeadViewSet(viewsets.ModelViewSet):
+class LeadViewSet(ChangeFeedMixin, viewsets.ModelViewSet):
+    feed_resource = TombstoneResource.LEAD
     serializer_class = LeadSerializer
     permission_classes = [IsAuthenticated]
+    filterset_class = LeadFilter
+    ordering_fields = ["updated_at", "created_at", "value", "expected_close_date", "status"]
+    ordering = ["-updated_at"]
 
     def get_queryset(self):  # type: ignore[override]
-        qs = Lead.objects.select_related("client", "assigned_to")
+        qs = Lead.objects.select_related("client__owner", "assigned_to").filter(
+            client__deleted_at__isnull=True
+        )
         user = self.request.user
         if user.is_superuser:
             return qs
         return qs.filter(Q(assigned_to=user) | Q(client__owner=user))
 
+    def perform_create(self, serializer):  # type: ignore[override]
+        data = serializer.validated_data
+        if data.get("assigned_to") is None:
+            user_id = assignee_for(data["client"], data.get("status", LeadStatus.NEW))
+            if user_id is not None:
+                serializer.save(assigned_to=User.objects.get(pk=user_id))
+                return
+        serializer.save()
+
+    @action(detail=False, methods=["post"], url_path="auto-assign")
+    def auto_assign(self, request):
+        """Hand the given open, unassigned leads to the least loaded reps."""
+        serializer = LeadAutoAssignSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data["ids"]
+        assigned = assign_leads(self.get_queryset().filter(pk__in=ids))
+        return Response(
+            {
+                "assigned": [
+                    {"id": lead_id, "assigned_to_id": user_id}
+                    for lead_id, user_id in assigned.items()
+                ],
+                "skipped": [lead_id for lead_id in dict.fromkeys(ids) if lead_id not in assigned],
+            }
+        )
 
-class InteractionViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=["get"])
+    def stats(self, request):
+        """Subtotals of the visible, filtered leads for every combination of dimensions.
+
+        ``?dimensions=status,industry&measures=count,sum_value&grouping=cube``
+        """
+        dimensions = self._csv_param("dimensions", DIMENSIONS, default=["status"])
+        measures = self._csv_param("measures", MEASURES, default=list(MEASURES))
+        grouping = request.query_params.get("grouping", "cube")
+        if grouping not in GROUPINGS:
+            raise ValidationError({"grouping": f"Use um de: {', '.join(GROUPINGS)}."})
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(
+            {
+                "dimensions": dimensions,
+                "measures": measures,
+                "grouping": grouping,
+                "rows": lead_stats(queryset, dimensions, measures, grouping),
+            }
+        )
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """Stream the visible, filtered leads as NDJSON, one flat object per line (UTC times)."""
+        queryset = (
+            self.filter_queryset(self.get_queryset())
+            .annotate(client_name=F("client__name"))
+            .values(
+                "id",
+                "client_id",
+                "client_name",
+                "status",
+                "source",
+                "assigned_to_id",
+                "value",
+                "expected_close_date",
+                "created_at",
+                "updated_at",
+            )
+        )
+        chunk_size = settings.LEAD_EXPORT_CHUNK_SIZE
+
+        def lines():
+            batch: list[bytes] = []
+            for row in queryset.iterator(chunk_size=chunk_size):
+                row["value"] = str(row["value"])
+                batch.append(dumps(row))
+                if len(batch) >= chunk_size:
+                    yield b"\n".join(batch) + b"\n"
+                    batch = []
+            if batch:
+                yield b"\n".join(batch) + b"\n"
+
+        response = StreamingHttpResponse(lines(), content_type="application/x-ndjson")
+        response["Content-Disposition"] = 'attachment; filename="leads.ndjson"'
+        return response
+
+    def _csv_param(self, name: str, allowed, default: list[str]) -> list[str]:
+        raw = self.request.query_params.get(name)
+        if raw is None:
+            return default
+        values = list(dict.fromkeys(item.strip() for item in raw.split(",") if item.strip()))
+        invalid = [value for value in values if value not in allowed]
+        if name == "measures" and not values:
+            raise ValidationError({name: "Informe ao menos uma medida."})
+        if invalid:
+            raise ValidationError({name: f"Valores inválidos: {', '.join(invalid)}."})
+        return values
+
+
+class InteractionViewSet(ChangeFeedMixin, viewsets.ModelViewSet):
+    feed_resource = TombstoneResource.INTERACTION
     serializer_class = InteractionSerializer
     permission_classes = [IsAuthenticated]
+    filterset_class = InteractionFilter
+    ordering_fields = ["occurred_at", "follow_up_date", "created_at"]
+    ordering = ["-occurred_at"]
 
     def get_queryset(self):  # type: ignore[override]
-        qs = Interaction.objects.select_related("client", "author")
+        qs = Interaction.objects.select_related("client__owner", "author").filter(
+            client__deleted_at__isnull=True
+        )
         user = self.request.user
         if user.is_superuser:
             return qs
@@ -53,9 +277,117 @@ class InteractionViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):  # type: ignore[override]
         serializer.save(author=self.request.user)
 
+    @action(detail=False, methods=["post"], url_path="ingest")
+    def ingest(self, request):
+        """Append a batch of interactions identified by client-supplied idempotency keys."""
+        serializer = InteractionIngestSerializer(
+            data=request.data,
+            many=True,
+            allow_empty=False,
+            max_length=settings.INTERACTION_INGEST_MAX_BATCH,
+        )
+        serializer.is_valid(raise_exception=True)
+        result = ingest_interactions(serializer.validated_data, user=request.user)
+        return Response(result, status=status.HTTP_202_ACCEPTED)
+
+
+class WebhookEndpointViewSet(viewsets.ModelViewSet):
+    """The caller's webhook subscriptions; the signing secret is generated here."""
+
+    serializer_class = WebhookEndpointSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):  # type: ignore[override]
+        return WebhookEndpoint.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):  # type: ignore[override]
+        serializer.save(user=self.request.user)
+
+    @action(detail=True, methods=["post"], url_path="rotate-secret")
+    def rotate_secret(self, request, pk=None):
+        endpoint = self.get_object()
+        endpoint.secret = webhook_secret()
+        endpoint.save(update_fields=["secret", "updated_at"])
+        return Response(self.get_serializer(endpoint).data)
+
+
+class TokenObtainView(APIView):
+    """Exchange username and password for a signed, expiring API token."""
+
+    authentication_classes: list = []
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        serializer = TokenObtainSerializer(data=request.data, context={"request": request})
+        serializer.is_valid(raise_exception=True)
+        ttl = min(
+            serializer.validated_data.get("ttl") or settings.API_TOKEN_TTL,
+            settings.API_TOKEN_MAX_TTL,
+        )
+        token, claims = issue_token(serializer.validated_data["user"], ttl=ttl)
+        return Response(
+            {
+                "token": token,
+                "token_type": "Bearer",
+                "expires_at": datetime.fromtimestamp(claims["exp"], tz=UTC),
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class TokenRevokeView(APIView):
+    """Revoke the presented token, or with ``{"all": true}`` every token of its user."""
+
+    authentication_classes = [SignedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        if request.data.get("all"):
+            revoke_user_tokens(request.user)
+        else:
+            revoke_token(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ReassignmentView(APIView):
+    """Queue the transfer of a rep's clients, leads and open follow-ups (staff only)."""
+
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        serializer = ReassignmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        job = enqueue_reassignment(
+            data["from_user"].pk,
+            [user.pk for user in data["to_users"]],
+            data["strategy"],
+            data.get("chunk_size"),
+        )
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class ReassignmentDetailView(RetrieveAPIView):
+    """Status, progress counters and result of a reassignment job."""
+
+    permission_classes = [IsAdminUser]
+    serializer_class = JobSerializer
+    queryset = Job.objects.filter(task=reassign_book.task_name)
+
 
 router.register("clients", ClientViewSet, basename="client")
 router.register("leads", LeadViewSet, basename="lead")
 router.register("interactions", InteractionViewSet, basename="interaction")
+router.register("webhooks", WebhookEndpointViewSet, basename="webhook")
 
-urlpatterns = router.urls
+urlpatterns = [
+    path("auth/token/", TokenObtainView.as_view(), name="token-obtain"),
+    path("auth/token/revoke/", TokenRevokeView.as_view(), name="token-revoke"),
+    path("reassignments/", ReassignmentView.as_view(), name="reassignment-create"),
+    path(
+        "reassignments/<int:pk>/",
+        ReassignmentDetailView.as_view(),
+        name="reassignment-detail",
+    ),
+    *router.urls,
+]
@@ -10,3 +10,4 @@ class CrmConfig(AppConfig):
 
     def ready(self) -> None:  # pragma: no cover - imported for side effects
         import crm.signals  # noqa: F401
+        import crm.tasks  # noqa: F401
@@ -0,0 +1,277 @@
+"""Load-aware automatic assignment of leads that arrive without a rep.
+
+:data:`engine` keeps, per process, every eligible rep's open-lead count and open
+pipeline value: active, non-superuser users whose ``Profile.lead_capacity`` is
+set above 0. Eligibility is opt-in, so anyone who signs up takes no leads until
+an admin gives them a capacity. A rep's load is::
+
+    open_leads / capacity + ASSIGNMENT_VALUE_WEIGHT * open_value / ASSIGNMENT_VALUE_UNIT
+
+Reps with room are kept in a min-heap ordered by load and then by when they last
+got a lead, so equally loaded reps take turns; each industry listed in
+``Profile.industries`` has its own heap of the same entries. A pick compares the
+top of the general heap with the top of the heap for the client's industry, less
+``ASSIGNMENT_INDUSTRY_BONUS``, and when every rep is at capacity falls back to
+plain round robin. Entries are never updated in place: a load change pushes a
+new entry and bumps the rep's version, and stale entries are dropped when they
+reach the top, so picks and updates cost O(log n) with no query.
+
+The counts come from one grouped query when the engine is first used and again
+every ``ASSIGNMENT_REFRESH_SECONDS``. In between, ``crm.signals`` reports every
+lead save and delete through :func:`lead_changed` once its transaction commits.
+Writes that bypass signals (``QuerySet.update``), and leads saved by other
+processes, show up at the next refresh.
+"""
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from collections import defaultdict, deque
+from collections.abc import Callable
+from dataclasses import dataclass
+from decimal import Decimal
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, QuerySet, Sum
+from django.utils import timezone
+
+from crm.models import Lead, LeadStatus
+from crm.summaries import OPEN_STATUSES
+
+User = get_user_model()
+
+Progress = Callable[..., None]
+
+# What one lead adds to a rep's load: (assigned user id, value), or None.
+Contribution = tuple[int, Decimal] | None
+# (load, turn, user id, version); see the module docstring.
+Entry = tuple[float, int, int, int]
+
+
+def contribution(assigned_to_id: int | None, status: str, value) -> Contribution:
+    if assigned_to_id is None or status not in OPEN_STATUSES:
+        return None
+    return assigned_to_id, Decimal(value or 0)
+
+
+def parse_industries(value: str) -> frozenset[str]:
+    return frozenset(part.strip().casefold() for part in value.split(",") if part.strip())
+
+
+@dataclass
+class RepLoad:
+    user_id: int
+    capacity: int
+    industries: frozenset[str]
+    open_leads: int = 0
+    open_value: Decimal = Decimal(0)
+    turn: int = 0
+    version: int = 0
+
+    def load(self) -> float:
+        value = settings.ASSIGNMENT_VALUE_WEIGHT * float(self.open_value)
+        return self.open_leads / self.capacity + value / settings.ASSIGNMENT_VALUE_UNIT
+
+
+class AssignmentEngine:
+    """Per-process rep loads and the heaps that pick the least loaded rep."""
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._reps: dict[int, RepLoad] = {}
+        self._heap: list[Entry] = []
+        self._by_industry: dict[str, list[Entry]] = {}
+        self._rotation: deque[int] = deque()
+        self._turns = itertools.count(1)
+        self._loaded_at: float | None = None
+
+    def invalidate(self) -> None:
+        """Re-read the loads on the next pick."""
+        with self._lock:
+            self._loaded_at = None
+
+    def loads(self) -> dict[int, RepLoad]:
+        with self._lock:
+            self._ensure_loaded()
+            return dict(self._reps)
+
+    def pick(self, industry: str = "") -> int | None:
+        """The rep the next lead of a client in ``industry`` should go to."""
+        with self._lock:
+            self._ensure_loaded()
+            best = self._top(self._heap)
+            key = industry.strip().casefold()
+            match = self._top(self._by_industry.get(key, [])) if key else None
+            bonus = settings.ASSIGNMENT_INDUSTRY_BONUS
+            if match is not None and (best is None or (match[0] - bonus, match[1]) <= best[:2]):
+                best = match
+            user_id = best[2] if best is not None else self._next_in_rotation()
+            if user_id is not None:
+                rep = self._reps[user_id]
+                rep.turn = next(self._turns)
+                self._push(rep)
+            return user_id
+
+    def move(self, old: Contribution, new: Contribution) -> None:
+        """Take ``old`` off its rep's load and add ``new`` to its rep's."""
+        if old == new:
+            return
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            for item, sign in ((old, -1), (new, 1)):
+                rep = self._reps.get(item[0]) if item else None
+                if rep is None:
+                    continue
+                rep.open_leads = max(rep.open_leads + sign, 0)
+                rep.open_value += sign * item[1]
+                self._push(rep)
+
+    def _ensure_loaded(self) -> None:
+        if (
+            self._loaded_at is None
+            or time.monotonic() - self._loaded_at > settings.ASSIGNMENT_REFRESH_SECONDS
+        ):
+            self._load()
+
+    def _load(self) -> None:
+        previous = self._reps
+        reps: dict[int, RepLoad] = {}
+        eligible = User.objects.filter(
+            is_active=True, is_superuser=False, profile__lead_capacity__gt=0
+        ).values_list("pk", "profile__lead_capacity", "profile__industries")
+        for user_id, capacity, industries in eligible:
+            turn = previous[user_id].turn if user_id in previous else 0
+            reps[user_id] = RepLoad(
+                user_id, capacity, parse_industries(industries or ""), turn=turn
+            )
+        open_leads = (
+            Lead.objects.filter(status__in=OPEN_STATUSES, assigned_to__isnull=False)
+            .order_by()
+            .values("assigned_to_id")
+            .annotate(count=Count("pk"), value=Sum("value"))
+        )
+        for row in open_leads:
+            if rep := reps.get(row["assigned_to_id"]):
+                rep.open_leads = row["count"]
+                rep.open_value = row["value"] or Decimal(0)
+        self._reps = reps
+        self._rotation = deque(sorted(reps, key=lambda user_id: (reps[user_id].turn, user_id)))
+        self._rebuild()
+        self._loaded_at = time.monotonic()
+
+    def _rebuild(self) -> None:
+        self._heap = []
+        self._by_industry = {}
+        for rep in self._reps.values():
+            self._push(rep, heapify=False)
+        heapq.heapify(self._heap)
+        for heap in self._by_industry.values():
+            heapq.heapify(heap)
+
+    def _push(self, rep: RepLoad, heapify: bool = True) -> None:
+        rep.version += 1
+        if rep.open_leads >= rep.capacity:
+            # Full reps leave the heaps until a lead leaves them.
+            return
+        entry = (rep.load(), rep.turn, rep.user_id, rep.version)
+        add = heapq.heappush if heapify else list.append
+        add(self._heap, entry)
+        for industry in rep.industries:
+            add(self._by_industry.setdefault(industry, []), entry)
+        if heapify and len(self._heap) > 4 * len(self._reps) + 64:
+            self._rebuild()
+
+    def _top(self, heap: list[Entry]) -> Entry | None:
+        while heap:
+            user_id, version = heap[0][2], heap[0][3]
+            rep = self._reps.get(user_id)
+            if rep is not None and rep.version == version:
+                return heap[0]
+            heapq.heappop(heap)
+        return None
+
+    def _next_in_rotation(self) -> int | None:
+        while self._rotation:
+            user_id = self._rotation.popleft()
+            if user_id in self._reps:
+                self._rotation.append(user_id)
+                return user_id
+        return None
+
+
+engine = AssignmentEngine()
+
+
+def lead_changed(old: Contribution, new: Contribution) -> None:
+    """Update the loads once the current transaction commits."""
+    if old != new:
+        transaction.on_commit(partial(engine.move, old, new))
+
+
+def assignee_for(client, status: str = LeadStatus.NEW) -> int | None:
+    """Rep for a new lead of ``client`` with no assignee, if automatic assignment is on."""
+    if not settings.ASSIGNMENT_AUTO or status not in OPEN_STATUSES:
+        return None
+    return engine.pick(client.industry)
+
+
+def assign_leads(
+    leads: QuerySet[Lead], *, chunk_size: int | None = None, progress: Progress | None = None
+) -> dict[int, int]:
+    """Assign the open, unassigned leads in ``leads``; returns lead id → user id.
+
+    Leads are picked in primary-key chunks, each written with one ``UPDATE`` per
+    rep in its own transaction; the loads are updated as every lead is picked, so
+    a batch spreads out the same way single assignments would.
+    """
+    chunk_size = chunk_size or settings.ASSIGNMENT_CHUNK_SIZE
+    report = progress or (lambda **values: None)
+    pending = leads.filter(assigned_to__isnull=True, status__in=OPEN_STATUSES).order_by("pk")
+    assigned: dict[int, int] = {}
+    last = 0
+    while rows := list(
+        pending.filter(pk__gt=last).values_list("pk", "value", "client__industry")[:chunk_size]
+    ):
+        last = rows[-1][0]
+        picks: dict[int, Contribution] = {}
+        targets: dict[int, list[int]] = defaultdict(list)
+        for lead_id, value, industry in rows:
+            user_id = engine.pick(industry)
+            if user_id is None:
+                break
+            picks[lead_id] = (user_id, Decimal(value or 0))
+            engine.move(None, picks[lead_id])
+            targets[user_id].append(lead_id)
+        if not picks:
+            break
+        try:
+            with transaction.atomic():
+                now = timezone.now()
+                updated = sum(
+                    Lead.objects.filter(pk__in=ids, assigned_to__isnull=True).update(
+                        assigned_to_id=user_id, updated_at=now
+                    )
+                    for user_id, ids in targets.items()
+                )
+        except Exception:
+            engine.invalidate()
+            raise
+        if updated == len(picks):
+            assigned.update({lead_id: item[0] for lead_id, item in picks.items()})
+        else:
+            # Someone assigned some of these leads meanwhile: keep what was written.
+            engine.invalidate()
+            written = dict(
+                Lead.objects.filter(pk__in=list(picks)).values_list("pk", "assigned_to_id")
+            )
+            for lead_id, item in picks.items():
+                if written.get(lead_id) == item[0]:
+                    assigned[lead_id] = item[0]
+        report(assigned=len(assigned))
+    return assigned
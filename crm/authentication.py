@@ -0,0 +1,170 @@
+"""Signed-token authentication for the REST API.
+
+Tokens look like ``<key id>.<payload>.<signature>``: the payload is base64url JSON
+with the user id, role, issue/expiry timestamps and a token id (``jti``), signed
+with HMAC-SHA256 using the key named by ``<key id>`` in ``API_TOKEN_KEYS``. New
+tokens are signed with ``API_TOKEN_ACTIVE_KEY``; older keys keep verifying until
+they are removed from the setting, which allows rotation without downtime.
+
+Revocations (single tokens or "everything issued before") are rows of
+:class:`~crm.models.ApiTokenRevocation`, so every worker sees them at once whatever
+cache is configured. Authentication loads the user and checks the revocations in
+one query on indexed columns; integration traffic never reads ``django_session``.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import time
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Exists, Q, QuerySet
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+from crm.models import ApiTokenRevocation
+
+KEYWORD = b"bearer"
+SIGNING_SALT = b"crm.api-token:"
+
+
+def user_role(user) -> str:
+    if user.is_superuser:
+        return "superuser"
+    if user.is_staff:
+        return "staff"
+    return "user"
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _signature(key_id: str, payload: str) -> str:
+    try:
+        secret = settings.API_TOKEN_KEYS[key_id]
+    except KeyError as exc:
+        raise exceptions.AuthenticationFailed("Chave de assinatura desconhecida.") from exc
+    message = SIGNING_SALT + f"{key_id}.{payload}".encode("ascii")
+    return _b64encode(hmac.new(secret.encode(), message, hashlib.sha256).digest())
+
+
+def issue_token(user, ttl: int | None = None) -> tuple[str, dict[str, Any]]:
+    """Sign a token for ``user``; returns the token and its claims."""
+    now = time.time()
+    claims = {
+        "uid": user.pk,
+        "role": user_role(user),
+        # Millisecond precision so a token issued right after ``revoke_user_tokens``
+        # is not caught by the revocation of the same second.
+        "iat": round(now, 3),
+        "exp": int(now) + (ttl or settings.API_TOKEN_TTL),
+        "jti": secrets.token_urlsafe(12),
+    }
+    key_id = settings.API_TOKEN_ACTIVE_KEY
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{key_id}.{payload}.{_signature(key_id, payload)}", claims
+
+
+def _verified_claims(token: str) -> dict[str, Any]:
+    try:
+        key_id, payload, signature = token.split(".")
+    except ValueError as exc:
+        raise exceptions.AuthenticationFailed("Token malformado.") from exc
+    if not hmac.compare_digest(signature, _signature(key_id, payload)):
+        raise exceptions.AuthenticationFailed("Assinatura do token inválida.")
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError as exc:
+        raise exceptions.AuthenticationFailed("Token malformado.") from exc
+    if claims["exp"] <= time.time():
+        raise exceptions.AuthenticationFailed("Token expirado.")
+    return claims
+
+
+def _revocations(claims: dict[str, Any]) -> QuerySet[ApiTokenRevocation]:
+    """Revocations that apply to the token with ``claims``."""
+    issued_at = datetime.fromtimestamp(claims["iat"], tz=UTC)
+    return ApiTokenRevocation.objects.filter(user_id=claims["uid"]).filter(
+        Q(jti=claims["jti"]) | Q(jti="", revoked_at__gte=issued_at)
+    )
+
+
+def verify_token(token: str) -> dict[str, Any]:
+    """Check signature, expiry and revocation of ``token`` and return its claims."""
+    claims = _verified_claims(token)
+    if _revocations(claims).exists():
+        raise exceptions.AuthenticationFailed("Token revogado.")
+    return claims
+
+
+def _revoke(user_id: int, *, jti: str = "", revoked_at: datetime, expires_at: datetime) -> None:
+    now = timezone.now()
+    ApiTokenRevocation.objects.filter(expires_at__lte=now).delete()
+    ApiTokenRevocation.objects.create(
+        user_id=user_id, jti=jti, revoked_at=revoked_at, expires_at=expires_at
+    )
+
+
+def revoke_token(claims: dict[str, Any]) -> None:
+    """Revoke one token until it would have expired anyway."""
+    _revoke(
+        claims["uid"],
+        jti=claims["jti"],
+        revoked_at=timezone.now(),
+        expires_at=datetime.fromtimestamp(claims["exp"], tz=UTC),
+    )
+
+
+def revoke_user_tokens(user) -> None:
+    """Revoke every token issued to ``user`` up to now."""
+    # Same millisecond precision as the ``iat`` claim.
+    revoked_at = datetime.fromtimestamp(round(time.time(), 3), tz=UTC)
+    _revoke(
+        user.pk,
+        revoked_at=revoked_at,
+        expires_at=revoked_at + timedelta(seconds=settings.API_TOKEN_MAX_TTL),
+    )
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """``Authorization: Bearer <token>`` authentication with HMAC-signed tokens."""
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != KEYWORD:
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed("Cabeçalho Authorization inválido.")
+        try:
+            token = auth[1].decode("ascii")
+        except UnicodeError as exc:
+            raise exceptions.AuthenticationFailed("Token malformado.") from exc
+        claims = _verified_claims(token)
+        user = (
+            get_user_model()
+            .objects.filter(pk=claims["uid"])
+            .annotate(token_revoked=Exists(_revocations(claims)))
+            .first()
+        )
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed("Usuário inativo ou removido.")
+        if user.token_revoked:
+            raise exceptions.AuthenticationFailed("Token revogado.")
+        if user_role(user) != claims["role"]:
+            raise exceptions.AuthenticationFailed("O papel do usuário mudou; emita um novo token.")
+        return user, claims
+
+    def authenticate_header(self, request) -> str:
+        return 'Bearer realm="api"'
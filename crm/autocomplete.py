@@ -0,0 +1,86 @@
+"""Typeahead lookups behind the client and user autocomplete widgets.
+
+Lookups are scoped with the same visibility rules as the forms they feed and always
+return at most ``AUTOCOMPLETE_LIMIT`` rows. Prefix matches come first and are served
+on PostgreSQL by the ``UPPER(col) text_pattern_ops`` indexes from migration 0008;
+with ``AUTOCOMPLETE_TRIGRAM`` on, substring matches fill the remaining slots for
+longer terms, served by the ``pg_trgm`` GIN index that the same migration creates
+when the extension is available. Other databases run the same lookups unindexed.
+"""
+from __future__ import annotations
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q, QuerySet
+
+from crm.models import Client
+
+User = get_user_model()
+
+# Created by migration 0008 on PostgreSQL; names are asserted by the plan checks.
+CLIENT_PREFIX_INDEX = "crm_client_name_prefix_idx"
+CLIENT_OWNER_PREFIX_INDEX = "crm_client_owner_name_prefix_idx"
+CLIENT_TRIGRAM_INDEX = "crm_client_name_trgm_idx"
+
+# Trigrams need three characters to narrow anything down.
+TRIGRAM_MIN_LENGTH = 3
+
+
+def visible_clients(user) -> QuerySet[Client]:
+    """Clients ``user`` may pick in a form: their own, or all of them for superusers."""
+    if user.is_superuser:
+        return Client.objects.all()
+    return Client.objects.filter(owner=user)
+
+
+def assignable_users() -> QuerySet:
+    return User.objects.filter(is_active=True)
+
+
+def _normalise(term: str) -> str:
+    return " ".join(term.split())
+
+
+def search_clients(user, term: str, limit: int | None = None) -> list[dict[str, object]]:
+    term = _normalise(term)
+    limit = limit or settings.AUTOCOMPLETE_LIMIT
+    if len(term) < settings.AUTOCOMPLETE_MIN_CHARS:
+        return []
+    clients = visible_clients(user).order_by()
+    rows = list(
+        clients.filter(name__istartswith=term)
+        .order_by("name", "pk")
+        .values("pk", "name", "company")[:limit]
+    )
+    if len(rows) < limit and len(term) >= TRIGRAM_MIN_LENGTH and settings.AUTOCOMPLETE_TRIGRAM:
+        rows += (
+            clients.filter(name__icontains=term)
+            .exclude(name__istartswith=term)
+            .order_by("name", "pk")
+            .values("pk", "name", "company")[: limit - len(rows)]
+        )
+    return [
+        {"id": row["pk"], "text": row["name"], "detail": row["company"]} for row in rows
+    ]
+
+
+def user_label(user) -> str:
+    return user.get_full_name() or user.username
+
+
+def search_users(term: str, limit: int | None = None) -> list[dict[str, object]]:
+    term = _normalise(term)
+    limit = limit or settings.AUTOCOMPLETE_LIMIT
+    if len(term) < settings.AUTOCOMPLETE_MIN_CHARS:
+        return []
+    users = (
+        assignable_users()
+        .filter(
+            Q(username__istartswith=term)
+            | Q(first_name__istartswith=term)
+            | Q(last_name__istartswith=term)
+        )
+        .order_by("username")
+        .only("pk", "username", "first_name", "last_name")[:limit]
+    )
+    return [{"id": user.pk, "text": user_label(user), "detail": user.username} for user in users]
@@ -0,0 +1,192 @@
+"""Incremental change feed over clients, leads and interactions.
+
+A sync client pages through ``GET /api/<resource>/changes/`` and stores the returned
+cursor; each later call returns only the rows changed since then plus the ids
+deleted since then. Rows are walked in ``(updated_at, id)`` order and tombstones in
+``(deleted_at, id)`` order, both served by indexes, and the cursor keeps the last
+position of each, or the horizon (below) once a walk has caught up with it.
+
+``updated_at`` and ``deleted_at`` are stamped by the application before the
+transaction commits, so a slow transaction can make a row visible with a timestamp
+older than rows already served. The feed therefore stops at a *settle horizon*,
+``CHANGE_FEED_SETTLE_SECONDS`` in the past: rows newer than that are left for the
+next call, and nothing committed within the horizon is ever skipped at a page
+boundary. Transactions that stay open longer than the horizon are not covered.
+
+Tombstones are kept for ``TOMBSTONE_RETENTION_DAYS`` (``manage.py purge_tombstones``);
+a cursor not used for that long is refused and the client has to resync from scratch, as
+it must after a scope change (e.g. a reassigned client leaves its old owner's view
+without a tombstone).
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+from django.conf import settings
+from django.db.models import Model, Q, QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from crm.models import Client, Interaction, Lead, Tombstone, TombstoneResource
+
+RESOURCES: dict[type[Model], str] = {
+    Client: TombstoneResource.CLIENT,
+    Lead: TombstoneResource.LEAD,
+    Interaction: TombstoneResource.INTERACTION,
+}
+
+
+class CursorExpired(Exception):
+    """The cursor predates the tombstone retention window; a full resync is needed."""
+
+
+@dataclass(frozen=True)
+class FeedCursor:
+    """Last row and last tombstone served, as ``(timestamp, pk)`` keyset positions."""
+
+    updated_at: datetime
+    pk: int
+    deleted_at: datetime
+    tombstone_pk: int
+
+    def encode(self) -> str:
+        raw = (
+            f"{self.updated_at.isoformat()}|{self.pk}|"
+            f"{self.deleted_at.isoformat()}|{self.tombstone_pk}"
+        ).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> FeedCursor:
+        """Parse a cursor produced by :meth:`encode`, raising ``ValueError`` if malformed."""
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+            updated, pk, deleted, tombstone_pk = raw.split("|")
+        except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+            raise ValueError("Cursor inválido.") from exc
+        updated_at = parse_datetime(updated)
+        deleted_at = parse_datetime(deleted)
+        if None in (updated_at, deleted_at) or not (pk.isdigit() and tombstone_pk.isdigit()):
+            raise ValueError("Cursor inválido.")
+        return cls(updated_at, int(pk), deleted_at, int(tombstone_pk))
+
+    @classmethod
+    def since(cls, moment: datetime) -> FeedCursor:
+        """Starting position for changes made at or after ``moment``."""
+        moment = moment - timedelta(microseconds=1)
+        return cls(moment, 0, moment, 0)
+
+
+def _client_owner_id(client_id: int) -> int | None:
+    # Soft-deleted clients still have rows being purged (crm.deletion).
+    return Client.all_objects.filter(pk=client_id).values_list("owner_id", flat=True).first()
+
+
+def record_deletion(instance: Model) -> Tombstone:
+    """Write the tombstone of a deleted client, lead or interaction.
+
+    Called from ``post_delete``, which Django also sends for rows removed by a
+    cascade; those run before their parent client is deleted, so its owner is
+    still readable.
+    """
+    if isinstance(instance, Client):
+        owner_id, user_id = instance.owner_id, None
+    elif isinstance(instance, Lead):
+        owner_id, user_id = _client_owner_id(instance.client_id), instance.assigned_to_id
+    else:
+        owner_id, user_id = _client_owner_id(instance.client_id), instance.author_id
+    return Tombstone.objects.create(
+        resource=RESOURCES[type(instance)],
+        object_id=instance.pk,
+        owner_id=owner_id,
+        user_id=user_id,
+    )
+
+
+def visible_tombstones(resource: str, user) -> QuerySet[Tombstone]:
+    """Tombstones of rows ``user`` could see, mirroring the API viewsets' scoping."""
+    tombstones = Tombstone.objects.filter(resource=resource)
+    if user.is_superuser:
+        return tombstones
+    if resource == TombstoneResource.CLIENT:
+        return tombstones.filter(owner_id=user.pk)
+    return tombstones.filter(Q(owner_id=user.pk) | Q(user_id=user.pk))
+
+
+def settle_horizon() -> datetime:
+    return timezone.now() - timedelta(seconds=settings.CHANGE_FEED_SETTLE_SECONDS)
+
+
+def initial_cursor(updated_since: datetime | None = None) -> FeedCursor:
+    """Cursor for a first sync: every row (or those changed since ``updated_since``).
+
+    Without ``updated_since`` there is nothing to delete on the client yet, so
+    tombstones start at the current horizon; later deletions are still reported.
+    """
+    if updated_since is not None:
+        return FeedCursor.since(updated_since)
+    return FeedCursor(datetime.min.replace(tzinfo=UTC), 0, settle_horizon(), 0)
+
+
+def _after(queryset: QuerySet, field: str, moment: datetime, pk: int) -> QuerySet:
+    # The redundant ``>=`` gives the planner an index range to start from.
+    return queryset.filter(
+        Q(**{f"{field}__gt": moment}) | Q(**{field: moment, "pk__gt": pk}),
+        **{f"{field}__gte": moment},
+    )
+
+
+def changes(
+    queryset: QuerySet, resource: str, user, cursor: FeedCursor, limit: int
+) -> dict[str, Any]:
+    """One page of the feed after ``cursor``.
+
+    ``queryset`` holds the rows ``user`` may see. Returns the changed rows, the
+    deleted ids, the cursor to continue from and whether more changes are ready.
+    """
+    retention = timezone.now() - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS)
+    if cursor.deleted_at < retention:
+        raise CursorExpired
+    horizon = settle_horizon()
+    rows = list(
+        _after(queryset, "updated_at", cursor.updated_at, cursor.pk)
+        .filter(updated_at__lt=horizon)
+        .order_by("updated_at", "pk")[: limit + 1]
+    )
+    tombstones = visible_tombstones(resource, user)
+    tombstones = list(
+        _after(tombstones, "deleted_at", cursor.deleted_at, cursor.tombstone_pk)
+        .filter(deleted_at__lt=horizon)
+        .order_by("deleted_at", "pk")
+        .values_list("deleted_at", "pk", "object_id")[: limit + 1]
+    )
+    rows_left, tombstones_left = len(rows) > limit, len(tombstones) > limit
+    rows, tombstones = rows[:limit], tombstones[:limit]
+    # A walk that reached the horizon resumes from there, so a client whose scope
+    # sees no deletions keeps a fresh tombstone position and never expires.
+    last_row = (rows[-1].updated_at, rows[-1].pk) if rows_left else (horizon, 0)
+    last_tombstone = tombstones[-1][:2] if tombstones_left else (horizon, 0)
+    return {
+        "rows": rows,
+        "deleted": [object_id for _deleted_at, _pk, object_id in tombstones],
+        "cursor": FeedCursor(*last_row, *last_tombstone),
+        "has_more": rows_left or tombstones_left,
+    }
+
+
+def purge_tombstones(*, older_than: datetime, chunk_size: int = 1000) -> int:
+    """Delete tombstones older than ``older_than`` in chunks; returns how many went."""
+    purged = 0
+    while True:
+        ids = list(
+            Tombstone.objects.filter(deleted_at__lt=older_than)
+            .order_by("deleted_at", "pk")
+            .values_list("pk", flat=True)[:chunk_size]
+        )
+        if not ids:
+            return purged
+        purged += Tombstone.objects.filter(pk__in=ids).delete()[0]
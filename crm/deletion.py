@@ -0,0 +1,218 @@
+"""Soft deletion of clients and users, with the cascade purged in the background.
+
+Deleting a client removes all of its leads (with their stage history) and
+interactions in one transaction, and deleting a user does that for every client
+they own; for a large book that holds row locks long enough to time the request
+out. :func:`soft_delete_clients` only stamps ``Client.deleted_at``: the default
+manager stops returning the client at once, lead and interaction listings skip
+its rows, and the change feed gets the client's tombstone straight away.
+
+:func:`purge_client` (the ``crm.purge_deleted_client`` job) then deletes the
+interactions and the leads in primary-key chunks of ``CLIENT_PURGE_CHUNK_SIZE``,
+each chunk in its own transaction and with ``lock_timeout`` on PostgreSQL, and
+sleeps ``CLIENT_PURGE_PAUSE`` between full chunks so replicas keep up. The client
+row goes last. Chunks are deleted with one ``DELETE`` per table instead of
+``QuerySet.delete()``: the per-row ``post_delete`` receivers would only keep the
+summary of a client that is about to go, so the chunk writes its change-feed
+tombstones itself (in bulk), removes the leads' stage history, and has the
+assignment engine re-read the rep loads when it removed open assigned leads.
+
+:func:`soft_delete_user` deactivates a user and hides their clients;
+:func:`purge_user` purges those clients, clears the user from leads and
+interactions on other clients (what ``SET_NULL`` would do), also in chunks, and
+finally deletes the user. Both purges only touch rows that still exist, so a
+retried job carries on where the previous attempt stopped.
+"""
+from __future__ import annotations
+
+import time
+from collections.abc import Callable, Iterable, Iterator
+from typing import Any
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from crm.assignment import engine
+from crm.changefeed import RESOURCES, record_deletion
+from crm.models import Client, Interaction, Lead, LeadStageChange, Tombstone
+from crm.summaries import OPEN_STATUSES
+
+User = get_user_model()
+
+Progress = Callable[..., None]
+
+
+def _limit_lock_wait() -> None:
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('lock_timeout', %s, true)",
+                [f"{settings.CLIENT_PURGE_LOCK_TIMEOUT_MS}ms"],
+            )
+
+
+def _in_chunks(
+    queryset: QuerySet, apply: Callable[[list[int]], int], chunk_size: int, pause: float
+) -> Iterator[int]:
+    """Run ``apply`` on successive pk chunks of ``queryset``, one transaction each.
+
+    ``apply`` must take the rows out of ``queryset`` (delete or detach them), since
+    every chunk is read from the start again. Yields what each call returns.
+    """
+    while ids := list(queryset.order_by("pk").values_list("pk", flat=True)[:chunk_size]):
+        with transaction.atomic():
+            _limit_lock_wait()
+            done = apply(ids)
+        yield done
+        if len(ids) == chunk_size and pause:
+            time.sleep(pause)
+
+
+def _purge(model: type, owner_id: int | None) -> Callable[[list[int]], int]:
+    """Delete leads or interactions of a purged client, bypassing the delete signals."""
+    user_field = "assigned_to_id" if model is Lead else "author_id"
+    fields = ("pk", user_field, "status") if model is Lead else ("pk", user_field)
+
+    def apply(ids: list[int]) -> int:
+        rows = list(model.objects.select_for_update().filter(pk__in=ids).values(*fields))
+        Tombstone.objects.bulk_create(
+            Tombstone(
+                resource=RESOURCES[model],
+                object_id=row["pk"],
+                owner_id=owner_id,
+                user_id=row[user_field],
+            )
+            for row in rows
+        )
+        if model is Lead:
+            LeadStageChange.objects.filter(lead_id__in=ids)._raw_delete(connection.alias)
+            if any(row[user_field] and row["status"] in OPEN_STATUSES for row in rows):
+                transaction.on_commit(engine.invalidate)
+        return model.objects.filter(pk__in=ids)._raw_delete(connection.alias)
+
+    return apply
+
+
+def _detach(model: type, field: str) -> Callable[[list[int]], int]:
+    def apply(ids: list[int]) -> int:
+        return model.objects.filter(pk__in=ids).update(**{field: None}, updated_at=timezone.now())
+
+    return apply
+
+
+def soft_delete_clients(client_ids: Iterable[int]) -> list[int]:
+    """Hide the clients and record their tombstones; returns the ids that were hidden.
+
+    Call inside the transaction that queues their purge.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        clients = list(
+            Client.objects.select_for_update()
+            .filter(pk__in=list(client_ids))
+            .only("pk", "owner_id")
+            .order_by("pk")
+        )
+        Client.all_objects.filter(pk__in=[client.pk for client in clients]).update(
+            deleted_at=now, updated_at=now
+        )
+        for client in clients:
+            record_deletion(client)
+    return [client.pk for client in clients]
+
+
+def soft_delete_user(user_id: int) -> list[int]:
+    """Deactivate the user and hide their clients; returns the client ids hidden."""
+    with transaction.atomic():
+        User.objects.filter(pk=user_id).update(is_active=False)
+        return soft_delete_clients(
+            Client.objects.filter(owner_id=user_id).values_list("pk", flat=True)
+        )
+
+
+def purge_client(
+    client_id: int,
+    *,
+    chunk_size: int | None = None,
+    pause: float | None = None,
+    progress: Progress | None = None,
+) -> dict[str, int]:
+    """Delete a soft-deleted client's interactions, then its leads, then the client.
+
+    ``progress`` is called with the running counts after every chunk.
+    """
+    chunk_size = chunk_size or settings.CLIENT_PURGE_CHUNK_SIZE
+    pause = settings.CLIENT_PURGE_PAUSE if pause is None else pause
+    report = progress or (lambda **values: None)
+    counts = {"interactions": 0, "leads": 0, "clients": 0}
+    client = Client.all_objects.filter(pk=client_id, deleted_at__isnull=False)
+    found = client.values("owner_id").first()
+    if found is None:
+        return counts
+    for key, model in (("interactions", Interaction), ("leads", Lead)):
+        rows = model.objects.filter(client_id=client_id)
+        for deleted in _in_chunks(rows, _purge(model, found["owner_id"]), chunk_size, pause):
+            counts[key] += deleted
+            report(**counts)
+    with transaction.atomic():
+        _limit_lock_wait()
+        # The client's tombstone was written when it was hidden; ``record_tombstone``
+        # skips rows that still carry ``deleted_at``, so this writes no second one.
+        counts["clients"] = client.delete()[1].get(Client._meta.label, 0)
+    report(**counts)
+    return counts
+
+
+def purge_user(
+    user_id: int,
+    *,
+    chunk_size: int | None = None,
+    pause: float | None = None,
+    progress: Progress | None = None,
+) -> dict[str, Any]:
+    """Purge the user's clients, detach their other leads and interactions, delete them."""
+    chunk_size = chunk_size or settings.CLIENT_PURGE_CHUNK_SIZE
+    pause = settings.CLIENT_PURGE_PAUSE if pause is None else pause
+    report = progress or (lambda **values: None)
+    # Clients created after the user was deactivated are hidden here.
+    soft_delete_user(user_id)
+    client_ids = list(
+        Client.all_objects.filter(owner_id=user_id).order_by("pk").values_list("pk", flat=True)
+    )
+    totals = {
+        "clients": 0,
+        "leads": 0,
+        "interactions": 0,
+        "leads_unassigned": 0,
+        "interactions_detached": 0,
+    }
+    report(phase="clients", clients_total=len(client_ids), **totals)
+    for client_id in client_ids:
+        done = dict(totals)
+
+        def client_progress(**counts: int) -> None:
+            report(**{key: done[key] + counts.get(key, 0) for key in totals})
+
+        for key, value in purge_client(
+            client_id, chunk_size=chunk_size, pause=pause, progress=client_progress
+        ).items():
+            totals[key] += value
+
+    report(phase="detach")
+    for key, model, field in (
+        ("leads_unassigned", Lead, "assigned_to_id"),
+        ("interactions_detached", Interaction, "author_id"),
+    ):
+        rows = model.objects.filter(**{field: user_id})
+        for detached in _in_chunks(rows, _detach(model, field), chunk_size, pause):
+            totals[key] += detached
+            report(**totals)
+
+    with transaction.atomic():
+        _limit_lock_wait()
+        users = User.objects.filter(pk=user_id).delete()[1].get(User._meta.label, 0)
+    report(phase="done", **totals)
+    return {**totals, "users": users}
@@ -0,0 +1,47 @@
+"""django-filter FilterSets for the CRM API.
+
+Every filter here is backed by an index declared on the model (see the
+``Meta.indexes`` of :mod:`crm.models`).
+"""
+from __future__ import annotations
+
+import django_filters
+
+from crm.models import Client, Interaction, InteractionType, Lead, LeadStatus
+
+
+class LeadFilter(django_filters.FilterSet):
+    status = django_filters.MultipleChoiceFilter(choices=LeadStatus.choices)
+    value = django_filters.RangeFilter()
+    expected_close_date = django_filters.DateFromToRangeFilter()
+    assigned_to = django_filters.NumberFilter(field_name="assigned_to_id")
+    unassigned = django_filters.BooleanFilter(field_name="assigned_to", lookup_expr="isnull")
+    source = django_filters.CharFilter()
+    updated_since = django_filters.IsoDateTimeFilter(field_name="updated_at", lookup_expr="gte")
+
+    class Meta:
+        model = Lead
+        fields: list[str] = []
+
+
+class ClientFilter(django_filters.FilterSet):
+    industry = django_filters.CharFilter()
+    owner = django_filters.NumberFilter(field_name="owner_id")
+    created = django_filters.IsoDateTimeFromToRangeFilter(field_name="created_at")
+    open_lead_value = django_filters.RangeFilter()
+    last_interaction = django_filters.IsoDateTimeFromToRangeFilter(field_name="last_interaction_at")
+    follow_up_due = django_filters.DateFilter(field_name="next_follow_up_date", lookup_expr="lte")
+
+    class Meta:
+        model = Client
+        fields: list[str] = []
+
+
+class InteractionFilter(django_filters.FilterSet):
+    interaction_type = django_filters.MultipleChoiceFilter(choices=InteractionType.choices)
+    occurred = django_filters.IsoDateTimeFromToRangeFilter(field_name="occurred_at")
+    follow_up_due = django_filters.DateFilter(field_name="follow_up_date", lookup_expr="lte")
+
+    class Meta:
+        model = Interaction
+        fields: list[str] = []
@@ -0,0 +1,377 @@
+"""Monte Carlo revenue forecast of the open pipeline, per rep, per team and overall.
+
+Open leads of visible (not soft-deleted) clients are loaded once into NumPy arrays
+(value, stage, expected close date, age and rep, i.e. assignee or else client owner).
+Each simulation draws, per lead, whether it is won and in which month it closes;
+revenue is then summed per rep and month, and P10/P50/P90 are read across
+``FORECAST_SIMULATIONS`` runs. Reps are simulated in blocks and reduced to
+percentiles block by block, so only the overall and team sums outlive a block.
+Teams are Django groups and are summed per simulation before taking percentiles,
+which are not additive.
+
+* Win probability per stage comes from :class:`~crm.models.LeadStageChange`: a lead
+  closed from stage *s* also passed through every earlier stage, so
+  ``P(win | reached s)`` is counted over tracked closures and shrunk toward the
+  overall won/(won+lost) rate with weight ``FORECAST_PRIOR_WEIGHT``.
+* Close month is the expected close date when it lies ahead. Otherwise it is
+  sampled from how long won deals took to close, among those that took longer than
+  the lead's age. Leads older than every such deal (or when too few deals are tracked)
+  close uniformly within ``FORECAST_SLIP_DAYS``, and stale leads are discounted by
+  ``FORECAST_STALE_FACTOR``.
+
+Results are stored as a :class:`~crm.models.ForecastSnapshot` under a fingerprint of
+the pipeline (:func:`pipeline_fingerprint`), so every web process sees what the worker
+computed. Requests never run the simulation: when the fingerprint has moved on, the
+previous snapshot is served as ``stale`` while the ``crm.refresh_forecast`` job
+recomputes it, and before the first run there is nothing to show yet.
+"""
+from __future__ import annotations
+
+import calendar
+import hashlib
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import date
+from typing import Any
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, Max
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from crm.jobs import enqueue
+from crm.models import (
+    ForecastSnapshot,
+    Lead,
+    LeadStageChange,
+    LeadStatus,
+    Tombstone,
+    TombstoneResource,
+)
+
+User = get_user_model()
+
+OPEN_STAGES = (LeadStatus.NEW, LeadStatus.CONTACT, LeadStatus.PROPOSAL)
+CLOSED_STAGES = (LeadStatus.WON, LeadStatus.LOST)
+PERCENTILES = (10, 50, 90)
+
+# Registered in ``crm.tasks``.
+REFRESH_TASK = "crm.refresh_forecast"
+
+
+@dataclass
+class Pipeline:
+    """Open leads as parallel arrays, plus the history the model is fitted on."""
+
+    values: np.ndarray  # float64, currency units
+    stages: np.ndarray  # int8 index into OPEN_STAGES
+    close_days: np.ndarray  # days from today to expected close; -1 if unknown or past
+    ages: np.ndarray  # days since creation
+    reps: np.ndarray  # index into rep_ids
+    rep_ids: list[int]
+    won_cycles: np.ndarray  # sorted days from creation to win, tracked wins only
+    stage_probabilities: dict[str, float]
+
+
+def pipeline_fingerprint(today: date | None = None) -> str:
+    """Digest of everything the forecast depends on; changes whenever it should rerun."""
+    today = today or timezone.localdate()
+    leads = Lead.objects.aggregate(last_change=Max("updated_at"), last_id=Max("id"))
+    # Hiding a client (``crm.deletion``) takes its leads out without touching them.
+    last_delete = (
+        Tombstone.objects.filter(resource__in=[TombstoneResource.LEAD, TombstoneResource.CLIENT])
+        .order_by("-deleted_at", "-id")
+        .values_list("id", flat=True)
+        .first()
+    )
+    last_stage_change = LeadStageChange.objects.aggregate(last=Max("id"))["last"]
+    memberships = User.groups.through.objects.aggregate(count=Count("id"), last=Max("id"))
+    parts = (
+        today,
+        leads["last_change"],
+        leads["last_id"],
+        last_delete,
+        last_stage_change,
+        memberships["count"],
+        memberships["last"],
+        settings.FORECAST_SIMULATIONS,
+        settings.FORECAST_HORIZON_MONTHS,
+    )
+    return hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+
+
+def stage_probabilities() -> dict[str, float]:
+    """``P(win | reached stage)`` for each open stage, with an empirical-Bayes prior."""
+    outcomes = dict(
+        Lead.objects.filter(status__in=CLOSED_STAGES)
+        .order_by()
+        .values_list("status")
+        .annotate(total=Count("id"))
+    )
+    won, lost = outcomes.get(LeadStatus.WON, 0), outcomes.get(LeadStatus.LOST, 0)
+    prior = (won + 1) / (won + lost + 2)
+    # Latest closing transition of each lead, if the lead is still closed that way.
+    closures = {
+        lead_id: (from_status, to_status)
+        for lead_id, from_status, to_status in LeadStageChange.objects.filter(
+            to_status__in=CLOSED_STAGES, lead__status=F("to_status"), from_status__in=OPEN_STAGES
+        )
+        .order_by("lead_id", "changed_at", "id")
+        .values_list("lead_id", "from_status", "to_status")
+    }
+    rank = {stage: index for index, stage in enumerate(OPEN_STAGES)}
+    reached = np.zeros(len(OPEN_STAGES))
+    wins = np.zeros(len(OPEN_STAGES))
+    for from_status, to_status in closures.values():
+        # Closing from stage s means every stage up to s was reached.
+        reached[: rank[from_status] + 1] += 1
+        if to_status == LeadStatus.WON:
+            wins[: rank[from_status] + 1] += 1
+    weight = settings.FORECAST_PRIOR_WEIGHT
+    probabilities = (wins + weight * prior) / (reached + weight)
+    return {stage: float(p) for stage, p in zip(OPEN_STAGES, probabilities)}
+
+
+def won_cycle_days() -> np.ndarray:
+    """Sorted days from creation to the (latest) win of tracked won leads."""
+    won_at = dict(
+        LeadStageChange.objects.filter(to_status=LeadStatus.WON, lead__status=LeadStatus.WON)
+        .order_by("lead_id", "changed_at", "id")
+        .values_list("lead_id", "changed_at")
+    )
+    created_at = dict(Lead.objects.filter(pk__in=won_at).values_list("pk", "created_at"))
+    cycles = np.fromiter(
+        ((won_at[pk] - created).total_seconds() / 86400 for pk, created in created_at.items()),
+        dtype=np.float64,
+        count=len(created_at),
+    )
+    return np.sort(np.maximum(cycles, 0))
+
+
+def load_pipeline(today: date) -> Pipeline:
+    rows = list(
+        Lead.objects.filter(status__in=OPEN_STAGES, client__deleted_at__isnull=True)
+        .order_by()
+        .values_list(
+            "value",
+            "status",
+            "expected_close_date",
+            "created_at",
+            Coalesce("assigned_to_id", "client__owner_id"),
+        )
+    )
+    now = timezone.now()
+    rank = {stage: index for index, stage in enumerate(OPEN_STAGES)}
+    rep_ids = sorted({row[4] for row in rows})
+    rep_index = {rep_id: index for index, rep_id in enumerate(rep_ids)}
+    count = len(rows)
+    return Pipeline(
+        values=np.fromiter((row[0] for row in rows), dtype=np.float64, count=count),
+        stages=np.fromiter((rank[row[1]] for row in rows), dtype=np.int8, count=count),
+        close_days=np.fromiter(
+            ((row[2] - today).days if row[2] and row[2] >= today else -1 for row in rows),
+            dtype=np.int32,
+            count=count,
+        ),
+        ages=np.fromiter(
+            ((now - row[3]).total_seconds() / 86400 for row in rows),
+            dtype=np.float64,
+            count=count,
+        ),
+        reps=np.fromiter((rep_index[row[4]] for row in rows), dtype=np.int32, count=count),
+        rep_ids=rep_ids,
+        won_cycles=won_cycle_days(),
+        stage_probabilities=stage_probabilities(),
+    )
+
+
+def month_bounds(today: date, months: int) -> tuple[list[str], np.ndarray]:
+    """Labels of the horizon's months and the day offset (from today) where each ends."""
+    labels, ends = [], []
+    year, month = today.year, today.month
+    for _ in range(months):
+        last_day = calendar.monthrange(year, month)[1]
+        labels.append(f"{year:04d}-{month:02d}")
+        ends.append((date(year, month, last_day) - today).days + 1)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return labels, np.asarray(ends, dtype=np.float64)
+
+
+def simulate(pipeline: Pipeline, today: date, seed: int) -> Iterator[tuple[int, np.ndarray]]:
+    """Revenue per simulation, rep and month, in blocks of consecutive reps.
+
+    Yields ``(first rep position, array shaped (sims, reps in block, months))``. A
+    block holds at most ``FORECAST_CHUNK_CELLS`` cells (and at least one rep), and
+    only its own leads are drawn, so memory does not grow with the number of reps.
+    """
+    _labels, ends = month_bounds(today, settings.FORECAST_HORIZON_MONTHS)
+    months = len(ends)
+    simulations = settings.FORECAST_SIMULATIONS
+    reps = len(pipeline.rep_ids)
+    if not reps:
+        return
+
+    rng = np.random.default_rng(seed)
+    probability = np.array(
+        [pipeline.stage_probabilities[stage] for stage in OPEN_STAGES]
+    )[pipeline.stages]
+    dated = pipeline.close_days >= 0
+    cycles = pipeline.won_cycles
+    enough_history = len(cycles) >= settings.FORECAST_MIN_HISTORY
+    # Index of the first won cycle longer than each lead's age.
+    first_longer = np.searchsorted(cycles, pipeline.ages, side="right")
+    remaining_choices = len(cycles) - first_longer
+    from_history = ~dated & enough_history & (remaining_choices > 0)
+    stale = ~dated & ~from_history
+    if enough_history:
+        probability = np.where(stale, probability * settings.FORECAST_STALE_FACTOR, probability)
+    fixed_month = np.searchsorted(ends, pipeline.close_days, side="right")
+
+    # Leads of rep ``r`` are ``order[bounds[r]:bounds[r + 1]]``.
+    order = np.argsort(pipeline.reps, kind="stable")
+    bounds = np.searchsorted(pipeline.reps[order], np.arange(reps + 1))
+    reps_per_block = max(1, settings.FORECAST_CHUNK_CELLS // (simulations * months))
+    for first in range(0, reps, reps_per_block):
+        block_reps = min(reps_per_block, reps - first)
+        selected = order[bounds[first] : bounds[first + block_reps]]
+        leads = len(selected)
+        totals = np.zeros((simulations, block_reps, months), dtype=np.float32)
+        bucket_base = (pipeline.reps[selected].astype(np.int64) - first) * months
+        values, ages = pipeline.values[selected], pipeline.ages[selected]
+        chunk = max(1, settings.FORECAST_CHUNK_CELLS // leads)
+        for start in range(0, simulations, chunk):
+            size = min(chunk, simulations - start)
+            won = rng.random((size, leads)) < probability[selected]
+            draws = rng.random((size, leads))
+            pick = first_longer[selected] + np.floor(
+                draws * remaining_choices[selected]
+            ).astype(np.int64)
+            sampled_days = draws * settings.FORECAST_SLIP_DAYS
+            if len(cycles):
+                from_cycles = cycles[np.minimum(pick, len(cycles) - 1)] - ages
+                sampled_days = np.where(from_history[selected], from_cycles, sampled_days)
+            month = np.where(
+                dated[selected],
+                fixed_month[selected],
+                np.searchsorted(ends, sampled_days, side="right"),
+            )
+            keep = won & (month < months)
+            rows = np.broadcast_to(np.arange(size)[:, None] * block_reps * months, (size, leads))
+            flat = (rows + bucket_base + month)[keep]
+            weights = np.broadcast_to(values, (size, leads))[keep]
+            totals[start : start + size] = np.bincount(
+                flat, weights=weights, minlength=size * block_reps * months
+            ).reshape(size, block_reps, months)
+        yield first, totals
+
+
+def _summary(samples: np.ndarray) -> dict[str, list[float]]:
+    """Percentiles and mean over the first axis of ``(sims, months)`` samples."""
+    p10, p50, p90 = np.percentile(samples, PERCENTILES, axis=0)
+    return {
+        "p10": np.round(p10, 2).tolist(),
+        "p50": np.round(p50, 2).tolist(),
+        "p90": np.round(p90, 2).tolist(),
+        "expected": np.round(samples.mean(axis=0), 2).tolist(),
+    }
+
+
+def _label(user, user_id: int) -> str:
+    return (user.get_full_name() or user.username) if user else f"#{user_id}"
+
+
+def compute_forecast(fingerprint: str | None = None) -> dict[str, Any]:
+    """Run the simulation and store it as the only snapshot, under ``fingerprint``."""
+    today = timezone.localdate()
+    fingerprint = fingerprint or pipeline_fingerprint(today)
+    pipeline = load_pipeline(today)
+    seed = int(fingerprint[:8], 16)
+    labels, _ends = month_bounds(today, settings.FORECAST_HORIZON_MONTHS)
+
+    users = User.objects.in_bulk(pipeline.rep_ids)
+    teams: dict[int, dict[str, Any]] = {}
+    rep_teams: dict[int, list[int]] = {}
+    memberships = User.groups.through.objects.filter(user_id__in=pipeline.rep_ids).values_list(
+        "group_id", "group__name", "user_id"
+    )
+    for group_id, name, user_id in memberships:
+        team = teams.setdefault(group_id, {"name": name, "members": []})
+        team["members"].append(user_id)
+        rep_teams.setdefault(user_id, []).append(group_id)
+
+    # Reps are reduced to percentiles block by block; only the total and the team
+    # sums are kept across blocks.
+    shape = (settings.FORECAST_SIMULATIONS, len(labels))
+    total = np.zeros(shape)
+    team_totals = {group_id: np.zeros(shape) for group_id in teams}
+    reps: dict[int, dict[str, Any]] = {}
+    for first, block in simulate(pipeline, today, seed):
+        total += block.sum(axis=1)
+        for offset, rep_id in enumerate(pipeline.rep_ids[first : first + block.shape[1]]):
+            samples = block[:, offset, :]
+            reps[rep_id] = {"label": _label(users.get(rep_id), rep_id), **_summary(samples)}
+            for group_id in rep_teams.get(rep_id, ()):
+                team_totals[group_id] += samples
+
+    result = {
+        "fingerprint": fingerprint,
+        "generated_at": timezone.now().isoformat(),
+        "simulations": settings.FORECAST_SIMULATIONS,
+        "months": labels,
+        "open_leads": int(len(pipeline.values)),
+        "open_value": round(float(pipeline.values.sum()), 2),
+        "stage_probabilities": {
+            str(stage): round(p, 4) for stage, p in pipeline.stage_probabilities.items()
+        },
+        "total": _summary(total),
+        "reps": reps,
+        "teams": {
+            group_id: {
+                "name": team["name"],
+                "members": sorted(team["members"]),
+                **_summary(team_totals[group_id]),
+            }
+            for group_id, team in teams.items()
+        },
+    }
+    snapshot, _created = ForecastSnapshot.objects.update_or_create(
+        fingerprint=fingerprint, defaults={"result": result}
+    )
+    ForecastSnapshot.objects.exclude(pk=snapshot.pk).delete()
+    return result
+
+
+def get_forecast() -> dict[str, Any] | None:
+    """The current forecast, or the previous one (``stale``) while a job refreshes it.
+
+    Returns ``None`` until the first refresh has finished; the simulation always runs
+    in the worker, never in the request.
+    """
+    fingerprint = pipeline_fingerprint()
+    latest = ForecastSnapshot.objects.values_list("result", flat=True).first()
+    if latest is not None and latest["fingerprint"] == fingerprint:
+        return {**latest, "stale": False}
+    enqueue(REFRESH_TASK, dedup_key=REFRESH_TASK)
+    return None if latest is None else {**latest, "stale": True}
+
+
+def visible_forecast(forecast: dict[str, Any], user) -> dict[str, Any]:
+    """Restrict a forecast to what ``user`` may see: own rep row and own teams."""
+    if user.is_superuser:
+        return forecast
+    # Stored snapshots went through JSON, so their ids are string keys.
+    team_ids = {str(pk) for pk in user.groups.values_list("pk", flat=True)}
+    return {
+        **forecast,
+        "total": None,
+        "reps": {
+            rep_id: row for rep_id, row in forecast["reps"].items() if str(rep_id) == str(user.pk)
+        },
+        "teams": {
+            group_id: row
+            for group_id, row in forecast["teams"].items()
+            if str(group_id) in team_ids
+        },
+    }
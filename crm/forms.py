@@ -4,8 +4,37 @@ from __future__ import annotations
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
+from django.urls import reverse_lazy
 
+from crm.autocomplete import assignable_users, user_label, visible_clients
 from crm.models import Client, Interaction, Lead, Profile
+from crm.reassignment import Strategy
+
+
+class AutocompleteSelect(forms.Select):
+    """``<select>`` that renders only the selected option and is filled by typeahead.
+
+    ``js/autocomplete.js`` adds a search box that queries ``url``; the submitted id
+    is still validated against the field's queryset, so scoping is unchanged.
+    """
+
+    class Media:
+        js = ("js/autocomplete.js",)
+
+    def __init__(self, url, attrs=None) -> None:
+        super().__init__(attrs={"data-autocomplete-url": url, **(attrs or {})})
+
+    def optgroups(self, name, value, attrs=None):
+        choices = self.choices
+        selected = [item for item in value if str(item).isdigit()]
+        options = [] if choices.field.empty_label is None else [("", choices.field.empty_label)]
+        if selected:
+            options += [choices.choice(obj) for obj in choices.queryset.filter(pk__in=selected)]
+        self.choices = options
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = choices
 
 
 class ProfileForm(forms.ModelForm):
@@ -52,13 +81,22 @@ class LeadForm(forms.ModelForm):
             "value",
             "expected_close_date",
         ]
+        widgets = {
+            "client": AutocompleteSelect(reverse_lazy("crm:autocomplete-clients")),
+            "assigned_to": AutocompleteSelect(reverse_lazy("crm:autocomplete-users")),
+        }
 
     def __init__(self, *args, **kwargs):
         user = kwargs.pop("user", None)
         super().__init__(*args, **kwargs)
-        self.fields["assigned_to"].queryset = User.objects.filter(is_active=True)
-        if user and not user.is_superuser:
-            self.fields["client"].queryset = Client.objects.filter(owner=user)
+        self.fields["assigned_to"].queryset = assignable_users()
+        self.fields["assigned_to"].label_from_instance = user_label
+        if self.instance.pk is None:
+            self.fields["assigned_to"].help_text = (
+                "Deixe em branco para entregar ao vendedor com menor carga."
+            )
+        if user:
+            self.fields["client"].queryset = visible_clients(user)
 
 
 class InteractionForm(forms.ModelForm):
@@ -77,6 +115,7 @@ class InteractionForm(forms.ModelForm):
             "follow_up_date",
         ]
         widgets = {
+            "client": AutocompleteSelect(reverse_lazy("crm:autocomplete-clients")),
             "notes": forms.Textarea(attrs={"rows": 4}),
             "follow_up_date": forms.DateInput(attrs={"type": "date"}),
         }
@@ -84,8 +123,8 @@ class InteractionForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         user = kwargs.pop("user", None)
         super().__init__(*args, **kwargs)
-        if user and not user.is_superuser:
-            self.fields["client"].queryset = Client.objects.filter(owner=user)
+        if user:
+            self.fields["client"].queryset = visible_clients(user)
 
 
 class SignUpForm(UserCreationForm):
@@ -105,3 +144,24 @@ class SignUpForm(UserCreationForm):
         if commit:
             user.save()
         return user
+
+
+class ReassignmentForm(forms.Form):
+    """Targets and split strategy for the admin "transfer book" action."""
+
+    to_users = forms.ModelMultipleChoiceField(
+        queryset=User.objects.filter(is_active=True).order_by("username"),
+        label="Transferir para",
+    )
+    strategy = forms.ChoiceField(
+        choices=Strategy.choices,
+        initial=Strategy.ROUND_ROBIN,
+        label="Divisão entre os destinos",
+    )
+    chunk_size = forms.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=10000,
+        label="Registros por transação",
+        help_text="Em branco usa REASSIGN_CHUNK_SIZE.",
+    )
@@ -0,0 +1,159 @@
+"""Versioned template-fragment caching for lead cards and client rows.
+
+Fragments are cached under ``fragment:<family>:<FRAGMENT_CACHE_VERSION>:<digest>``
+where the digest covers everything the fragment displays: a lead card hashes the
+lead's ``pk`` and ``updated_at`` plus the client/assignee values it shows, and a
+column or page hashes its members' versions. Nothing is ever invalidated
+explicitly: a change produces a new key, and the outer fragment misses while the
+unchanged inner ones still hit, so only the changed card's template runs again.
+Stale keys expire after ``FRAGMENT_CACHE_TIMEOUT``.
+
+Hits and misses are counted per family in-process and added to the shared cache
+every ``FRAGMENT_METRICS_FLUSH_SECONDS``; ``manage.py fragment_stats`` reports them.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import caches
+
+FAMILIES = (
+    "lead_card",
+    "lead_page",
+    "pipeline_card",
+    "pipeline_column",
+    "client_row",
+    "client_page",
+)
+
+STATS_KEY = "fragment-stats:{family}:{kind}"
+
+
+def fragment_cache():
+    return caches[settings.FRAGMENT_CACHE_ALIAS]
+
+
+def version(*parts: Any) -> str:
+    """Short digest of ``parts``; equal inputs give equal versions across processes."""
+    return hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+
+
+def _user_label(user) -> str:
+    return (user.get_full_name() or user.username) if user else ""
+
+
+def lead_version(lead) -> str:
+    """Version of a lead card (expects ``client`` and ``assigned_to`` to be selected)."""
+    client = lead.client
+    return version(
+        lead.pk,
+        lead.updated_at,
+        client.updated_at,
+        client.interaction_count,
+        lead.assigned_to_id,
+        _user_label(lead.assigned_to),
+    )
+
+
+def client_version(client) -> str:
+    """Version of a client row: its own columns, summary columns and owner label."""
+    return version(
+        client.pk,
+        client.updated_at,
+        client.interaction_count,
+        client.last_interaction_at,
+        client.next_follow_up_date,
+        client.open_lead_count,
+        client.open_lead_value,
+        client.owner_id,
+        _user_label(client.owner),
+    )
+
+
+def group_version(*parts: Any, members: Iterable[str]) -> str:
+    """Version of a column or page from its own ``parts`` and its members' versions."""
+    return version(*parts, tuple(members))
+
+
+class FragmentMetrics:
+    """Per-family hit/miss counters, periodically added to the shared cache."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pending: dict[tuple[str, str], int] = {}
+        self._last_flush = time.monotonic()
+
+    def record(self, family: str, hit: bool) -> None:
+        kind = "hits" if hit else "misses"
+        with self._lock:
+            self._pending[family, kind] = self._pending.get((family, kind), 0) + 1
+            due = time.monotonic() - self._last_flush >= settings.FRAGMENT_METRICS_FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        cache = fragment_cache()
+        for (family, kind), count in pending.items():
+            key = STATS_KEY.format(family=family, kind=kind)
+            cache.add(key, 0, None)
+            try:
+                cache.incr(key, count)
+            except ValueError:  # evicted between add() and incr()
+                cache.set(key, count, None)
+
+    def totals(self) -> dict[str, dict[str, Any]]:
+        """Shared hit/miss counts and hit rate per family (after flushing this process)."""
+        self.flush()
+        keys = [
+            STATS_KEY.format(family=family, kind=kind)
+            for family in FAMILIES
+            for kind in ("hits", "misses")
+        ]
+        stored = fragment_cache().get_many(keys)
+        totals = {}
+        for family in FAMILIES:
+            hits = stored.get(STATS_KEY.format(family=family, kind="hits"), 0)
+            misses = stored.get(STATS_KEY.format(family=family, kind="misses"), 0)
+            lookups = hits + misses
+            totals[family] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else None,
+            }
+        return totals
+
+    def reset(self) -> None:
+        with self._lock:
+            self._pending = {}
+        fragment_cache().delete_many(
+            [
+                STATS_KEY.format(family=family, kind=kind)
+                for family in FAMILIES
+                for kind in ("hits", "misses")
+            ]
+        )
+
+
+metrics = FragmentMetrics()
+
+
+def get_or_render(family: str, fragment_version: str, render: Callable[[], str]) -> str:
+    """Cached HTML of a fragment, rendering and storing it on a miss."""
+    if not settings.FRAGMENT_CACHE_ENABLED:
+        return render()
+    cache = fragment_cache()
+    key = f"fragment:{family}:{settings.FRAGMENT_CACHE_VERSION}:{fragment_version}"
+    html = cache.get(key)
+    metrics.record(family, hit=html is not None)
+    if html is None:
+        html = render()
+        cache.set(key, html, settings.FRAGMENT_CACHE_TIMEOUT)
+    return html
@@ -0,0 +1,111 @@
+"""Bulk, idempotent ingestion of interactions coming from integrations."""
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator
+from itertools import islice
+from typing import Any
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from crm import webhooks
+from crm.models import Client, Interaction
+from crm.summaries import refresh_summaries
+
+
+def _chunks(items: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _insert(rows: list[Interaction]) -> list[Interaction]:
+    """Insert ``rows`` of one author and return those stored; a key that races in is skipped.
+
+    The chunk goes in as one ``INSERT`` that ignores conflicts on the
+    ``(author, idempotency_key)`` constraint. That does not report which rows it wrote,
+    so the keys are selected again: a row is ours when it carries the ``created_at``
+    stamped on it here rather than a concurrent delivery's.
+    """
+    if not rows:
+        return []
+    Interaction.objects.bulk_create(rows, ignore_conflicts=True)
+    ours = {row.idempotency_key: row for row in rows}
+    stored = Interaction.objects.filter(
+        author_id=rows[0].author_id, idempotency_key__in=list(ours)
+    ).values_list("idempotency_key", "pk", "created_at")
+    for key, pk, created_at in stored:
+        if created_at == ours[key].created_at:
+            ours[key].pk = pk
+    return [row for row in rows if row.pk is not None]
+
+
+def ingest_interactions(items: list[dict[str, Any]], *, user) -> dict[str, Any]:
+    """Insert validated ingest items in bulk, skipping keys the user already stored.
+
+    Idempotency keys are scoped to their author: another user's key neither blocks
+    nor reveals anything. Client ownership is resolved once for the whole batch and
+    rows are written in bulk; ``accepted`` counts the rows actually inserted, so a
+    key stored by a concurrent delivery of the same batch counts as a duplicate.
+    """
+    chunk_size = settings.INTERACTION_INGEST_CHUNK_SIZE
+    clients = Client.objects.filter(pk__in={item["client_id"] for item in items})
+    if not user.is_superuser:
+        clients = clients.filter(owner=user)
+    allowed = set(clients.values_list("pk", flat=True))
+
+    rejected: list[dict[str, Any]] = []
+    pending: dict[str, dict[str, Any]] = {}
+    duplicates = 0
+    for index, item in enumerate(items):
+        if item["client_id"] not in allowed:
+            rejected.append({"index": index, "client_id": item["client_id"]})
+        elif item["idempotency_key"] in pending:
+            duplicates += 1
+        else:
+            pending[item["idempotency_key"]] = item
+
+    for keys in _chunks(list(pending), chunk_size):
+        for key in Interaction.objects.filter(
+            author=user, idempotency_key__in=keys
+        ).values_list("idempotency_key", flat=True):
+            pending.pop(key)
+            duplicates += 1
+
+    rows = (
+        Interaction(
+            client_id=item["client_id"],
+            author=user,
+            interaction_type=item["interaction_type"],
+            subject=item["subject"],
+            notes=item["notes"],
+            occurred_at=item["occurred_at"],
+            follow_up_date=item["follow_up_date"],
+            idempotency_key=key,
+        )
+        for key, item in pending.items()
+    )
+    inserted: list[Interaction] = []
+    with transaction.atomic():
+        for chunk in _chunks(rows, chunk_size):
+            inserted.extend(_insert(chunk))
+        # bulk_create skips model signals, so the client summaries are recomputed here
+        # and the webhook events are queued here.
+        refresh_summaries({interaction.client_id for interaction in inserted})
+        if inserted and webhooks.enabled():
+            for chunk in _chunks([interaction.pk for interaction in inserted], chunk_size):
+                stored = Interaction.objects.filter(pk__in=chunk).annotate(
+                    client_owner_id=F("client__owner_id")
+                )
+                webhooks.record_events(
+                    webhooks.interaction_logged(interaction, interaction.client_owner_id)
+                    for interaction in stored
+                )
+
+    return {
+        "received": len(items),
+        "accepted": len(inserted),
+        "duplicates": duplicates + len(pending) - len(inserted),
+        "rejected": rejected,
+    }
@@ -0,0 +1,360 @@
+"""Database-backed background job queue.
+
+Jobs are rows in ``crm_job``. Producers call :func:`enqueue` (or ``<task>.enqueue``)
+and ``manage.py run_worker`` claims due jobs with ``SELECT … FOR UPDATE SKIP LOCKED``
+so several workers can share the table without a broker. On backends without
+row locks (SQLite) the claim still only takes rows that are queued when it writes.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+from collections.abc import Callable
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any
+
+import django
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from crm.models import Job, JobStatus
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TaskSpec:
+    name: str
+    func: Callable[..., Any]
+    bind: bool
+    max_attempts: int
+    priority: int
+
+
+_registry: dict[str, TaskSpec] = {}
+
+
+def task(
+    name: str | None = None,
+    *,
+    bind: bool = False,
+    max_attempts: int = 5,
+    priority: int = 0,
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Register a function as a background task.
+
+    The payload of the job is passed as keyword arguments; with ``bind=True`` the
+    :class:`~crm.models.Job` instance is passed first so the task can report progress.
+    """
+
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        task_name = name or f"{func.__module__}.{func.__name__}"
+        _registry[task_name] = TaskSpec(task_name, func, bind, max_attempts, priority)
+
+        def enqueue_task(
+            *,
+            priority: int | None = None,
+            dedup_key: str | None = None,
+            run_at: datetime | None = None,
+            **payload: Any,
+        ) -> Job:
+            return enqueue(
+                task_name, payload, priority=priority, dedup_key=dedup_key, run_at=run_at
+            )
+
+        func.task_name = task_name  # type: ignore[attr-defined]
+        func.enqueue = enqueue_task  # type: ignore[attr-defined]
+        return func
+
+    return decorator
+
+
+def get_task(name: str) -> TaskSpec:
+    try:
+        return _registry[name]
+    except KeyError as exc:
+        raise LookupError(f"Task '{name}' is not registered.") from exc
+
+
+def enqueue(
+    task_name: str,
+    payload: dict[str, Any] | None = None,
+    *,
+    priority: int | None = None,
+    dedup_key: str | None = None,
+    run_at: datetime | None = None,
+) -> Job:
+    """Queue ``task_name``; returns the already active job when ``dedup_key`` matches one."""
+    spec = get_task(task_name)
+    if dedup_key:
+        existing = Job.objects.filter(dedup_key=dedup_key, status__in=Job.ACTIVE_STATUSES).first()
+        if existing:
+            return existing
+    try:
+        with transaction.atomic():
+            return Job.objects.create(
+                task=task_name,
+                payload=payload or {},
+                priority=spec.priority if priority is None else priority,
+                dedup_key=dedup_key,
+                max_attempts=spec.max_attempts,
+                run_at=run_at or timezone.now(),
+            )
+    except IntegrityError:
+        if not dedup_key:
+            raise
+        return Job.objects.get(dedup_key=dedup_key, status__in=Job.ACTIVE_STATUSES)
+
+
+def set_progress(job: Job, **values: Any) -> None:
+    """Merge ``values`` into the job progress without touching the rest of the row."""
+    job.progress = {**job.progress, **values}
+    Job.objects.filter(pk=job.pk).update(progress=job.progress, updated_at=timezone.now())
+
+
+def claim(worker_id: str, limit: int) -> list[int]:
+    """Mark up to ``limit`` due jobs as running for ``worker_id`` and return their ids.
+
+    The due rows are locked with ``SELECT … FOR UPDATE SKIP LOCKED`` and then updated
+    by id, in one transaction, so concurrent workers never block on, or double-claim,
+    the same rows. The ids are read first because PostgreSQL may rescan a locking
+    ``LIMIT`` subquery inside ``UPDATE … WHERE id IN (…)`` and claim past the limit.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        due = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=JobStatus.QUEUED, run_at__lte=now)
+            .order_by("-priority", "run_at", "pk")
+            .values_list("pk", flat=True)[:limit]
+        )
+        if not due:
+            return []
+        claimed = Job.objects.filter(pk__in=due, status=JobStatus.QUEUED).update(
+            status=JobStatus.RUNNING,
+            locked_by=worker_id,
+            locked_at=now,
+            attempts=F("attempts") + 1,
+            updated_at=now,
+        )
+    if not claimed:
+        return []
+    return list(
+        Job.objects.filter(status=JobStatus.RUNNING, locked_by=worker_id, locked_at=now)
+        .order_by("-priority", "run_at", "pk")
+        .values_list("pk", flat=True)
+    )
+
+
+def requeue_stale(timeout: int) -> int:
+    """Return jobs whose worker died mid-run to the queue; returns how many were requeued.
+
+    A job whose lock expired on its last allowed attempt is marked failed instead,
+    so a task that keeps crashing its worker process is not retried forever.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=timeout)
+    stale = Job.objects.filter(status=JobStatus.RUNNING, locked_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status=JobStatus.FAILED,
+        last_error="Worker lock expired on the last attempt.",
+        finished_at=now,
+        updated_at=now,
+    )
+    if failed:
+        logger.warning("%s stale job(s) failed after their last attempt", failed)
+    return stale.update(
+        status=JobStatus.QUEUED,
+        locked_by="",
+        locked_at=None,
+        last_error="Worker lock expired.",
+        updated_at=now,
+    )
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter, capped at ``JOB_RETRY_MAX_DELAY`` seconds."""
+    base = settings.JOB_RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0)
+    return min(base, settings.JOB_RETRY_MAX_DELAY) * random.uniform(0.8, 1.2)
+
+
+def execute_job(job_id: int) -> tuple[str, str, float]:
+    """Run one claimed job and persist its outcome; returns ``(task, outcome, seconds)``."""
+    close_old_connections()
+    job = Job.objects.get(pk=job_id)
+    started = time.perf_counter()
+    try:
+        spec = get_task(job.task)
+        args = (job,) if spec.bind else ()
+        result = spec.func(*args, **job.payload)
+    except Exception:  # noqa: BLE001 - any task failure is recorded on the job
+        elapsed = time.perf_counter() - started
+        error = traceback.format_exc()
+        now = timezone.now()
+        if job.attempts < job.max_attempts:
+            outcome = "retried"
+            Job.objects.filter(pk=job.pk).update(
+                status=JobStatus.QUEUED,
+                run_at=now + timedelta(seconds=retry_delay(job.attempts)),
+                locked_by="",
+                locked_at=None,
+                last_error=error,
+                updated_at=now,
+            )
+        else:
+            outcome = "failed"
+            Job.objects.filter(pk=job.pk).update(
+                status=JobStatus.FAILED,
+                last_error=error,
+                finished_at=now,
+                updated_at=now,
+            )
+        logger.warning("Job %s (%s) %s after %.3fs", job.pk, job.task, outcome, elapsed)
+    else:
+        elapsed = time.perf_counter() - started
+        now = timezone.now()
+        try:
+            json.dumps(result)
+        except (TypeError, ValueError):
+            # The result cannot be stored; the work is done, so do not retry it.
+            outcome = "failed"
+            Job.objects.filter(pk=job.pk).update(
+                status=JobStatus.FAILED,
+                last_error=f"Task result is not JSON-serializable:\n{traceback.format_exc()}",
+                finished_at=now,
+                updated_at=now,
+            )
+            logger.warning("Job %s (%s) returned a result that is not JSON", job.pk, job.task)
+        else:
+            outcome = "succeeded"
+            Job.objects.filter(pk=job.pk).update(
+                status=JobStatus.SUCCEEDED,
+                result=result,
+                finished_at=now,
+                updated_at=now,
+            )
+    finally:
+        close_old_connections()
+    return job.task, outcome, elapsed
+
+
+@dataclass
+class WorkerMetrics:
+    claimed: int = 0
+    outcomes: dict[str, int] = field(default_factory=dict)
+    durations: dict[str, list[float]] = field(default_factory=dict)
+
+    def record(self, task_name: str, outcome: str, seconds: float) -> None:
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        count, total, worst = self.durations.get(task_name, [0, 0.0, 0.0])
+        self.durations[task_name] = [count + 1, total + seconds, max(worst, seconds)]
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "claimed": self.claimed,
+            "outcomes": dict(self.outcomes),
+            "tasks": {
+                name: {
+                    "runs": int(count),
+                    "avg_seconds": round(total / count, 4),
+                    "max_seconds": round(worst, 4),
+                }
+                for name, (count, total, worst) in self.durations.items()
+            },
+        }
+
+
+class Worker:
+    """Claims due jobs and runs them on a thread or process pool."""
+
+    def __init__(
+        self,
+        *,
+        concurrency: int,
+        pool: str = "thread",
+        poll_interval: float = 1.0,
+        stale_timeout: int = 900,
+        metrics_interval: float = 60.0,
+    ) -> None:
+        self.concurrency = concurrency
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.stale_timeout = stale_timeout
+        self.metrics_interval = metrics_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.metrics = WorkerMetrics()
+        self._stopping = threading.Event()
+
+    def stop(self, *_: object) -> None:
+        self._stopping.set()
+
+    def _executor(self) -> Executor:
+        if self.pool == "process":
+            # Spawned (not forked) children never inherit the parent's database sockets.
+            return ProcessPoolExecutor(
+                max_workers=self.concurrency,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=django.setup,
+            )
+        return ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="crm-worker")
+
+    def _collect(self, done: Future) -> None:
+        try:
+            self.metrics.record(*done.result())
+        except Exception:  # noqa: BLE001 - bookkeeping failures must not kill the loop
+            logger.exception("Job execution crashed outside the task body")
+
+    def run(self, *, burst: bool = False) -> WorkerMetrics:
+        """Process jobs until stopped; with ``burst`` exit once the queue is drained."""
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+        in_flight: set[Future] = set()
+        last_metrics, last_stale_check = time.monotonic(), 0.0
+        with self._executor() as executor:
+            while not self._stopping.is_set():
+                now = time.monotonic()
+                if now - last_stale_check >= self.stale_timeout / 4:
+                    requeue_stale(self.stale_timeout)
+                    last_stale_check = now
+                for future in [future for future in in_flight if future.done()]:
+                    in_flight.discard(future)
+                    self._collect(future)
+                free = self.concurrency - len(in_flight)
+                job_ids = claim(self.worker_id, free) if free > 0 else []
+                self.metrics.claimed += len(job_ids)
+                for job_id in job_ids:
+                    in_flight.add(executor.submit(execute_job, job_id))
+                if self.metrics_interval and now - last_metrics >= self.metrics_interval:
+                    logger.info("Worker %s metrics: %s", self.worker_id, self.metrics.summary())
+                    last_metrics = now
+                if job_ids:
+                    continue
+                if burst and not in_flight:
+                    break
+                if in_flight:
+                    wait(in_flight, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                else:
+                    self._stopping.wait(self.poll_interval)
+            for future in in_flight:
+                self._collect(future)
+        return self.metrics
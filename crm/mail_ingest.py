@@ -0,0 +1,458 @@
+"""Import of email archives (mbox files and ``.eml`` messages) as interactions.
+
+Archives are cut into work units: mbox files into byte ranges of ``chunk_bytes``
+whose edges move forward to the next ``From `` separator line, so a single large
+mbox is still parsed by several processes, and ``.eml`` files into groups. Workers
+read their unit line by line and parse one message at a time, so memory is bounded
+by the largest message rather than the archive. Headers are parsed first; only
+messages whose From/To/Cc addresses match a ``Client.email`` are parsed in full.
+
+Each worker receives the address index (client e-mail → client ids, user e-mail →
+user id) once, when the pool starts, and sends back one row per matched client
+with the plain-text body (HTML converted, quoted reply lines dropped) as ``notes``.
+The author is the first user found among From, To and Cc.
+
+The parent writes rows in bulk batches. The idempotency key comes from the
+Message-ID (or the headers, when there is none) and the client, so a message is
+stored once per client however many archives contain it. Completed units are
+recorded in a state file after their rows commit: a rerun skips them, and rows
+of a unit that was interrupted halfway are deduplicated by key. Imported history
+queues no webhook events.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import resource
+import time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from email import policy
+from email.message import EmailMessage, Message
+from email.parser import BytesHeaderParser, BytesParser
+from email.utils import getaddresses, parsedate_to_datetime
+from html.parser import HTMLParser
+from itertools import islice
+from pathlib import Path
+from typing import Any
+
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+
+from crm.models import Client, Interaction, InteractionType
+from crm.summaries import refresh_summaries
+
+User = get_user_model()
+
+KEY_PREFIX = "mail:"
+EML_SUFFIXES = {".eml"}
+EML_GROUP_SIZE = 200
+ADDRESS_HEADERS = ("From", "To", "Cc")
+QUOTE_INTRO = re.compile(r"^(On .+ wrote:|Em .+ escreveu:)$")
+
+Progress = Callable[["IngestStats"], None]
+
+
+@dataclass(frozen=True)
+class MailIndex:
+    clients: dict[str, tuple[int, ...]]
+    users: dict[str, int]
+    default_author_id: int | None = None
+    max_notes: int = 10_000
+
+
+@dataclass(frozen=True)
+class Unit:
+    """A byte range of one mbox file, or a group of ``.eml`` files."""
+
+    kind: str  # "mbox" or "eml"
+    paths: tuple[str, ...]
+    start: int = 0
+    end: int = 0
+    size: int = 0
+
+    @property
+    def key(self) -> str:
+        stamps = "|".join(f"{path}:{_file_stamp(path)}" for path in self.paths)
+        raw = f"{self.kind}|{self.start}-{self.end}|{stamps}"
+        return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+@dataclass
+class UnitResult:
+    key: str
+    size: int
+    rows: list[tuple[Any, ...]] = field(default_factory=list)
+    messages: int = 0
+    unmatched: int = 0
+    undated: int = 0
+    errors: int = 0
+
+
+@dataclass
+class IngestStats:
+    units_total: int = 0
+    units_done: int = 0
+    units_skipped: int = 0
+    bytes_total: int = 0
+    bytes_done: int = 0
+    messages: int = 0
+    matched: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    unmatched: int = 0
+    undated: int = 0
+    errors: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def summary(self) -> dict[str, Any]:
+        elapsed = max(self.elapsed, 1e-9)
+        usage_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        usage_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        return {
+            "units": self.units_done,
+            "units_skipped": self.units_skipped,
+            "messages": self.messages,
+            "matched": self.matched,
+            "inserted": self.inserted,
+            "duplicates": self.duplicates,
+            "unmatched": self.unmatched,
+            "undated": self.undated,
+            "errors": self.errors,
+            "megabytes": round(self.bytes_done / 2**20, 1),
+            "seconds": round(elapsed, 1),
+            "messages_per_second": round(self.messages / elapsed, 1),
+            "megabytes_per_second": round(self.bytes_done / 2**20 / elapsed, 2),
+            # ru_maxrss is in KiB on Linux.
+            "peak_rss_mb": round(usage_self / 1024, 1),
+            "peak_worker_rss_mb": round(usage_children / 1024, 1),
+        }
+
+
+def _file_stamp(path: str) -> str:
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _normalise(address: str) -> str:
+    return address.strip().lower()
+
+
+def load_index(*, default_author_id: int | None = None, max_notes: int = 10_000) -> MailIndex:
+    clients: dict[str, list[int]] = {}
+    for email, pk in Client.objects.exclude(email="").values_list("email", "pk"):
+        clients.setdefault(_normalise(email), []).append(pk)
+    users = {
+        _normalise(email): pk
+        for email, pk in User.objects.filter(is_active=True)
+        .exclude(email="")
+        .order_by("-pk")
+        .values_list("email", "pk")
+    }
+    return MailIndex(
+        clients={email: tuple(ids) for email, ids in clients.items()},
+        users=users,
+        default_author_id=default_author_id,
+        max_notes=max_notes,
+    )
+
+
+def _is_mbox(path: Path) -> bool:
+    with path.open("rb") as handle:
+        return handle.read(5) == b"From "
+
+
+def plan_units(paths: Iterable[str | Path], chunk_bytes: int) -> list[Unit]:
+    """Work units for every archive under ``paths`` (files or directories)."""
+    files: list[Path] = []
+    for path in map(Path, paths):
+        files.extend(sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path])
+    units: list[Unit] = []
+    emls = [str(path) for path in files if path.suffix.lower() in EML_SUFFIXES]
+    for index in range(0, len(emls), EML_GROUP_SIZE):
+        group = tuple(emls[index : index + EML_GROUP_SIZE])
+        units.append(Unit("eml", group, size=sum(os.path.getsize(path) for path in group)))
+    for path in files:
+        if path.suffix.lower() in EML_SUFFIXES or not _is_mbox(path):
+            continue
+        size = path.stat().st_size
+        for start in range(0, size, chunk_bytes):
+            end = min(start + chunk_bytes, size)
+            units.append(Unit("mbox", (str(path),), start, end, end - start))
+    return units
+
+
+def mbox_messages(path: str, start: int, end: int) -> Iterator[bytes]:
+    """Raw messages whose ``From `` separator line starts in ``[start, end)``."""
+    with open(path, "rb") as handle:
+        if start:
+            # A separator must begin a line: finish the line ``start`` falls into.
+            handle.seek(start - 1)
+            handle.readline()
+        position = handle.tell()
+        lines: list[bytes] | None = None
+        while line := handle.readline():
+            if line.startswith(b"From "):
+                if lines is not None:
+                    yield b"".join(lines)
+                if position >= end:
+                    return
+                lines = []
+            elif lines is not None:
+                lines.append(line)
+            position += len(line)
+        if lines is not None:
+            yield b"".join(lines)
+
+
+def _eml_messages(paths: Iterable[str]) -> Iterator[bytes]:
+    for path in paths:
+        with open(path, "rb") as handle:
+            yield handle.read()
+
+
+class _TextExtractor(HTMLParser):
+    BLOCKS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "blockquote"}
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        if tag in {"script", "style", "head"}:
+            self._skip += 1
+        elif tag in self.BLOCKS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in {"script", "style", "head"} and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data: str) -> None:
+        if not self._skip:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return "".join(extractor.parts)
+
+
+def body_text(message: EmailMessage, max_chars: int) -> str:
+    """Plain-text body without quoted replies, collapsed blank lines, at most ``max_chars``."""
+    part = message.get_body(preferencelist=("plain", "html"))
+    if part is None:
+        return ""
+    try:
+        text = part.get_content()
+    except (LookupError, UnicodeError, AssertionError):
+        text = (part.get_payload(decode=True) or b"").decode("utf-8", "replace")
+    if part.get_content_subtype() == "html":
+        text = html_to_text(text)
+    kept: list[str] = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if line.startswith(">") or QUOTE_INTRO.match(line.strip()):
+            continue
+        if line or (kept and kept[-1]):
+            kept.append(line)
+    return "\n".join(kept).strip()[:max_chars]
+
+
+def _addresses(headers: Message) -> list[str]:
+    values = [value for name in ADDRESS_HEADERS for value in headers.get_all(name, [])]
+    return [_normalise(address) for _name, address in getaddresses(values) if address]
+
+
+def _message_key(headers: Message, raw: bytes) -> str:
+    message_id = (headers.get("Message-ID") or "").strip()
+    source = message_id or "|".join(
+        [str(headers.get(name, "")) for name in ("From", "To", "Date", "Subject")]
+        + [hashlib.blake2b(raw, digest_size=16).hexdigest()]
+    )
+    return hashlib.blake2b(source.encode(errors="replace"), digest_size=16).hexdigest()
+
+
+def _occurred_at(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    try:
+        moment = parsedate_to_datetime(str(value))
+    except (TypeError, ValueError, IndexError):
+        return None
+    return moment if moment.tzinfo else moment.replace(tzinfo=UTC)
+
+
+_index: MailIndex | None = None
+
+
+def _init_worker(index: MailIndex) -> None:
+    global _index
+    _index = index
+
+
+def parse_unit(unit: Unit) -> UnitResult:
+    """Parse one unit in a worker; returns the rows of messages that match a client."""
+    index = _index
+    assert index is not None, "call _init_worker first"
+    result = UnitResult(key=unit.key, size=unit.size)
+    header_parser = BytesHeaderParser()
+    parser = BytesParser(policy=policy.default)
+    messages = (
+        mbox_messages(unit.paths[0], unit.start, unit.end)
+        if unit.kind == "mbox"
+        else _eml_messages(unit.paths)
+    )
+    for raw in messages:
+        result.messages += 1
+        try:
+            headers = header_parser.parsebytes(raw)
+            addresses = _addresses(headers)
+            client_ids = {pk for address in addresses for pk in index.clients.get(address, ())}
+            if not client_ids:
+                result.unmatched += 1
+                continue
+            occurred_at = _occurred_at(headers.get("Date"))
+            if occurred_at is None:
+                result.undated += 1
+                continue
+            message = parser.parsebytes(raw)
+            subject = " ".join(str(message.get("Subject", "")).split())[:255]
+            notes = body_text(message, index.max_notes) or subject or "(sem conteúdo)"
+        except Exception:  # noqa: BLE001 - one malformed message must not stop the unit
+            result.errors += 1
+            continue
+        author_id = next(
+            (index.users[address] for address in addresses if address in index.users),
+            index.default_author_id,
+        )
+        key = _message_key(headers, raw)
+        for client_id in sorted(client_ids):
+            row_key = f"{KEY_PREFIX}{key}:{client_id}"
+            result.rows.append((row_key, client_id, author_id, subject, notes, occurred_at))
+    return result
+
+
+def _chunks(items: list[Any], size: int) -> Iterator[list[Any]]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def write_rows(rows: list[tuple[Any, ...]], batch_size: int) -> tuple[int, int]:
+    """Insert rows not stored yet; returns ``(inserted, duplicates)``."""
+    pending = {row[0]: row for row in rows}
+    duplicates = len(rows) - len(pending)
+    for keys in _chunks(list(pending), batch_size):
+        for key in Interaction.objects.filter(idempotency_key__in=keys).values_list(
+            "idempotency_key", flat=True
+        ):
+            del pending[key]
+            duplicates += 1
+    interactions = [
+        Interaction(
+            idempotency_key=key,
+            client_id=client_id,
+            author_id=author_id,
+            interaction_type=InteractionType.EMAIL,
+            subject=subject,
+            notes=notes,
+            occurred_at=occurred_at,
+        )
+        for key, client_id, author_id, subject, notes, occurred_at in pending.values()
+    ]
+    with transaction.atomic():
+        for chunk in _chunks(interactions, batch_size):
+            Interaction.objects.bulk_create(chunk, ignore_conflicts=True)
+        # bulk_create skips model signals.
+        refresh_summaries({row[1] for row in pending.values()})
+    return len(interactions), duplicates
+
+
+class State:
+    """Keys of completed units, persisted as JSON after every committed batch."""
+
+    def __init__(self, path: Path | None) -> None:
+        self.path = path
+        self.done: set[str] = set()
+        if path and path.exists():
+            self.done = set(json.loads(path.read_text())["done"])
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        temporary = self.path.with_suffix(self.path.suffix + ".tmp")
+        temporary.write_text(json.dumps({"done": sorted(self.done)}))
+        os.replace(temporary, self.path)
+
+
+def ingest_archives(
+    paths: Iterable[str | Path],
+    *,
+    workers: int,
+    chunk_bytes: int,
+    batch_size: int,
+    state_path: Path | None = None,
+    default_author_id: int | None = None,
+    max_notes: int = 10_000,
+    progress: Progress | None = None,
+) -> IngestStats:
+    """Parse ``paths`` with ``workers`` processes and store the matched messages."""
+    stats = IngestStats()
+    state = State(state_path)
+    units = plan_units(paths, chunk_bytes)
+    todo = [unit for unit in units if unit.key not in state.done]
+    stats.units_total = len(units)
+    stats.units_skipped = len(units) - len(todo)
+    stats.bytes_total = sum(unit.size for unit in todo)
+    index = load_index(default_author_id=default_author_id, max_notes=max_notes)
+
+    buffer: list[tuple[Any, ...]] = []
+    buffered_units: list[str] = []
+
+    def flush() -> None:
+        inserted, duplicates = write_rows(buffer, batch_size)
+        stats.inserted += inserted
+        stats.duplicates += duplicates
+        state.done.update(buffered_units)
+        state.save()
+        buffer.clear()
+        buffered_units.clear()
+
+    def consume(results: Iterable[UnitResult]) -> None:
+        for result in results:
+            buffer.extend(result.rows)
+            buffered_units.append(result.key)
+            stats.units_done += 1
+            stats.bytes_done += result.size
+            stats.messages += result.messages
+            stats.matched += len(result.rows)
+            stats.unmatched += result.unmatched
+            stats.undated += result.undated
+            stats.errors += result.errors
+            if len(buffer) >= batch_size:
+                flush()
+            if progress:
+                progress(stats)
+        flush()
+
+    if workers <= 1:
+        _init_worker(index)
+        consume(map(parse_unit, todo))
+        return stats
+    # Forked workers must not share the parent's database sockets.
+    connections.close_all()
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(index,)) as pool:
+        consume(pool.imap_unordered(parse_unit, todo))
+    return stats
@@ -0,0 +1,48 @@
+"""Hand every open, unassigned lead to the least loaded rep."""
+from __future__ import annotations
+
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from crm.assignment import assign_leads, engine
+from crm.models import Lead
+
+
+class Command(BaseCommand):
+    help = (
+        "Distribui os leads em aberto sem responsável entre os vendedores, pela carga atual "
+        "(capacidade, valor em aberto e setor do cliente)."
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument("--source", help="Somente leads desta origem.")
+        parser.add_argument("--chunk-size", type=int, help="Leads por transação.")
+
+    def handle(self, *args, **options) -> None:
+        leads = Lead.objects.filter(client__deleted_at__isnull=True)
+        if options["source"]:
+            leads = leads.filter(source=options["source"])
+
+        def progress(**values) -> None:
+            if options["verbosity"] > 1:
+                self.stderr.write(", ".join(f"{key}={value}" for key, value in values.items()))
+
+        engine.invalidate()
+        assigned = assign_leads(leads, chunk_size=options["chunk_size"], progress=progress)
+        if not assigned:
+            self.stdout.write("Nenhum lead atribuído.")
+            return
+        per_rep = Counter(assigned.values())
+        names = dict(
+            get_user_model()
+            .objects.filter(pk__in=list(per_rep))
+            .values_list("pk", "username")
+        )
+        loads = engine.loads()
+        for user_id, count in per_rep.most_common():
+            rep = loads.get(user_id)
+            total = f" ({rep.open_leads}/{rep.capacity} em aberto)" if rep else ""
+            self.stdout.write(f"{names.get(user_id, user_id)}: {count}{total}")
+        self.stdout.write(self.style.SUCCESS(f"{len(assigned)} leads atribuídos."))
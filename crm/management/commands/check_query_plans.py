@@ -0,0 +1,71 @@
+"""Compare the plans of the hot querysets with the reviewed baselines."""
+from __future__ import annotations
+
+import difflib
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from crm.plan_checks import baseline_path, build_context, dump_baseline, get_targets, run_target
+
+
+class Command(BaseCommand):
+    help = (
+        "Captura SQL e EXPLAIN (FORMAT JSON) das consultas quentes num banco populado por "
+        "seed_crm, valida as asserções de cada alvo e compara com crm/plan_baselines/."
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument("targets", nargs="*", help="Alvos a checar (padrão: todos).")
+        parser.add_argument(
+            "--update",
+            action="store_true",
+            help="Regrava os baselines com os planos atuais.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        if connection.vendor != "postgresql":
+            raise CommandError("check_query_plans requer PostgreSQL.")
+        try:
+            targets = get_targets(options["targets"])
+            context = build_context()
+        except LookupError as exc:
+            raise CommandError(str(exc)) from exc
+
+        failed = []
+        for target in targets:
+            with transaction.atomic():
+                result = run_target(target, context)
+                transaction.set_rollback(True)
+            current = dump_baseline(result)
+            path = baseline_path(target)
+            problems = list(result.failures)
+            if options["update"]:
+                path.write_text(current, encoding="utf-8")
+            elif not path.exists():
+                problems.append("baseline ausente; rode com --update e revise o arquivo")
+            else:
+                stored = path.read_text(encoding="utf-8")
+                if stored != current:
+                    diff = difflib.unified_diff(
+                        stored.splitlines(),
+                        current.splitlines(),
+                        fromfile=f"{path.name} (baseline)",
+                        tofile=f"{path.name} (atual)",
+                        lineterm="",
+                    )
+                    self.stdout.write("\n".join(diff))
+                    problems.append("plano diferente do baseline")
+            if problems:
+                failed.append(target.name)
+                self.stdout.write(self.style.ERROR(f"✗ {target.name}"))
+                for problem in problems:
+                    self.stdout.write(f"    {problem}")
+            else:
+                self.stdout.write(
+                    self.style.SUCCESS(f"✓ {target.name} ({len(result.queries)} consultas)")
+                )
+        if failed:
+            raise CommandError(
+                f"{len(failed)} alvo(s) com regressão de plano: {', '.join(failed)}"
+            )
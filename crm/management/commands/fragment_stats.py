@@ -0,0 +1,29 @@
+"""Report hit rates of the versioned template-fragment cache."""
+from __future__ import annotations
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from crm.fragments import metrics
+
+
+class Command(BaseCommand):
+    help = "Mostra acertos, falhas e taxa de acerto do cache de fragmentos por família."
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument("--json", action="store_true", help="Imprime o relatório em JSON.")
+        parser.add_argument("--reset", action="store_true", help="Zera os contadores após exibir.")
+
+    def handle(self, *args, **options) -> None:
+        totals = metrics.totals()
+        if options["json"]:
+            self.stdout.write(json.dumps(totals, indent=2))
+        else:
+            for family, stats in totals.items():
+                rate = "—" if stats["hit_rate"] is None else f"{stats['hit_rate']:.1%}"
+                self.stdout.write(
+                    f"{family:<16} {stats['hits']:>10} acertos {stats['misses']:>10} falhas  {rate}"
+                )
+        if options["reset"]:
+            metrics.reset()
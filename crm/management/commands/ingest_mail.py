@@ -0,0 +1,108 @@
+"""Import mbox/.eml archives as e-mail interactions of the matching clients."""
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.mail_ingest import IngestStats, ingest_archives
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa arquivos mbox e .eml como interações de e-mail dos clientes cujos endereços "
+        "aparecem em From/To/Cc. Pode ser interrompido e retomado."
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument("paths", nargs="+", help="Arquivos mbox/.eml ou diretórios.")
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count() or 1, help="Processos de leitura."
+        )
+        parser.add_argument(
+            "--chunk-mb", type=int, default=64, help="Tamanho dos trechos de cada mbox (MiB)."
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.INTERACTION_INGEST_CHUNK_SIZE,
+            help="Interações por inserção em lote.",
+        )
+        parser.add_argument(
+            "--state",
+            default=".ingest_mail_state.json",
+            help="Arquivo com os trechos já importados, para retomar uma execução.",
+        )
+        parser.add_argument(
+            "--restart", action="store_true", help="Ignora o estado salvo e relê tudo."
+        )
+        parser.add_argument(
+            "--author", help="Usuário autor quando nenhum usuário aparece na mensagem."
+        )
+        parser.add_argument(
+            "--max-notes", type=int, default=10_000, help="Caracteres do corpo guardados."
+        )
+        parser.add_argument(
+            "--progress-every", type=float, default=5.0, help="Intervalo do progresso (s)."
+        )
+
+    def handle(self, *args, **options) -> None:
+        missing = [path for path in options["paths"] if not Path(path).exists()]
+        if missing:
+            raise CommandError(f"Caminho(s) inexistente(s): {', '.join(missing)}.")
+        author_id = None
+        if options["author"]:
+            User = get_user_model()
+            author_id = (
+                User.objects.filter(username=options["author"]).values_list("pk", flat=True).first()
+            )
+            if author_id is None:
+                raise CommandError(f"Usuário {options['author']} não encontrado.")
+        state_path = Path(options["state"])
+        if options["restart"] and state_path.exists():
+            state_path.unlink()
+
+        last_report = 0.0
+
+        def progress(stats: IngestStats) -> None:
+            nonlocal last_report
+            if stats.elapsed - last_report < options["progress_every"]:
+                return
+            last_report = stats.elapsed
+            percent = 100 * stats.bytes_done / stats.bytes_total if stats.bytes_total else 100
+            self.stderr.write(
+                f"{percent:5.1f}% · {stats.units_done} trechos · {stats.messages} mensagens "
+                f"({stats.messages / stats.elapsed:.0f}/s) · {stats.inserted} inseridas"
+            )
+
+        stats = ingest_archives(
+            options["paths"],
+            workers=max(options["workers"], 1),
+            chunk_bytes=max(options["chunk_mb"], 1) * 2**20,
+            batch_size=options["batch_size"],
+            state_path=state_path,
+            default_author_id=author_id,
+            max_notes=options["max_notes"],
+            progress=progress,
+        )
+        summary = stats.summary()
+        if options["verbosity"] > 1:
+            self.stdout.write(json.dumps(summary, indent=2))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{summary['inserted']} interações importadas de {summary['messages']} mensagens "
+                f"({summary['duplicates']} já existentes, {summary['unmatched']} sem cliente, "
+                f"{summary['errors']} com erro) em {summary['seconds']} s: "
+                f"{summary['messages_per_second']} msg/s, {summary['megabytes_per_second']} MiB/s, "
+                f"pico de memória {summary['peak_rss_mb']} MiB "
+                f"(leitores {summary['peak_worker_rss_mb']} MiB)."
+            )
+        )
+        if summary["units_skipped"]:
+            self.stdout.write(
+                f"{summary['units_skipped']} trecho(s) já importado(s) foram pulados."
+            )
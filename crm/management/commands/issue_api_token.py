@@ -0,0 +1,41 @@
+"""Issue a signed API token for an integration user."""
+from __future__ import annotations
+
+from datetime import UTC, datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.authentication import issue_token, revoke_user_tokens
+
+
+class Command(BaseCommand):
+    help = "Emite um token assinado para a API (Authorization: Bearer <token>)."
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument("username")
+        parser.add_argument(
+            "--ttl",
+            type=int,
+            default=settings.API_TOKEN_TTL,
+            help="Validade do token em segundos.",
+        )
+        parser.add_argument(
+            "--revoke-existing",
+            action="store_true",
+            help="Revoga todos os tokens já emitidos para o usuário antes de emitir o novo.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        User = get_user_model()
+        try:
+            user = User.objects.get(username=options["username"], is_active=True)
+        except User.DoesNotExist as exc:
+            raise CommandError(f"Usuário ativo '{options['username']}' não encontrado.") from exc
+        if options["revoke_existing"]:
+            revoke_user_tokens(user)
+        token, claims = issue_token(user, ttl=options["ttl"])
+        expires_at = datetime.fromtimestamp(claims["exp"], tz=UTC)
+        self.stderr.write(f"Token válido até {expires_at.isoformat()} (papel: {claims['role']}).")
+        self.stdout.write(token)
@@ -0,0 +1,38 @@
+"""Apply migrations while holding a database-wide lock."""
+from __future__ import annotations
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Arbitrary application-wide key for pg_advisory_lock.
+MIGRATION_LOCK_ID = 72_431_906
+
+
+class Command(BaseCommand):
+    help = (
+        "Executa o migrate protegido por um advisory lock do PostgreSQL para que apenas "
+        "uma réplica aplique migrações por vez."
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options) -> None:
+        database = options["database"]
+        connection = connections[database]
+        migrate_options = {
+            "database": database,
+            "interactive": False,
+            "verbosity": options["verbosity"],
+        }
+        if connection.vendor != "postgresql":
+            call_command("migrate", **migrate_options)
+            return
+        with connection.cursor() as cursor:
+            self.stdout.write("Aguardando lock de migração...")
+            cursor.execute("SELECT pg_advisory_lock(%s)", [MIGRATION_LOCK_ID])
+            try:
+                call_command("migrate", **migrate_options)
+            finally:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [MIGRATION_LOCK_ID])
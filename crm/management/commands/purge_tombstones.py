@@ -0,0 +1,31 @@
+"""Delete change-feed tombstones older than the retention window."""
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from crm.changefeed import purge_tombstones
+
+
+class Command(BaseCommand):
+    help = (
+        "Apaga tombstones do feed de alterações mais antigos que TOMBSTONE_RETENTION_DAYS "
+        "(cursores anteriores passam a exigir sincronização completa)."
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.TOMBSTONE_RETENTION_DAYS,
+            help="Dias de retenção (padrão: TOMBSTONE_RETENTION_DAYS).",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Linhas por DELETE.")
+
+    def handle(self, *args, **options) -> None:
+        older_than = timezone.now() - timedelta(days=options["days"])
+        purged = purge_tombstones(older_than=older_than, chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"{purged} tombstones apagados."))
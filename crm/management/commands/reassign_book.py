@@ -0,0 +1,77 @@
+"""Move a departing rep's clients, leads and open follow-ups to other users."""
+from __future__ import annotations
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.reassignment import Strategy, check_targets, transfer_book
+from crm.tasks import enqueue_reassignment
+
+
+class Command(BaseCommand):
+    help = (
+        "Transfere clientes, leads e follow-ups em aberto de um vendedor para outros usuários "
+        "(em segundo plano por padrão)."
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument("from_username", help="Vendedor que está saindo.")
+        parser.add_argument("to_usernames", nargs="+", help="Usuários que recebem a carteira.")
+        parser.add_argument(
+            "--strategy",
+            choices=Strategy.values,
+            default=Strategy.ROUND_ROBIN,
+            help="Como dividir a carteira entre vários destinos.",
+        )
+        parser.add_argument("--chunk-size", type=int, help="Registros por transação.")
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="Executa agora, neste processo, em vez de enfileirar um job.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        User = get_user_model()
+        usernames = [options["from_username"], *options["to_usernames"]]
+        users = dict(User.objects.filter(username__in=usernames).values_list("username", "pk"))
+        missing = [username for username in usernames if username not in users]
+        if missing:
+            raise CommandError(f"Usuário(s) não encontrado(s): {', '.join(missing)}.")
+        from_user_id = users[options["from_username"]]
+        to_user_ids = [users[username] for username in options["to_usernames"]]
+        try:
+            check_targets(from_user_id, to_user_ids)
+        except ValueError as exc:
+            raise CommandError(str(exc)) from exc
+
+        if not options["sync"]:
+            job = enqueue_reassignment(
+                from_user_id, to_user_ids, options["strategy"], options["chunk_size"]
+            )
+            self.stdout.write(f"Job {job.pk} enfileirado ({job.get_status_display()}).")
+            return
+
+        def progress(**values) -> None:
+            if options["verbosity"] > 1:
+                self.stderr.write(", ".join(f"{key}={value}" for key, value in values.items()))
+
+        result = transfer_book(
+            from_user_id,
+            to_user_ids,
+            strategy=options["strategy"],
+            chunk_size=options["chunk_size"],
+            progress=progress,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{result['clients']} clientes, {result['leads']} leads e "
+                f"{result['follow_ups']} follow-ups transferidos."
+            )
+        )
+        if result["skipped_clients"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    "Mantidos com o vendedor de origem (nome já existente no destino): "
+                    + ", ".join(map(str, result["skipped_clients"]))
+                )
+            )
@@ -0,0 +1,40 @@
+"""Verify and repair the denormalised client summary columns."""
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.models import Client
+from crm.summaries import verify_summaries
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara as colunas de resumo dos clientes com os dados reais e corrige as divergências."
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Apenas relata divergências (código de saída 1 se houver alguma).",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--client", type=int, action="append", help="Restringe a um cliente.")
+
+    def handle(self, *args, **options) -> None:
+        queryset = Client.objects.all()
+        if options["client"]:
+            queryset = queryset.filter(pk__in=options["client"])
+        repair = not options["verify"]
+        checked = drifted = 0
+        for count, ids in verify_summaries(
+            queryset, chunk_size=options["chunk_size"], repair=repair
+        ):
+            checked += count
+            drifted += len(ids)
+            if ids and options["verbosity"] > 1:
+                self.stdout.write(f"Divergentes: {', '.join(map(str, ids))}")
+        verb = "corrigidos" if repair else "divergentes"
+        self.stdout.write(f"{checked} clientes verificados, {drifted} {verb}.")
+        if drifted and not repair:
+            raise CommandError("Resumos de clientes divergentes; rode sem --verify para corrigir.")
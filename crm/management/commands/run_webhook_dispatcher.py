@@ -0,0 +1,37 @@
+"""Deliver queued webhook events to subscriber endpoints."""
+from __future__ import annotations
+
+import json
+import logging
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from crm.webhook_dispatcher import Dispatcher
+
+
+class Command(BaseCommand):
+    help = "Envia os eventos de webhook pendentes, em lotes e com novas tentativas."
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument("--poll-interval", type=float, default=settings.WEBHOOK_POLL_INTERVAL)
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=settings.WEBHOOK_CLAIM_LIMIT,
+            help="Entregas reservadas por rodada.",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Encerra quando não houver mais entregas prontas para envio.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+        dispatcher = Dispatcher(poll_interval=options["poll_interval"], limit=options["limit"])
+        signal.signal(signal.SIGTERM, dispatcher.stop)
+        signal.signal(signal.SIGINT, dispatcher.stop)
+        stats = dispatcher.run(burst=options["burst"])
+        self.stdout.write(json.dumps(stats.summary(), indent=2))
@@ -0,0 +1,52 @@
+"""Run the background job worker."""
+from __future__ import annotations
+
+import json
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = "Processa jobs da fila em segundo plano usando um pool de threads ou processos."
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument("--concurrency", type=int, default=settings.JOB_WORKER_CONCURRENCY)
+        parser.add_argument(
+            "--pool",
+            choices=["thread", "process"],
+            default=settings.JOB_WORKER_POOL,
+        )
+        parser.add_argument("--poll-interval", type=float, default=settings.JOB_POLL_INTERVAL)
+        parser.add_argument("--stale-timeout", type=int, default=settings.JOB_STALE_TIMEOUT)
+        parser.add_argument(
+            "--metrics-interval",
+            type=float,
+            default=60.0,
+            help="Intervalo em segundos entre os logs de métricas (0 desativa).",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Encerra quando não houver mais jobs prontos para execução.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        if options["concurrency"] < 1:
+            raise CommandError("--concurrency deve ser maior que zero.")
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+        worker = Worker(
+            concurrency=options["concurrency"],
+            pool=options["pool"],
+            poll_interval=options["poll_interval"],
+            stale_timeout=options["stale_timeout"],
+            metrics_interval=options["metrics_interval"],
+        )
+        self.stdout.write(
+            f"Worker {worker.worker_id} iniciado ({options['pool']} x {options['concurrency']})."
+        )
+        metrics = worker.run(burst=options["burst"])
+        self.stdout.write(json.dumps(metrics.summary(), indent=2))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='interaction',
+            index=models.Index(fields=['client', 'occurred_at'], name='crm_interac_client__518fc2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['client', 'created_at'], name='crm_lead_client__58e4ea_idx'),
+        ),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:16
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+OPEN_STATUSES = ["new", "contact", "proposal"]
+
+
+def backfill_summaries(apps, schema_editor):
+    Client = apps.get_model("crm", "Client")
+    Interaction = apps.get_model("crm", "Interaction")
+    Lead = apps.get_model("crm", "Lead")
+    money = models.DecimalField(max_digits=14, decimal_places=2)
+
+    def aggregate(model, expression, output_field, **filters):
+        return Subquery(
+            model.objects.filter(client=OuterRef("pk"), **filters)
+            .order_by()
+            .values("client")
+            .annotate(result=expression)
+            .values("result")[:1],
+            output_field=output_field,
+        )
+
+    zero = Value(Decimal("0.00"), output_field=money)
+    Client.objects.update(
+        interaction_count=Coalesce(aggregate(Interaction, Count("pk"), models.IntegerField()), 0),
+        last_interaction_at=aggregate(Interaction, Max("occurred_at"), models.DateTimeField()),
+        next_follow_up_date=aggregate(
+            Interaction,
+            Min("follow_up_date"),
+            models.DateField(),
+            follow_up_date__isnull=False,
+        ),
+        open_lead_count=Coalesce(
+            aggregate(Lead, Count("pk"), models.IntegerField(), status__in=OPEN_STATUSES), 0
+        ),
+        open_lead_value=Coalesce(
+            aggregate(Lead, Sum("value"), money, status__in=OPEN_STATUSES), zero
+        ),
+        won_value=Coalesce(aggregate(Lead, Sum("value"), money, status="won"), zero),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0006_request_profile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='interaction_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='last_interaction_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='next_follow_up_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='open_lead_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='open_lead_value',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='won_value',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['last_interaction_at'], name='crm_client_last_in_1b58ed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['next_follow_up_date'], name='crm_client_next_fo_8a7da2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['open_lead_value'], name='crm_client_open_le_4dd44f_idx'),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,98 @@
+"""Case-insensitive prefix (and, with pg_trgm, substring) indexes for autocomplete.
+
+The expressions match what Django emits for ``istartswith``/``icontains`` on
+PostgreSQL (``UPPER(col::text) LIKE …``). They are PostgreSQL-only, so they live
+here instead of ``Meta.indexes``; other backends skip this migration's SQL.
+
+The trigram index is only created when ``pg_trgm`` is installed or the role may
+install it (superuser, or ``CREATE`` on the database for a trusted extension).
+Otherwise it is skipped with a warning rather than failing the deploy, as on
+managed PostgreSQL without superuser rights.
+"""
+
+import warnings
+
+from django.conf import settings
+from django.db import DatabaseError, migrations, transaction
+
+PREFIX_INDEXES = (
+    ("crm_client_name_prefix_idx", "crm_client", '(UPPER("name"::text)) text_pattern_ops'),
+    (
+        "crm_client_owner_name_prefix_idx",
+        "crm_client",
+        '"owner_id", (UPPER("name"::text)) text_pattern_ops',
+    ),
+)
+USER_PREFIX_COLUMNS = ("username", "first_name", "last_name")
+TRIGRAM_INDEX = ("crm_client_name_trgm_idx", "crm_client", '(UPPER("name"::text)) gin_trgm_ops')
+
+
+def _user_indexes(apps):
+    table = apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table
+    return [
+        (f"crm_{table}_{column}_prefix_idx", table, f'(UPPER("{column}"::text)) text_pattern_ops')
+        for column in USER_PREFIX_COLUMNS
+    ]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, table, columns in [*PREFIX_INDEXES, *_user_indexes(apps)]:
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({columns})')
+    name, table, columns = TRIGRAM_INDEX
+    if not _can_use_trigram(schema_editor.connection):
+        warnings.warn(
+            f"pg_trgm is not installed and cannot be installed by this role; {name} was "
+            "skipped, so keep AUTOCOMPLETE_TRIGRAM off or install the extension and "
+            "re-run this migration.",
+            RuntimeWarning,
+            stacklevel=1,
+        )
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" USING gin ({columns})'
+            )
+    except DatabaseError as exc:
+        warnings.warn(f"{name} was skipped: {exc}", RuntimeWarning, stacklevel=1)
+
+
+def _can_use_trigram(connection) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')
+                OR EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm')
+                AND (
+                    (SELECT rolsuper FROM pg_roles WHERE rolname = current_user)
+                    OR has_database_privilege(current_database(), 'CREATE')
+                    AND EXISTS (
+                        SELECT 1 FROM pg_available_extension_versions
+                        WHERE name = 'pg_trgm' AND trusted
+                    )
+                )
+            """
+        )
+        return cursor.fetchone()[0]
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _table, _columns in [*PREFIX_INDEXES, *_user_indexes(apps), TRIGRAM_INDEX]:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0007_client_summary_columns'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0010_webhooks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadStageChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, choices=[('new', 'Novo'), ('contact', 'Contato'), ('proposal', 'Proposta'), ('won', 'Fechado'), ('lost', 'Perdido')], max_length=20)),
+                ('to_status', models.CharField(choices=[('new', 'Novo'), ('contact', 'Contato'), ('proposal', 'Proposta'), ('won', 'Fechado'), ('lost', 'Perdido')], max_length=20)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('lead', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stage_changes', to='crm.lead')),
+            ],
+            options={
+                'ordering': ['changed_at', 'id'],
+                'indexes': [models.Index(fields=['to_status', 'lead'], name='crm_leadsta_to_stat_06e613_idx'), models.Index(fields=['lead', 'changed_at'], name='crm_leadsta_lead_id_4e55ff_idx')],
+            },
+        ),
+    ]
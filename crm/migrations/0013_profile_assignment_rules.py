@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0012_client_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='industries',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='lead_capacity',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0013_profile_assignment_rules'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='interaction',
+            name='idempotency_key',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='interaction',
+            constraint=models.UniqueConstraint(fields=('author', 'idempotency_key'), name='crm_interaction_author_idempotency_key'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0015_forecastsnapshot'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='lead_capacity',
+            field=models.PositiveIntegerField(blank=True, help_text='Leads abertos antes de outros reps serem preferidos; vazio não recebe leads.', null=True),
+        ),
+    ]
@@ -1,11 +1,13 @@
 """Data models for the CRM domain."""
 from __future__ import annotations
 
+import secrets
 from datetime import date
 
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.urls import reverse
+from django.utils import timezone
 
 User = settings.AUTH_USER_MODEL
 
@@ -17,6 +19,15 @@ class Profile(models.Model):
     phone = models.CharField(max_length=20, blank=True)
     position = models.CharField(max_length=100, blank=True)
     avatar = models.URLField(blank=True)
+    # Automatic lead assignment (crm.assignment): open leads the rep takes before
+    # others are preferred (empty or 0: none, the rep is never picked), and the
+    # client industries they specialise in, comma-separated.
+    lead_capacity = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        help_text="Leads abertos antes de outros reps serem preferidos; vazio não recebe leads.",
+    )
+    industries = models.CharField(max_length=255, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -28,6 +39,13 @@ class Profile(models.Model):
         return self.user.get_full_name() or self.user.username
 
 
+class ClientManager(models.Manager):
+    """Leaves out soft-deleted clients, which wait for ``crm.deletion`` to purge them."""
+
+    def get_queryset(self) -> models.QuerySet:
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Client(models.Model):
     """Represents an organization or person with an ongoing relationship."""
 
@@ -45,12 +63,47 @@ class Client(models.Model):
         related_name="clients",
     )
 
+    # Denormalised summary maintained by ``crm.summaries``; never edit by hand.
+    interaction_count = models.PositiveIntegerField(default=0, editable=False)
+    last_interaction_at = models.DateTimeField(blank=True, null=True, editable=False)
+    next_follow_up_date = models.DateField(blank=True, null=True, editable=False)
+    open_lead_count = models.PositiveIntegerField(default=0, editable=False)
+    open_lead_value = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, editable=False
+    )
+    won_value = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set when the client is deleted; the row and its dependents are purged later.
+    deleted_at = models.DateTimeField(blank=True, null=True, editable=False)
+
+    objects = ClientManager()
+    all_objects = models.Manager()
 
     class Meta:
         ordering = ["name"]
-        unique_together = ("name", "owner")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "owner"],
+                condition=models.Q(deleted_at__isnull=True),
+                name="crm_client_name_owner_uniq",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["industry"]),
+            models.Index(fields=["owner", "created_at"]),
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["last_interaction_at"]),
+            models.Index(fields=["next_follow_up_date"]),
+            models.Index(fields=["open_lead_value"]),
+            models.Index(fields=["updated_at", "id"]),
+            models.Index(
+                fields=["deleted_at"],
+                condition=models.Q(deleted_at__isnull=False),
+                name="crm_client_deleted_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.name
@@ -91,11 +144,22 @@ class Lead(models.Model):
         indexes = [
             models.Index(fields=["status"]),
             models.Index(fields=["assigned_to", "status"]),
+            models.Index(fields=["client", "created_at"]),
+            models.Index(fields=["status", "value"]),
+            models.Index(fields=["expected_close_date"]),
+            models.Index(fields=["source"]),
+            models.Index(fields=["updated_at", "id"]),
         ]
 
     def __str__(self) -> str:
         return f"{self.client.name} - {self.get_status_display()}"
 
+    def save(self, *args, **kwargs) -> None:
+        # post_save receivers update the client summary and the webhook outbox; they
+        # must commit or roll back together with the row.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def is_overdue(self) -> bool:
         return bool(self.expected_close_date and self.expected_close_date < date.today())
 
@@ -103,6 +167,25 @@ class Lead(models.Model):
         return reverse("crm:lead-detail", args=[self.pk])
 
 
+class LeadStageChange(models.Model):
+    """One status transition of a lead, recorded by ``crm.signals`` (creation included)."""
+
+    lead = models.ForeignKey(Lead, on_delete=models.CASCADE, related_name="stage_changes")
+    from_status = models.CharField(max_length=20, choices=LeadStatus.choices, blank=True)
+    to_status = models.CharField(max_length=20, choices=LeadStatus.choices)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["changed_at", "id"]
+        indexes = [
+            models.Index(fields=["to_status", "lead"]),
+            models.Index(fields=["lead", "changed_at"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.lead_id}: {self.from_status or '—'} → {self.to_status}"
+
+
 class InteractionType(models.TextChoices):
     CALL = "call", "Chamada"
     EMAIL = "email", "E-mail"
@@ -130,15 +213,284 @@ class Interaction(models.Model):
     notes = models.TextField()
     occurred_at = models.DateTimeField()
     follow_up_date = models.DateField(blank=True, null=True)
+    # Unique per author (see Meta); indexed on its own for the mail importer, whose
+    # keys are derived from the message and looked up across authors.
+    idempotency_key = models.CharField(max_length=255, blank=True, null=True, db_index=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-occurred_at"]
+        indexes = [
+            models.Index(fields=["client", "occurred_at"]),
+            models.Index(fields=["interaction_type", "occurred_at"]),
+            models.Index(fields=["occurred_at"]),
+            models.Index(
+                fields=["follow_up_date"],
+                name="crm_interaction_follow_up_idx",
+                condition=models.Q(follow_up_date__isnull=False),
+            ),
+            models.Index(fields=["updated_at", "id"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["author", "idempotency_key"],
+                name="crm_interaction_author_idempotency_key",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.client.name} ({self.get_interaction_type_display()})"
 
+    def save(self, *args, **kwargs) -> None:
+        # See ``Lead.save``.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def get_absolute_url(self) -> str:
         return reverse("crm:client-detail", args=[self.client_id])
+
+
+class TombstoneResource(models.TextChoices):
+    CLIENT = "client", "Cliente"
+    LEAD = "lead", "Lead"
+    INTERACTION = "interaction", "Interação"
+
+
+class Tombstone(models.Model):
+    """Record of a deleted row, served by the change feed (see ``crm.changefeed``).
+
+    ``owner_id`` and ``user_id`` copy the columns that decided who could see the row
+    (client owner; lead assignee or interaction author) as plain integers, so the
+    tombstone outlives the users and clients it refers to.
+    """
+
+    resource = models.CharField(max_length=20, choices=TombstoneResource.choices)
+    object_id = models.BigIntegerField()
+    owner_id = models.BigIntegerField(blank=True, null=True)
+    user_id = models.BigIntegerField(blank=True, null=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["deleted_at", "id"]
+        indexes = [
+            models.Index(fields=["resource", "deleted_at", "id"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.resource} #{self.object_id}"
+
+
+class WebhookEventType(models.TextChoices):
+    LEAD_STAGE_CHANGED = "lead.stage_changed", "Lead mudou de etapa"
+    INTERACTION_LOGGED = "interaction.logged", "Interação registrada"
+
+
+def webhook_secret() -> str:
+    return secrets.token_hex(32)
+
+
+class WebhookEndpoint(models.Model):
+    """A subscriber URL receiving signed batches of CRM events (see ``crm.webhooks``).
+
+    Events reach the endpoint when they concern records of ``user`` or, with a
+    ``group``, of any member of that group; superusers without a group get all.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="webhook_endpoints")
+    group = models.ForeignKey(
+        "auth.Group",
+        on_delete=models.CASCADE,
+        related_name="webhook_endpoints",
+        null=True,
+        blank=True,
+        help_text="Equipe cujos registros também são enviados.",
+    )
+    url = models.URLField(max_length=500)
+    secret = models.CharField(max_length=64, default=webhook_secret, editable=False)
+    event_types = models.JSONField(
+        default=list, blank=True, help_text="Tipos de evento assinados (vazio: todos)."
+    )
+    is_active = models.BooleanField(default=True)
+    max_concurrency = models.PositiveSmallIntegerField(
+        default=4, help_text="Requisições simultâneas para esta URL."
+    )
+    batch_size = models.PositiveSmallIntegerField(default=50, help_text="Eventos por requisição.")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self) -> str:
+        return self.url
+
+
+class WebhookEvent(models.Model):
+    """Outbox row written in the same transaction as the change it describes."""
+
+    event_type = models.CharField(max_length=40, choices=WebhookEventType.choices)
+    key = models.CharField(max_length=120, unique=True)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["pk"]
+
+    def __str__(self) -> str:
+        return self.key
+
+
+class DeliveryStatus(models.TextChoices):
+    PENDING = "pending", "Pendente"
+    DELIVERED = "delivered", "Entregue"
+    FAILED = "failed", "Falhou"
+
+
+class WebhookDelivery(models.Model):
+    """One event owed to one endpoint; claimed and retried by the dispatcher."""
+
+    endpoint = models.ForeignKey(
+        WebhookEndpoint, on_delete=models.CASCADE, related_name="deliveries"
+    )
+    event = models.ForeignKey(WebhookEvent, on_delete=models.CASCADE, related_name="deliveries")
+    status = models.CharField(
+        max_length=20, choices=DeliveryStatus.choices, default=DeliveryStatus.PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(blank=True, null=True)
+    response_status = models.PositiveSmallIntegerField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    delivered_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["pk"]
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at", "id"],
+                name="crm_webhook_due_idx",
+                condition=models.Q(status="pending"),
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["endpoint", "event"], name="crm_webhook_delivery_once"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.event} → {self.endpoint} ({self.get_status_display()})"
+
+
+class JobStatus(models.TextChoices):
+    QUEUED = "queued", "Na fila"
+    RUNNING = "running", "Em execução"
+    SUCCEEDED = "succeeded", "Concluído"
+    FAILED = "failed", "Falhou"
+
+
+class Job(models.Model):
+    """Unit of background work stored in the database and executed by ``run_worker``."""
+
+    ACTIVE_STATUSES = (JobStatus.QUEUED, JobStatus.RUNNING)
+
+    task = models.CharField(max_length=200)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=JobStatus.choices, default=JobStatus.QUEUED)
+    priority = models.SmallIntegerField(default=0)
+    dedup_key = models.CharField(max_length=200, blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=200, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    progress = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "-priority", "run_at"], name="crm_job_claim_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dedup_key"],
+                condition=models.Q(status__in=["queued", "running"]),
+                name="crm_job_active_dedup_key",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.task} #{self.pk} ({self.get_status_display()})"
+
+
+class ForecastSnapshot(models.Model):
+    """Latest revenue forecast (see ``crm.forecast``), shared by every web process."""
+
+    fingerprint = models.CharField(max_length=32, unique=True)
+    result = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-id"]
+
+    def __str__(self) -> str:
+        return self.fingerprint
+
+
+class RequestProfile(models.Model):
+    """Sampled Python stacks and SQL timeline captured for a single request."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="request_profiles",
+    )
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2048)
+    view_name = models.CharField(max_length=255, blank=True)
+    status_code = models.PositiveSmallIntegerField(default=0)
+    duration_ms = models.FloatField(default=0)
+    cpu_ms = models.FloatField(default=0)
+    sample_interval_ms = models.FloatField(default=0)
+    sample_count = models.PositiveIntegerField(default=0)
+    stacks = models.TextField(blank=True, help_text="Pilhas no formato collapsed (flamegraph.pl).")
+    queries = models.JSONField(default=list, blank=True)
+    query_count = models.PositiveIntegerField(default=0)
+    query_ms = models.FloatField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self) -> str:
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+
+class ApiTokenRevocation(models.Model):
+    """A revoked API token (see ``crm.authentication``).
+
+    With a ``jti`` the row revokes that one token; with an empty ``jti`` it revokes
+    every token of ``user`` issued up to ``revoked_at``. Rows are useless once
+    ``expires_at`` passes, since every token they could match has expired by then.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="api_token_revocations")
+    jti = models.CharField(max_length=32, blank=True)
+    revoked_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ["-revoked_at"]
+
+    def __str__(self) -> str:
+        return f"{self.user_id}:{self.jti or '*'}"
@@ -0,0 +1,366 @@
+"""Query-plan regression checks for the hot querysets.
+
+Each :class:`PlanTarget` renders a real view (or viewset list) against a database
+seeded with ``manage.py seed_crm``, captures every ``SELECT`` it runs and asks
+PostgreSQL for ``EXPLAIN (FORMAT JSON)``. The normalised plans are compared to the
+reviewed baselines in ``crm/plan_baselines/`` and the per-target assertions are
+enforced, so plan changes show up in code review as JSON diffs.
+"""
+from __future__ import annotations
+
+import json
+import re
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import sqlparse
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.base import SessionBase
+from django.db import connection
+from django.db.models import Model
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from crm.management.commands.seed_crm import ADMIN_USERNAME, USER_PREFIX
+from crm.models import Client, Interaction, Lead
+
+BASELINE_DIR = Path(__file__).resolve().parent / "plan_baselines"
+
+# Keys kept from each plan node; costs and row estimates are excluded from the
+# baseline because they drift with statistics, and are checked via ``max_cost``.
+PLAN_KEYS = (
+    "Node Type",
+    "Parent Relationship",
+    "Join Type",
+    "Strategy",
+    "Relation Name",
+    "Index Name",
+    "Sort Key",
+)
+
+TIMESTAMP_LITERAL = re.compile(r"'\d{4}-\d{2}-\d{2}[ T][^']*'")
+DATE_LITERAL = re.compile(r"'\d{4}-\d{2}-\d{2}'")
+
+
+def index_name(model: type[Model], *fields: str) -> str:
+    """Name of the ``Meta.indexes`` entry of ``model`` covering exactly ``fields``."""
+    for index in model._meta.indexes:
+        if tuple(index.fields) == fields:
+            return index.name
+    raise LookupError(f"{model.__name__} has no index on {fields}.")
+
+
+@dataclass
+class PlanContext:
+    rep: Any
+    admin: Any
+    factory: RequestFactory = field(default_factory=RequestFactory)
+    api_factory: APIRequestFactory = field(default_factory=APIRequestFactory)
+
+    def render(self, view_class, path: str, user, **kwargs: Any) -> None:
+        request = self.factory.get(path)
+        request.user = user
+        request.session = SessionBase()
+        request._messages = FallbackStorage(request)
+        response = view_class.as_view()(request, **kwargs)
+        if hasattr(response, "render"):
+            response.render()
+
+    def api(self, viewset_class, path: str, user, action: str = "list") -> None:
+        request = self.api_factory.get(path)
+        force_authenticate(request, user=user)
+        viewset_class.as_view({"get": action})(request).render()
+
+
+@dataclass(frozen=True)
+class PlanTarget:
+    name: str
+    run: Callable[[PlanContext], None]
+    uses_indexes: tuple[str, ...] = ()
+    no_seq_scan: tuple[str, ...] = ()
+    max_cost: float | None = None
+
+
+def _targets() -> list[PlanTarget]:
+    from crm import api, autocomplete, views
+    from dashboard.views import DashboardView
+
+    return [
+        PlanTarget(
+            "lead_list",
+            lambda ctx: ctx.render(views.LeadListView, "/crm/leads/", ctx.rep),
+            max_cost=20_000,
+        ),
+        PlanTarget(
+            "lead_list_status",
+            lambda ctx: ctx.render(views.LeadListView, "/crm/leads/?status=won", ctx.rep),
+            max_cost=20_000,
+        ),
+        PlanTarget(
+            "client_list",
+            lambda ctx: ctx.render(views.ClientListView, "/crm/clients/", ctx.rep),
+            no_seq_scan=("crm_client",),
+            max_cost=2_000,
+        ),
+        PlanTarget(
+            "client_list_pipeline",
+            lambda ctx: ctx.render(views.ClientListView, "/crm/clients/?order=pipeline", ctx.admin),
+            uses_indexes=(index_name(Client, "open_lead_value"),),
+            max_cost=2_000,
+        ),
+        PlanTarget(
+            "autocomplete_clients",
+            lambda ctx: ctx.render(
+                views.ClientAutocompleteView, "/crm/autocomplete/clients/?q=cliente 00012", ctx.rep
+            ),
+            uses_indexes=(autocomplete.CLIENT_OWNER_PREFIX_INDEX,),
+            no_seq_scan=("crm_client",),
+            max_cost=200,
+        ),
+        PlanTarget(
+            "autocomplete_clients_admin",
+            lambda ctx: ctx.render(
+                views.ClientAutocompleteView,
+                "/crm/autocomplete/clients/?q=cliente 00012",
+                ctx.admin,
+            ),
+            uses_indexes=(autocomplete.CLIENT_PREFIX_INDEX,),
+            no_seq_scan=("crm_client",),
+            max_cost=200,
+        ),
+        PlanTarget(
+            # Broad terms walk the (name, owner) index in order and stop at the limit.
+            "autocomplete_clients_broad",
+            lambda ctx: ctx.render(
+                views.ClientAutocompleteView, "/crm/autocomplete/clients/?q=cliente", ctx.rep
+            ),
+            no_seq_scan=("crm_client",),
+            max_cost=200,
+        ),
+        PlanTarget(
+            "lead_create_form",
+            lambda ctx: ctx.render(views.LeadCreateView, "/crm/leads/new/", ctx.rep),
+            no_seq_scan=("crm_client",),
+            max_cost=200,
+        ),
+        PlanTarget(
+            "client_detail",
+            lambda ctx: ctx.render(
+                views.ClientDetailView,
+                "/crm/clients/",
+                ctx.rep,
+                pk=Client.objects.filter(owner=ctx.rep).order_by("pk").values("pk")[0]["pk"],
+            ),
+            uses_indexes=(
+                index_name(Interaction, "client", "occurred_at"),
+                index_name(Lead, "client", "created_at"),
+            ),
+            no_seq_scan=("crm_interaction",),
+            max_cost=2_000,
+        ),
+        PlanTarget(
+            "pipeline_board",
+            lambda ctx: ctx.render(views.PipelineBoardView, "/crm/pipeline/", ctx.rep),
+            max_cost=20_000,
+        ),
+        PlanTarget(
+            "dashboard",
+            lambda ctx: ctx.render(DashboardView, "/", ctx.rep),
+            max_cost=20_000,
+        ),
+        PlanTarget(
+            "api_leads",
+            lambda ctx: ctx.api(api.LeadViewSet, "/api/leads/", ctx.rep),
+            max_cost=20_000,
+        ),
+        PlanTarget(
+            "api_leads_filtered",
+            lambda ctx: ctx.api(
+                api.LeadViewSet,
+                "/api/leads/?status=proposal&value_min=40000",
+                ctx.admin,
+            ),
+            uses_indexes=(index_name(Lead, "status", "value"),),
+            no_seq_scan=("crm_lead",),
+            max_cost=5_000,
+        ),
+        PlanTarget(
+            "api_leads_updated_since",
+            lambda ctx: ctx.api(
+                api.LeadViewSet,
+                "/api/leads/?updated_since=2100-01-01T00:00:00Z",
+                ctx.admin,
+            ),
+            uses_indexes=(index_name(Lead, "updated_at", "id"),),
+            no_seq_scan=("crm_lead",),
+            max_cost=100,
+        ),
+        PlanTarget(
+            "api_leads_changes",
+            lambda ctx: ctx.api(
+                api.LeadViewSet,
+                "/api/leads/changes/?updated_since=2100-01-01T00:00:00Z",
+                ctx.rep,
+                action="changes",
+            ),
+            uses_indexes=(index_name(Lead, "updated_at", "id"),),
+            no_seq_scan=("crm_lead",),
+            max_cost=100,
+        ),
+        PlanTarget(
+            "api_clients_changes",
+            lambda ctx: ctx.api(
+                api.ClientViewSet,
+                "/api/clients/changes/?updated_since=2100-01-01T00:00:00Z",
+                ctx.admin,
+                action="changes",
+            ),
+            uses_indexes=(index_name(Client, "updated_at", "id"),),
+            no_seq_scan=("crm_client",),
+            max_cost=100,
+        ),
+        PlanTarget(
+            "api_clients",
+            lambda ctx: ctx.api(api.ClientViewSet, "/api/clients/", ctx.rep),
+            no_seq_scan=("crm_client",),
+            max_cost=2_000,
+        ),
+        PlanTarget(
+            "api_clients_industry",
+            lambda ctx: ctx.api(api.ClientViewSet, "/api/clients/?industry=Varejo", ctx.admin),
+            uses_indexes=(index_name(Client, "industry"),),
+            no_seq_scan=("crm_client",),
+            max_cost=2_000,
+        ),
+        PlanTarget(
+            "api_interactions_follow_up",
+            lambda ctx: ctx.api(
+                api.InteractionViewSet,
+                "/api/interactions/?follow_up_due=2000-01-01",
+                ctx.admin,
+            ),
+            uses_indexes=("crm_interaction_follow_up_idx",),
+            no_seq_scan=("crm_interaction",),
+            max_cost=100,
+        ),
+        PlanTarget(
+            "api_interactions_type_range",
+            lambda ctx: ctx.api(
+                api.InteractionViewSet,
+                "/api/interactions/?interaction_type=meeting&occurred_after=2100-01-01T00:00:00Z",
+                ctx.admin,
+            ),
+            uses_indexes=(index_name(Interaction, "interaction_type", "occurred_at"),),
+            no_seq_scan=("crm_interaction",),
+            max_cost=100,
+        ),
+    ]
+
+
+def get_targets(names: list[str] | None = None) -> list[PlanTarget]:
+    targets = _targets()
+    if not names:
+        return targets
+    unknown = set(names) - {target.name for target in targets}
+    if unknown:
+        raise LookupError(f"Alvos desconhecidos: {', '.join(sorted(unknown))}.")
+    return [target for target in targets if target.name in names]
+
+
+def build_context() -> PlanContext:
+    User = get_user_model()
+    try:
+        admin = User.objects.get(username=ADMIN_USERNAME)
+        rep = User.objects.get(username=f"{USER_PREFIX}-001")
+    except User.DoesNotExist as exc:
+        raise LookupError("Rode `manage.py seed_crm` antes de checar os planos.") from exc
+    return PlanContext(rep=rep, admin=admin)
+
+
+def _normalise_sql(sql: str) -> str:
+    sql = TIMESTAMP_LITERAL.sub("'<timestamp>'", sql)
+    sql = DATE_LITERAL.sub("'<date>'", sql)
+    return sqlparse.format(sql, reindent=True, keyword_case="upper")
+
+
+def _normalise_plan(node: dict[str, Any]) -> dict[str, Any]:
+    summary = {key: node[key] for key in PLAN_KEYS if key in node}
+    if "Plans" in node:
+        summary["Plans"] = [_normalise_plan(child) for child in node["Plans"]]
+    return summary
+
+
+def _walk(node: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def explain(sql: str) -> dict[str, Any]:
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+        (raw,) = cursor.fetchone()
+    plan = raw if isinstance(raw, list) else json.loads(raw)
+    return plan[0]["Plan"]
+
+
+@dataclass
+class PlanResult:
+    target: PlanTarget
+    queries: list[dict[str, Any]]
+    failures: list[str]
+
+    def baseline(self) -> dict[str, Any]:
+        return {
+            "target": self.target.name,
+            "queries": [
+                {"sql": query["sql"].splitlines(), "plan": query["plan"]}
+                for query in self.queries
+            ],
+        }
+
+
+def run_target(target: PlanTarget, context: PlanContext) -> PlanResult:
+    # Templates are really rendered, so ``{% static %}`` must not need the
+    # collectstatic manifest that production settings point at.
+    plain_static = {
+        **settings.STORAGES,
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    }
+    with override_settings(STORAGES=plain_static), CaptureQueriesContext(connection) as captured:
+        target.run(context)
+    queries: list[dict[str, Any]] = []
+    indexes_used: set[str] = set()
+    failures: list[str] = []
+    for position, captured_query in enumerate(captured.captured_queries):
+        sql = captured_query["sql"]
+        if not sql.lstrip().upper().startswith("SELECT"):
+            continue
+        plan = explain(sql)
+        nodes = list(_walk(plan))
+        indexes_used.update(node["Index Name"] for node in nodes if "Index Name" in node)
+        for node in nodes:
+            if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in target.no_seq_scan:
+                failures.append(f"query {position}: seq scan em {node['Relation Name']}")
+        if target.max_cost is not None and plan["Total Cost"] > target.max_cost:
+            failures.append(
+                f"query {position}: custo estimado {plan['Total Cost']:.0f} > {target.max_cost:.0f}"
+            )
+        queries.append({"sql": _normalise_sql(sql), "plan": _normalise_plan(plan)})
+    for name in target.uses_indexes:
+        if name not in indexes_used:
+            failures.append(f"índice {name} não utilizado")
+    return PlanResult(target=target, queries=queries, failures=failures)
+
+
+def baseline_path(target: PlanTarget) -> Path:
+    return BASELINE_DIR / f"{target.name}.json"
+
+
+def dump_baseline(result: PlanResult) -> str:
+    return json.dumps(result.baseline(), indent=2, ensure_ascii=False, sort_keys=True) + "\n"
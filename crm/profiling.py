@@ -0,0 +1,251 @@
+"""On-demand sampling profiler for individual requests.
+
+Staff members obtain a signed token (shown on the *Request profiles* admin page)
+and send it as the ``X-Profile-Token`` header or the ``_profile`` query parameter.
+:class:`ProfilingMiddleware` then samples the request thread's Python stack every
+``PROFILING_INTERVAL`` seconds from a background thread, records every SQL query
+with its offset and duration, and stores the result as a
+:class:`~crm.models.RequestProfile`. Profiles can be downloaded as collapsed
+stacks (``flamegraph.pl``, speedscope, inferno) or as speedscope JSON.
+"""
+from __future__ import annotations
+
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from contextlib import ExitStack
+from types import CodeType, FrameType
+from typing import Any
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+
+from crm.models import RequestProfile
+
+logger = logging.getLogger(__name__)
+
+TOKEN_SALT = "crm.profiling"
+TOKEN_HEADER = "X-Profile-Token"
+TOKEN_PARAM = "_profile"
+MAX_STACK_DEPTH = 128
+MAX_SQL_LENGTH = 2_000
+
+
+def make_token(user) -> str:
+    """Signed, expiring token that lets ``user`` profile their own requests."""
+    return signing.dumps(user.pk, salt=TOKEN_SALT)
+
+
+def token_user_id(token: str) -> int | None:
+    try:
+        return signing.loads(token, salt=TOKEN_SALT, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+
+
+class StackSampler:
+    """Counts the stacks of one thread, sampled from a daemon thread."""
+
+    def __init__(self, thread_id: int, interval: float, max_seconds: float) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.counts: Counter[str] = Counter()
+        self._labels: dict[CodeType, str] = {}
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="crm-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._thread.join()
+
+    @property
+    def sample_count(self) -> int:
+        return sum(self.counts.values())
+
+    def _label(self, code: CodeType) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            filename = code.co_filename
+            for prefix in sys.path:
+                if prefix and filename.startswith(prefix):
+                    filename = filename[len(prefix):].lstrip("/")
+                    break
+            name = getattr(code, "co_qualname", code.co_name)
+            # ``;`` separates frames and the last space separates the count.
+            label = f"{name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+            self._labels[code] = label
+        return label
+
+    def _stack(self, frame: FrameType | None) -> str:
+        labels: list[str] = []
+        while frame is not None and len(labels) < MAX_STACK_DEPTH:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        return ";".join(reversed(labels))
+
+    def _run(self) -> None:
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stopping.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None and not self._stopping.is_set():
+                self.counts[self._stack(frame)] += 1
+            del frame
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+class QueryRecorder:
+    """``execute_wrapper`` that keeps a timeline of the queries run during a request."""
+
+    def __init__(self, started: float, max_queries: int) -> None:
+        self.started = started
+        self.max_queries = max_queries
+        self.queries: list[dict[str, Any]] = []
+        self.count = 0
+        self.total_ms = 0.0
+
+    def __call__(self, execute: Callable, sql: str, params, many: bool, context) -> Any:
+        begin = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            end = time.perf_counter()
+            duration_ms = (end - begin) * 1000
+            self.count += 1
+            self.total_ms += duration_ms
+            if len(self.queries) < self.max_queries:
+                self.queries.append(
+                    {
+                        "start_ms": round((begin - self.started) * 1000, 3),
+                        "duration_ms": round(duration_ms, 3),
+                        "alias": context["connection"].alias,
+                        "sql": sql[:MAX_SQL_LENGTH],
+                    }
+                )
+
+
+class ProfilingMiddleware:
+    """Profiles requests from staff users that carry a valid profiling token."""
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if not settings.PROFILING_ENABLED or not self._requested(request):
+            return self.get_response(request)
+        return self._profile(request)
+
+    def _requested(self, request: HttpRequest) -> bool:
+        token = request.headers.get(TOKEN_HEADER) or request.GET.get(TOKEN_PARAM)
+        if not token:
+            return False
+        user = getattr(request, "user", None)
+        if user is None or not user.is_authenticated or not user.is_staff:
+            return False
+        return token_user_id(token) == user.pk
+
+    def _profile(self, request: HttpRequest) -> HttpResponse:
+        started = time.perf_counter()
+        cpu_started = time.thread_time()
+        recorder = QueryRecorder(started, settings.PROFILING_MAX_QUERIES)
+        sampler = StackSampler(
+            threading.get_ident(),
+            settings.PROFILING_INTERVAL,
+            settings.PROFILING_MAX_SECONDS,
+        )
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            sampler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                sampler.stop()
+        duration_ms = (time.perf_counter() - started) * 1000
+        cpu_ms = (time.thread_time() - cpu_started) * 1000
+        try:
+            profile = RequestProfile.objects.create(
+                user=request.user,
+                method=request.method or "",
+                path=request.get_full_path()[:2048],
+                view_name=getattr(request.resolver_match, "view_name", "") or "",
+                status_code=response.status_code,
+                duration_ms=round(duration_ms, 3),
+                cpu_ms=round(cpu_ms, 3),
+                sample_interval_ms=settings.PROFILING_INTERVAL * 1000,
+                sample_count=sampler.sample_count,
+                stacks=sampler.collapsed(),
+                queries=recorder.queries,
+                query_count=recorder.count,
+                query_ms=round(recorder.total_ms, 3),
+            )
+        except Exception:  # noqa: BLE001 - profiling must never break the request
+            logger.exception("Could not store the request profile for %s", request.path)
+        else:
+            response["X-Profile-Id"] = str(profile.pk)
+        return response
+
+
+def speedscope(profile: RequestProfile) -> dict[str, Any]:
+    """Speedscope JSON with the sampled Python stacks and an evented SQL timeline."""
+    frames: list[dict[str, str]] = []
+    index: dict[str, int] = {}
+
+    def frame_id(name: str) -> int:
+        if name not in index:
+            index[name] = len(frames)
+            frames.append({"name": name})
+        return index[name]
+
+    samples, weights = [], []
+    for line in profile.stacks.splitlines():
+        stack, _, count = line.rpartition(" ")
+        samples.append([frame_id(name) for name in stack.split(";")])
+        weights.append(int(count) * profile.sample_interval_ms)
+
+    events, cursor = [], 0.0
+    for query in profile.queries:
+        frame = frame_id(f"SQL [{query['alias']}] {' '.join(query['sql'].split())[:120]}")
+        # Queries on one thread never overlap; clamp rounding noise so events stay nested.
+        start = max(query["start_ms"], cursor)
+        cursor = start + query["duration_ms"]
+        events.append({"type": "O", "frame": frame, "at": start})
+        events.append({"type": "C", "frame": frame, "at": cursor})
+
+    name = f"{profile.method} {profile.path}"
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "clientescrm",
+        "activeProfileIndex": 0,
+        "shared": {"frames": frames},
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": f"Python — {name}",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            },
+            {
+                "type": "evented",
+                "name": f"SQL — {profile.query_count} consultas",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": max(profile.duration_ms, cursor),
+                "events": events,
+            },
+        ],
+    }
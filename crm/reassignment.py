@@ -0,0 +1,230 @@
+"""Bulk transfer of a departing rep's book of business to other users.
+
+:func:`transfer_book` walks the rep's clients in primary-key chunks and commits
+each chunk on its own: the clients get their new owner, and the rep's leads and
+open follow-ups (interactions that still have a ``follow_up_date``) on those
+clients move with them. Leads the rep was assigned to on other owners' clients
+are handed over afterwards, also chunk by chunk. Every chunk issues one
+``UPDATE … WHERE id IN (…)`` per target, so row locks on ``crm_lead`` last only
+for that chunk, and on PostgreSQL ``lock_timeout`` makes a chunk fail (and the
+job retry) instead of queueing behind a long-running transaction.
+
+Only rows still pointing at the rep are touched, so a retried run carries on
+where the previous attempt stopped. The lead moves bypass the signals, so every
+chunk that moves leads has the assignment engine (``crm.assignment``) re-read the
+rep loads once it commits.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from collections.abc import Callable, Sequence
+from typing import Any
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, models, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from crm.assignment import engine
+from crm.models import Client, Interaction, Lead
+
+User = get_user_model()
+
+Progress = Callable[..., None]
+
+
+class Strategy(models.TextChoices):
+    ROUND_ROBIN = "round_robin", "Rodízio"
+    BALANCED = "balanced", "Balanceado pela carteira atual"
+
+
+def check_targets(from_user_id: int, to_user_ids: Sequence[int]) -> None:
+    """Raise ``ValueError`` unless the targets are distinct active users other than the rep."""
+    if not to_user_ids:
+        raise ValueError("Informe ao menos um usuário de destino.")
+    if from_user_id in to_user_ids:
+        raise ValueError("O usuário de origem não pode estar entre os destinos.")
+    active = User.objects.filter(pk__in=to_user_ids, is_active=True).count()
+    if active != len(set(to_user_ids)):
+        raise ValueError("Todos os usuários de destino devem existir e estar ativos.")
+
+
+class Distributor:
+    """Picks the target for each transferred record.
+
+    ``round_robin`` cycles through the targets in the given order; ``balanced``
+    always picks the target with the lightest book, where a client weighs one plus
+    its open leads and the starting load is each target's current book.
+    """
+
+    def __init__(self, to_user_ids: Sequence[int], strategy: str) -> None:
+        self.targets = list(dict.fromkeys(to_user_ids))
+        self.strategy = Strategy(strategy)
+        self.loads = dict.fromkeys(self.targets, 0)
+        self._turn = 0
+        if self.strategy == Strategy.BALANCED:
+            current = (
+                Client.objects.filter(owner_id__in=self.targets)
+                .order_by()
+                .values("owner_id")
+                .annotate(clients=Count("pk"), open_leads=Sum("open_lead_count"))
+            )
+            for row in current:
+                self.loads[row["owner_id"]] = row["clients"] + (row["open_leads"] or 0)
+
+    def pick(self, weight: int = 1, exclude: set[int] | frozenset[int] = frozenset()) -> int | None:
+        candidates = [target for target in self.targets if target not in exclude]
+        if not candidates:
+            return None
+        if self.strategy == Strategy.BALANCED:
+            target = min(candidates, key=lambda target: self.loads[target])
+        else:
+            count = len(self.targets)
+            order = [self.targets[(self._turn + step) % count] for step in range(count)]
+            target = next(target for target in order if target not in exclude)
+            self._turn = self.targets.index(target) + 1
+        self.loads[target] += weight
+        return target
+
+
+def _limit_lock_wait() -> None:
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('lock_timeout', %s, true)",
+                [f"{settings.REASSIGN_LOCK_TIMEOUT_MS}ms"],
+            )
+
+
+def _move_clients(
+    from_user_id: int, rows: list[dict[str, Any]], distributor: Distributor
+) -> tuple[dict[int, dict[str, int]], list[int]]:
+    """Move one chunk of clients; returns per-target counts and the skipped client ids."""
+    names = {row["name"] for row in rows}
+    # (name, owner) is unique: never hand a target a second client with the same name.
+    taken = set(
+        Client.objects.filter(owner_id__in=distributor.targets, name__in=names).values_list(
+            "owner_id", "name"
+        )
+    )
+    plan: dict[int, list[int]] = defaultdict(list)
+    skipped: list[int] = []
+    for row in rows:
+        conflicts = {target for target in distributor.targets if (target, row["name"]) in taken}
+        target = distributor.pick(1 + row["open_lead_count"], exclude=conflicts)
+        if target is None:
+            skipped.append(row["pk"])
+            continue
+        taken.add((target, row["name"]))
+        plan[target].append(row["pk"])
+
+    counts: dict[int, dict[str, int]] = {}
+    now = timezone.now()
+    with transaction.atomic():
+        _limit_lock_wait()
+        for target, client_ids in plan.items():
+            counts[target] = {
+                "clients": Client.objects.filter(
+                    pk__in=client_ids, owner_id=from_user_id
+                ).update(owner_id=target, updated_at=now),
+                "leads": Lead.objects.filter(
+                    client_id__in=client_ids, assigned_to_id=from_user_id
+                ).update(assigned_to_id=target, updated_at=now),
+                "follow_ups": Interaction.objects.filter(
+                    client_id__in=client_ids,
+                    author_id=from_user_id,
+                    follow_up_date__isnull=False,
+                ).update(author_id=target, updated_at=now),
+            }
+        if any(values["leads"] for values in counts.values()):
+            transaction.on_commit(engine.invalidate)
+    return counts, skipped
+
+
+def _move_leads(
+    from_user_id: int, lead_ids: list[int], distributor: Distributor
+) -> dict[int, dict[str, int]]:
+    plan: dict[int, list[int]] = defaultdict(list)
+    for lead_id in lead_ids:
+        plan[distributor.pick()].append(lead_id)
+    counts: dict[int, dict[str, int]] = {}
+    now = timezone.now()
+    with transaction.atomic():
+        _limit_lock_wait()
+        for target, ids in plan.items():
+            counts[target] = {
+                "leads": Lead.objects.filter(pk__in=ids, assigned_to_id=from_user_id).update(
+                    assigned_to_id=target, updated_at=now
+                )
+            }
+        transaction.on_commit(engine.invalidate)
+    return counts
+
+
+def transfer_book(
+    from_user_id: int,
+    to_user_ids: Sequence[int],
+    *,
+    strategy: str = Strategy.ROUND_ROBIN,
+    chunk_size: int | None = None,
+    progress: Progress | None = None,
+) -> dict[str, Any]:
+    """Move the clients, leads and open follow-ups of ``from_user_id`` to the targets.
+
+    ``progress`` is called with keyword counters after every chunk. The returned
+    summary is JSON-serialisable so it can be stored as a job result.
+    """
+    check_targets(from_user_id, to_user_ids)
+    chunk_size = chunk_size or settings.REASSIGN_CHUNK_SIZE
+    report = progress or (lambda **values: None)
+    distributor = Distributor(to_user_ids, strategy)
+    per_target: dict[int, dict[str, int]] = {
+        target: {"clients": 0, "leads": 0, "follow_ups": 0} for target in distributor.targets
+    }
+    totals = {"clients": 0, "leads": 0, "follow_ups": 0}
+    skipped: list[int] = []
+
+    def add(counts: dict[int, dict[str, int]]) -> None:
+        for target, values in counts.items():
+            for key, value in values.items():
+                per_target[target][key] += value
+                totals[key] += value
+
+    clients = Client.objects.filter(owner_id=from_user_id).order_by("pk")
+    report(
+        phase="clients",
+        clients_total=clients.count(),
+        leads_total=Lead.objects.filter(assigned_to_id=from_user_id).count(),
+        **totals,
+        skipped=0,
+    )
+    last_pk = 0
+    while rows := list(
+        clients.filter(pk__gt=last_pk).values("pk", "name", "open_lead_count")[:chunk_size]
+    ):
+        last_pk = rows[-1]["pk"]
+        counts, chunk_skipped = _move_clients(from_user_id, rows, distributor)
+        add(counts)
+        skipped.extend(chunk_skipped)
+        report(**totals, skipped=len(skipped))
+
+    report(phase="leads")
+    # Leads on clients that had to stay with the rep (name conflicts) stay with them too.
+    leads = (
+        Lead.objects.filter(assigned_to_id=from_user_id)
+        .exclude(client__owner_id=from_user_id)
+        .order_by("pk")
+    )
+    last_pk = 0
+    while lead_ids := list(leads.filter(pk__gt=last_pk).values_list("pk", flat=True)[:chunk_size]):
+        last_pk = lead_ids[-1]
+        add(_move_leads(from_user_id, lead_ids, distributor))
+        report(**totals)
+
+    report(phase="done")
+    return {
+        **totals,
+        "skipped_clients": skipped,
+        "per_target": {str(target): values for target, values in per_target.items()},
+    }
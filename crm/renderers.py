@@ -0,0 +1,67 @@
+"""orjson-backed JSON renderer and parser for the REST API.
+
+Output is byte-for-byte compatible with DRF's ``JSONRenderer`` in compact mode:
+the serializers hand ``datetime``/``date`` objects over untouched (see
+``crm.serializers.ModelSerializer``) and orjson formats them natively, raw
+``Decimal`` values become numbers as before, and anything else falls back to DRF's
+encoder. Without orjson installed both classes behave exactly like their DRF
+parents.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+OPTIONS = 0 if orjson is None else orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+_fallback = JSONEncoder().default
+
+
+def dumps(data: Any, indent: bool = False) -> bytes:
+    """Serialize ``data`` the way :class:`FastJSONRenderer` does."""
+    if orjson is None:
+        return json.dumps(
+            data,
+            cls=JSONEncoder,
+            ensure_ascii=False,
+            indent=2 if indent else None,
+            separators=None if indent else (",", ":"),
+        ).encode()
+    options = OPTIONS | orjson.OPT_INDENT_2 if indent else OPTIONS
+    # U+2028/U+2029 are valid JSON but break JavaScript string literals; DRF escapes them.
+    return (
+        orjson.dumps(data, default=_fallback, option=options)
+        .replace(b"\xe2\x80\xa8", b"\\u2028")
+        .replace(b"\xe2\x80\xa9", b"\\u2029")
+    )
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None) -> bytes:
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b""
+        renderer_context = renderer_context or {}
+        return dumps(data, indent=bool(self.get_indent(accepted_media_type, renderer_context)))
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read() if stream is not None else b"")
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}") from exc
@@ -1,21 +1,61 @@
 """DRF serializers for CRM resources."""
 from __future__ import annotations
 
-from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.models import Group
+from django.db import models
 from rest_framework import serializers
 
-from crm.models import Client, Interaction, Lead
+from crm.models import (
+    Client,
+    Interaction,
+    InteractionType,
+    Job,
+    Lead,
+    WebhookEndpoint,
+    WebhookEventType,
+)
+from crm.reassignment import Strategy, check_targets
+from crm.summaries import SUMMARY_FIELDS
+from crm.webhooks import UnsafeURL, check_url
 
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+class NativeDateTimeField(serializers.DateTimeField):
+    """Hands the localised ``datetime`` to the renderer instead of formatting it here.
+
+    ``FastJSONRenderer`` (and DRF's encoder as fallback) produce the same ISO 8601
+    string DRF would, without a Python-level ``isoformat()`` call per field.
+    """
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return self.enforce_timezone(value)
+
+
+class NativeDateField(serializers.DateField):
+    def to_representation(self, value):
+        return value or None
+
+
+class ModelSerializer(serializers.ModelSerializer):
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.DateTimeField: NativeDateTimeField,
+        models.DateField: NativeDateField,
+    }
+
+
+class UserSerializer(ModelSerializer):
     class Meta:
         model = User
         fields = ["id", "username", "first_name", "last_name", "email"]
 
 
-class ClientSerializer(serializers.ModelSerializer):
+class ClientSerializer(ModelSerializer):
     owner = UserSerializer(read_only=True)
 
     class Meta:
@@ -30,12 +70,19 @@ class ClientSerializer(serializers.ModelSerializer):
             "industry",
             "notes",
             "owner",
+            "interaction_count",
+            "last_interaction_at",
+            "next_follow_up_date",
+            "open_lead_count",
+            "open_lead_value",
+            "won_value",
             "created_at",
             "updated_at",
         ]
+        read_only_fields = SUMMARY_FIELDS
 
 
-class LeadSerializer(serializers.ModelSerializer):
+class LeadSerializer(ModelSerializer):
     client = ClientSerializer(read_only=True)
     assigned_to = UserSerializer(read_only=True)
     client_id = serializers.PrimaryKeyRelatedField(
@@ -49,6 +96,7 @@ class LeadSerializer(serializers.ModelSerializer):
         write_only=True,
         allow_null=True,
         required=False,
+        help_text="Vazio na criação: o lead vai para o vendedor com menor carga.",
     )
 
     class Meta:
@@ -68,7 +116,7 @@ class LeadSerializer(serializers.ModelSerializer):
         ]
 
 
-class InteractionSerializer(serializers.ModelSerializer):
+class InteractionSerializer(ModelSerializer):
     client = ClientSerializer(read_only=True)
     client_id = serializers.PrimaryKeyRelatedField(
         queryset=Client.objects.all(),
@@ -89,12 +137,135 @@ class InteractionSerializer(serializers.ModelSerializer):
             "notes",
             "occurred_at",
             "follow_up_date",
+            "idempotency_key",
             "created_at",
             "updated_at",
         ]
+        read_only_fields = ["idempotency_key"]
 
     def create(self, validated_data):
         request = self.context.get("request")
         if request and request.user.is_authenticated:
             validated_data["author"] = request.user
         return super().create(validated_data)
+
+
+class InteractionIngestSerializer(serializers.Serializer):
+    """Flat, relation-free item used by the bulk ingest endpoint."""
+
+    idempotency_key = serializers.CharField(max_length=255)
+    client_id = serializers.IntegerField(min_value=1)
+    interaction_type = serializers.ChoiceField(
+        choices=InteractionType.choices,
+        default=InteractionType.NOTE,
+    )
+    subject = serializers.CharField(max_length=255, allow_blank=True, default="")
+    notes = serializers.CharField(allow_blank=True, trim_whitespace=False)
+    occurred_at = serializers.DateTimeField()
+    follow_up_date = serializers.DateField(required=False, allow_null=True, default=None)
+
+
+class LeadAutoAssignSerializer(serializers.Serializer):
+    """Leads to hand to the least loaded reps; assigned or closed ones are skipped."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.ASSIGNMENT_MAX_BATCH,
+    )
+
+
+class TokenObtainSerializer(serializers.Serializer):
+    """Credentials exchanged for a signed API token."""
+
+    username = serializers.CharField()
+    password = serializers.CharField(trim_whitespace=False, write_only=True)
+    ttl = serializers.IntegerField(required=False, min_value=60)
+
+    def validate(self, attrs):
+        user = authenticate(
+            request=self.context.get("request"),
+            username=attrs["username"],
+            password=attrs["password"],
+        )
+        if user is None:
+            raise serializers.ValidationError("Usuário ou senha inválidos.")
+        attrs["user"] = user
+        return attrs
+
+
+class ReassignmentSerializer(serializers.Serializer):
+    """Request to move a departing rep's book of business to other users."""
+
+    from_user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
+    to_users = serializers.PrimaryKeyRelatedField(
+        queryset=User.objects.filter(is_active=True), many=True, allow_empty=False
+    )
+    strategy = serializers.ChoiceField(choices=Strategy.choices, default=Strategy.ROUND_ROBIN)
+    chunk_size = serializers.IntegerField(required=False, min_value=1, max_value=10000)
+
+    def validate(self, attrs):
+        try:
+            check_targets(attrs["from_user"].pk, [user.pk for user in attrs["to_users"]])
+        except ValueError as exc:
+            raise serializers.ValidationError(str(exc)) from exc
+        return attrs
+
+
+class JobSerializer(ModelSerializer):
+    class Meta:
+        model = Job
+        fields = [
+            "id",
+            "task",
+            "status",
+            "attempts",
+            "progress",
+            "result",
+            "last_error",
+            "created_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
+
+
+class WebhookEndpointSerializer(ModelSerializer):
+    group = serializers.PrimaryKeyRelatedField(
+        queryset=Group.objects.all(), required=False, allow_null=True
+    )
+    event_types = serializers.ListField(
+        child=serializers.ChoiceField(choices=WebhookEventType.choices),
+        required=False,
+        allow_empty=True,
+    )
+    max_concurrency = serializers.IntegerField(required=False, min_value=1, max_value=32)
+    batch_size = serializers.IntegerField(required=False, min_value=1, max_value=500)
+
+    class Meta:
+        model = WebhookEndpoint
+        fields = [
+            "id",
+            "url",
+            "group",
+            "event_types",
+            "is_active",
+            "max_concurrency",
+            "batch_size",
+            "secret",
+            "created_at",
+            "updated_at",
+        ]
+        read_only_fields = ["secret"]
+
+    def validate_url(self, url: str) -> str:
+        try:
+            check_url(url)
+        except UnsafeURL as exc:
+            raise serializers.ValidationError(str(exc)) from exc
+        return url
+
+    def validate_group(self, group):
+        user = self.context["request"].user
+        if group and not user.is_superuser and not user.groups.filter(pk=group.pk).exists():
+            raise serializers.ValidationError("Você não faz parte desta equipe.")
+        return group
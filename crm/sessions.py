@@ -0,0 +1,54 @@
+"""Session engine (``SESSION_ENGINE = "crm.sessions"``) that skips unchanged saves.
+
+The store subclasses the engine named by ``SESSION_BASE_ENGINE`` (``db``,
+``cached_db``, ``cache`` or ``signed_cookies``, picked with ``SESSION_BACKEND``).
+Django writes a session back whenever it was marked modified, which includes
+assigning a key the value it already holds. This store remembers the serialised
+data it loaded and drops a save that would write the same bytes, so a request
+only costs the read. Saves of new or re-keyed sessions always go through, as do
+all saves with ``SESSION_SAVE_EVERY_REQUEST``, where the write extends the expiry.
+"""
+from __future__ import annotations
+
+from importlib import import_module
+
+from django.conf import settings
+
+
+def store_class(engine: str) -> type:
+    """``SessionStore`` of ``engine`` with unchanged saves skipped."""
+    base = import_module(engine).SessionStore
+
+    class SessionStore(base):
+        _loaded_state: bytes | None = None
+
+        def load(self) -> dict:
+            data = super().load()
+            self._loaded_state = self._state(data) if self.session_key else None
+            return data
+
+        def create(self) -> None:
+            super().create()
+            self._loaded_state = None
+
+        def save(self, must_create: bool = False) -> None:
+            if (
+                not must_create
+                and not settings.SESSION_SAVE_EVERY_REQUEST
+                and self._loaded_state is not None
+                and self.session_key is not None
+                and self._state(self._session) == self._loaded_state
+            ):
+                return
+            super().save(must_create=must_create)
+            self._loaded_state = None
+
+        def _state(self, data: dict) -> bytes:
+            return self.serializer().dumps(data)
+
+    SessionStore.__module__ = __name__
+    SessionStore.__qualname__ = "SessionStore"
+    return SessionStore
+
+
+SessionStore = store_class(settings.SESSION_BASE_ENGINE)
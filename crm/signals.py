@@ -2,14 +2,21 @@
 from __future__ import annotations
 
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from crm.models import Profile
+from crm import assignment, summaries, webhooks
+from crm.changefeed import record_deletion
+from crm.models import Client, Interaction, Lead, LeadStageChange, Profile
+from crm.summaries import LeadContribution
 
 User = get_user_model()
 
 
+def _owner_id(client_id: int) -> int | None:
+    return Client.objects.filter(pk=client_id).values_list("owner_id", flat=True).first()
+
+
 @receiver(post_save, sender=User)
 def ensure_profile(sender, instance, created: bool, **_: object) -> None:
     """Ensure every user has an associated profile."""
@@ -18,3 +25,146 @@ def ensure_profile(sender, instance, created: bool, **_: object) -> None:
     else:
         if hasattr(instance, "profile"):
             instance.profile.save()
+
+
+@receiver(pre_save, sender=Lead)
+def remember_lead_contribution(sender, instance: Lead, raw: bool = False, **_: object) -> None:
+    """Capture what the stored row contributed before it is overwritten."""
+    instance._previous_contribution = None
+    instance._previous_status = None
+    instance._previous_assignment = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    previous = (
+        Lead.objects.filter(pk=instance.pk)
+        .values("client_id", "status", "value", "assigned_to_id")
+        .first()
+    )
+    if previous:
+        instance._previous_contribution = LeadContribution.of(
+            previous["client_id"], previous["status"], previous["value"]
+        )
+        instance._previous_status = previous["status"]
+        instance._previous_assignment = assignment.contribution(
+            previous["assigned_to_id"], previous["status"], previous["value"]
+        )
+
+
+@receiver(post_save, sender=Lead)
+def update_summary_on_lead_save(sender, instance: Lead, raw: bool = False, **_: object) -> None:
+    if raw:
+        return
+    summaries.apply_lead_change(
+        getattr(instance, "_previous_contribution", None),
+        LeadContribution.of(instance.client_id, instance.status, instance.value),
+    )
+
+
+@receiver(post_save, sender=Lead)
+def update_rep_load_on_lead_save(sender, instance: Lead, raw: bool = False, **_: object) -> None:
+    if raw:
+        return
+    assignment.lead_changed(
+        getattr(instance, "_previous_assignment", None),
+        assignment.contribution(instance.assigned_to_id, instance.status, instance.value),
+    )
+
+
+@receiver(post_save, sender=Lead)
+def record_stage_change(
+    sender, instance: Lead, created: bool, raw: bool = False, **_: object
+) -> None:
+    previous_status = getattr(instance, "_previous_status", None)
+    if raw or (not created and previous_status in (None, instance.status)):
+        return
+    LeadStageChange.objects.create(
+        lead=instance, from_status=previous_status or "", to_status=instance.status
+    )
+
+
+@receiver(post_save, sender=Lead)
+def queue_lead_stage_webhook(
+    sender, instance: Lead, created: bool, raw: bool = False, **_: object
+) -> None:
+    previous_status = getattr(instance, "_previous_status", None)
+    if raw or (not created and previous_status in (None, instance.status)):
+        return
+    event = webhooks.lead_stage_changed(instance, previous_status, _owner_id(instance.client_id))
+    webhooks.record_events([event])
+
+
+@receiver(post_delete, sender=Lead)
+def update_summary_on_lead_delete(sender, instance: Lead, **_: object) -> None:
+    summaries.apply_lead_change(
+        LeadContribution.of(instance.client_id, instance.status, instance.value), None
+    )
+
+
+@receiver(post_delete, sender=Lead)
+def update_rep_load_on_lead_delete(sender, instance: Lead, **_: object) -> None:
+    assignment.lead_changed(
+        assignment.contribution(instance.assigned_to_id, instance.status, instance.value), None
+    )
+
+
+@receiver(post_save, sender=Profile)
+def reload_assignment_rules(sender, instance: Profile, raw: bool = False, **_: object) -> None:
+    """Capacity and industries are read when the loads are; re-read them."""
+    assignment.engine.invalidate()
+
+
+@receiver(pre_save, sender=Interaction)
+def remember_interaction(sender, instance: Interaction, raw: bool = False, **_: object) -> None:
+    instance._previous_summary_state = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._previous_summary_state = (
+        Interaction.objects.filter(pk=instance.pk)
+        .values_list("client_id", "occurred_at", "follow_up_date")
+        .first()
+    )
+
+
+@receiver(post_save, sender=Interaction)
+def update_summary_on_interaction_save(
+    sender, instance: Interaction, created: bool, raw: bool = False, **_: object
+) -> None:
+    if raw:
+        return
+    previous = getattr(instance, "_previous_summary_state", None)
+    current = (instance.client_id, instance.occurred_at, instance.follow_up_date)
+    if created or previous is None:
+        summaries.interaction_added(*current)
+    elif previous[0] != current[0]:
+        summaries.interaction_removed(previous[0])
+        summaries.interaction_added(*current)
+    elif previous != current:
+        summaries.interaction_dates_changed(instance.client_id)
+
+
+@receiver(post_save, sender=Interaction)
+def queue_interaction_webhook(
+    sender, instance: Interaction, created: bool, raw: bool = False, **_: object
+) -> None:
+    if raw or not created:
+        return
+    event = webhooks.interaction_logged(instance, _owner_id(instance.client_id))
+    webhooks.record_events([event])
+
+
+@receiver(post_delete, sender=Interaction)
+def update_summary_on_interaction_delete(sender, instance: Interaction, **_: object) -> None:
+    summaries.interaction_removed(instance.client_id)
+
+
+@receiver(post_delete, sender=Client)
+@receiver(post_delete, sender=Lead)
+@receiver(post_delete, sender=Interaction)
+def record_tombstone(sender, instance, **_: object) -> None:
+    """Leave a tombstone for the change feed, including rows removed by a cascade.
+
+    Soft-deleted clients got theirs when they were hidden (``crm.deletion``).
+    """
+    if isinstance(instance, Client) and instance.deleted_at is not None:
+        return
+    record_deletion(instance)
@@ -0,0 +1,151 @@
+"""Multi-dimensional lead aggregates for the ``/api/leads/stats/`` endpoint.
+
+On PostgreSQL every requested subtotal comes from a single ``GROUP BY GROUPING
+SETS`` query over the caller's visible leads; other backends run one
+``GROUP BY`` per grouping set and merge the results.
+"""
+from __future__ import annotations
+
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import combinations
+from typing import Any
+
+from django.db import connections
+from django.db.models import Avg, Count, DateField, F, QuerySet, Sum
+from django.db.models.functions import Cast, TruncMonth
+
+DIMENSIONS = {
+    "status": lambda: F("status"),
+    "source": lambda: F("source"),
+    "assignee": lambda: F("assigned_to_id"),
+    "industry": lambda: F("client__industry"),
+    # DATE_TRUNC returns a timestamp on PostgreSQL; the raw GROUPING SETS path has no
+    # ORM converters, so cast back to a date in SQL.
+    "close_month": lambda: Cast(TruncMonth("expected_close_date"), DateField()),
+}
+
+MEASURES = {
+    "count": ("COUNT({id})", lambda: Count("id")),
+    "sum_value": ("SUM({value})", lambda: Sum("value")),
+    "avg_value": ("AVG({value})", lambda: Avg("value")),
+}
+
+GROUPINGS = ("cube", "rollup")
+
+CENTS = Decimal("0.01")
+
+
+def grouping_sets(dimensions: list[str], grouping: str) -> list[tuple[str, ...]]:
+    """All subsets of ``dimensions`` (``cube``) or its prefixes (``rollup``), largest first."""
+    if grouping == "rollup":
+        return [tuple(dimensions[:size]) for size in range(len(dimensions), -1, -1)]
+    return [
+        subset
+        for size in range(len(dimensions), -1, -1)
+        for subset in combinations(dimensions, size)
+    ]
+
+
+def _clean(measure: str, value: Any) -> Any:
+    if value is None:
+        return 0 if measure == "count" else Decimal("0.00")
+    if measure == "count":
+        return int(value)
+    return Decimal(value).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def _row(
+    dimensions: list[str],
+    group: tuple[str, ...],
+    keys: dict[str, Any],
+    totals: dict[str, Any],
+    measures: list[str],
+) -> dict[str, Any]:
+    row: dict[str, Any] = {"grouping": list(group)}
+    row.update({name: keys.get(name) if name in group else None for name in dimensions})
+    row.update({measure: _clean(measure, totals.get(measure)) for measure in measures})
+    return row
+
+
+def _grouping_sets_query(
+    queryset: QuerySet,
+    dimensions: list[str],
+    measures: list[str],
+    sets: list[tuple[str, ...]],
+) -> list[dict[str, Any]]:
+    connection = connections[queryset.db]
+    quote = connection.ops.quote_name
+    aliases = {name: f"d_{name}" for name in dimensions}
+    base = (
+        queryset.order_by()
+        .annotate(**{aliases[name]: DIMENSIONS[name]() for name in dimensions})
+        .values("id", "value", *aliases.values())
+    )
+    base_sql, params = base.query.sql_with_params()
+    columns = {name: f"base.{quote(alias)}" for name, alias in aliases.items()}
+    select = [f"{columns[name]} AS {quote(name)}" for name in dimensions]
+    select += [
+        MEASURES[measure][0].format(id=f"base.{quote('id')}", value=f"base.{quote('value')}")
+        + f" AS {quote(measure)}"
+        for measure in measures
+    ]
+    if dimensions:
+        grouped_columns = ", ".join(columns[name] for name in dimensions)
+        select.append(f"GROUPING({grouped_columns}) AS grouping_id")
+    group_by = ", ".join(
+        "(" + ", ".join(columns[name] for name in group) + ")" for group in sets
+    )
+    sql = f"SELECT {', '.join(select)} FROM ({base_sql}) base"
+    if dimensions:
+        sql += f" GROUP BY GROUPING SETS ({group_by})"
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        names = [column[0] for column in cursor.description]
+        fetched = [dict(zip(names, values)) for values in cursor.fetchall()]
+
+    rows = []
+    for record in fetched:
+        mask = record.pop("grouping_id", 0)
+        # GROUPING() sets bit (n - 1 - i) when dimension i is rolled up.
+        group = tuple(
+            name
+            for index, name in enumerate(dimensions)
+            if not mask & (1 << (len(dimensions) - 1 - index))
+        )
+        rows.append(_row(dimensions, group, record, record, measures))
+    return rows
+
+
+def _multi_pass(
+    queryset: QuerySet,
+    dimensions: list[str],
+    measures: list[str],
+    sets: list[tuple[str, ...]],
+) -> list[dict[str, Any]]:
+    base = queryset.order_by().annotate(
+        **{f"d_{name}": DIMENSIONS[name]() for name in dimensions}
+    )
+    aggregates = {measure: MEASURES[measure][1]() for measure in measures}
+    rows = []
+    for group in sets:
+        if not group:
+            rows.append(_row(dimensions, group, {}, base.aggregate(**aggregates), measures))
+            continue
+        grouped = base.values(*(f"d_{name}" for name in group)).annotate(**aggregates)
+        for record in grouped:
+            keys = {name: record[f"d_{name}"] for name in group}
+            rows.append(_row(dimensions, group, keys, record, measures))
+    return rows
+
+
+def lead_stats(
+    queryset: QuerySet,
+    dimensions: list[str],
+    measures: list[str],
+    grouping: str = "cube",
+) -> list[dict[str, Any]]:
+    """Aggregate ``measures`` over ``queryset`` for every grouping set of ``dimensions``."""
+    sets = grouping_sets(dimensions, grouping)
+    if connections[queryset.db].vendor == "postgresql":
+        return _grouping_sets_query(queryset, dimensions, measures, sets)
+    return _multi_pass(queryset, dimensions, measures, sets)
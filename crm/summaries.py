@@ -0,0 +1,198 @@
+"""Denormalised activity and pipeline summary stored on each ``Client`` row.
+
+The summary columns are kept current incrementally: ``crm.signals`` turns every
+``Lead``/``Interaction`` save or delete into a single ``UPDATE crm_client`` with
+``F()`` deltas (counts and sums) or ``GREATEST``/``LEAST`` (dates), so concurrent
+writers never lose updates. Only removing or moving an interaction re-derives the
+two date columns from the client's own interactions. Writes that bypass model
+signals (``bulk_create``, ``QuerySet.update``) must call :func:`refresh_summaries`,
+and ``manage.py rebuild_client_summaries`` verifies and repairs drift. Every summary
+write also bumps ``updated_at``, so the change feed (``crm.changefeed``) picks it up.
+"""
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from decimal import Decimal
+from itertools import islice
+from typing import Any
+
+from django.db.models import (
+    Count,
+    DateField,
+    DateTimeField,
+    DecimalField,
+    F,
+    IntegerField,
+    Max,
+    Min,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+
+from crm.models import Client, Interaction, Lead, LeadStatus
+
+SUMMARY_FIELDS = (
+    "interaction_count",
+    "last_interaction_at",
+    "next_follow_up_date",
+    "open_lead_count",
+    "open_lead_value",
+    "won_value",
+)
+
+OPEN_STATUSES = (LeadStatus.NEW, LeadStatus.CONTACT, LeadStatus.PROPOSAL)
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+ZERO = Decimal("0.00")
+
+
+@dataclass(frozen=True)
+class LeadContribution:
+    """What one lead adds to its client's summary."""
+
+    client_id: int
+    open_lead_count: int
+    open_lead_value: Decimal
+    won_value: Decimal
+
+    @classmethod
+    def of(cls, client_id: int, status: str, value: Decimal | int | None) -> LeadContribution:
+        value = Decimal(value or 0)
+        is_open = status in OPEN_STATUSES
+        return cls(
+            client_id=client_id,
+            open_lead_count=int(is_open),
+            open_lead_value=value if is_open else ZERO,
+            won_value=value if status == LeadStatus.WON else ZERO,
+        )
+
+
+def apply_lead_change(old: LeadContribution | None, new: LeadContribution | None) -> None:
+    """Move the summary from ``old`` to ``new`` (either side may be ``None``)."""
+    deltas: dict[int, dict[str, Any]] = {}
+    for contribution, sign in ((old, -1), (new, 1)):
+        if contribution is None:
+            continue
+        delta = deltas.setdefault(
+            contribution.client_id,
+            {"open_lead_count": 0, "open_lead_value": ZERO, "won_value": ZERO},
+        )
+        for field in delta:
+            delta[field] += sign * getattr(contribution, field)
+    for client_id, delta in deltas.items():
+        changes = {field: F(field) + amount for field, amount in delta.items() if amount}
+        if changes:
+            Client.objects.filter(pk=client_id).update(**changes, updated_at=timezone.now())
+
+
+def interaction_added(client_id: int, occurred_at, follow_up_date) -> None:
+    changes: dict[str, Any] = {
+        "interaction_count": F("interaction_count") + 1,
+        # GREATEST/LEAST return NULL on SQLite when any argument is NULL.
+        "last_interaction_at": Greatest(
+            Coalesce(F("last_interaction_at"), Value(occurred_at)), Value(occurred_at)
+        ),
+    }
+    if follow_up_date is not None:
+        changes["next_follow_up_date"] = Least(
+            Coalesce(F("next_follow_up_date"), Value(follow_up_date)), Value(follow_up_date)
+        )
+    Client.objects.filter(pk=client_id).update(**changes, updated_at=timezone.now())
+
+
+def interaction_removed(client_id: int) -> None:
+    Client.objects.filter(pk=client_id).update(
+        interaction_count=F("interaction_count") - 1,
+        updated_at=timezone.now(),
+        **_interaction_dates(),
+    )
+
+
+def interaction_dates_changed(client_id: int) -> None:
+    Client.objects.filter(pk=client_id).update(**_interaction_dates(), updated_at=timezone.now())
+
+
+def _interaction_dates() -> dict[str, Subquery]:
+    interactions = Interaction.objects.filter(client=OuterRef("pk")).order_by().values("client")
+    return {
+        "last_interaction_at": Subquery(
+            interactions.annotate(latest=Max("occurred_at")).values("latest")[:1],
+            output_field=DateTimeField(),
+        ),
+        "next_follow_up_date": Subquery(
+            interactions.filter(follow_up_date__isnull=False)
+            .annotate(earliest=Min("follow_up_date"))
+            .values("earliest")[:1],
+            output_field=DateField(),
+        ),
+    }
+
+
+def _aggregate(model, expression, output_field, **filters) -> Subquery:
+    return Subquery(
+        model.objects.filter(client=OuterRef("pk"), **filters)
+        .order_by()
+        .values("client")
+        .annotate(result=expression)
+        .values("result")[:1],
+        output_field=output_field,
+    )
+
+
+def expected_summaries() -> dict[str, Any]:
+    """Expressions computing every summary column from scratch for ``Client`` rows."""
+    zero = Value(ZERO, output_field=MONEY)
+    return {
+        "interaction_count": Coalesce(_aggregate(Interaction, Count("pk"), IntegerField()), 0),
+        **_interaction_dates(),
+        "open_lead_count": Coalesce(
+            _aggregate(Lead, Count("pk"), IntegerField(), status__in=OPEN_STATUSES), 0
+        ),
+        "open_lead_value": Coalesce(
+            _aggregate(Lead, Sum("value"), MONEY, status__in=OPEN_STATUSES), zero
+        ),
+        "won_value": Coalesce(_aggregate(Lead, Sum("value"), MONEY, status=LeadStatus.WON), zero),
+    }
+
+
+def refresh_summaries(client_ids: Iterable[int]) -> int:
+    """Recompute the summary of the given clients; returns the number of rows updated."""
+    return Client.objects.filter(pk__in=list(client_ids)).update(
+        **expected_summaries(), updated_at=timezone.now()
+    )
+
+
+def _id_chunks(queryset, size: int) -> Iterator[list[int]]:
+    ids = queryset.order_by("pk").values_list("pk", flat=True).iterator(chunk_size=size)
+    while chunk := list(islice(ids, size)):
+        yield chunk
+
+
+def find_drift(client_ids: list[int]) -> list[int]:
+    """Clients among ``client_ids`` whose stored summary differs from the live data."""
+    expected = {f"expected_{field}": value for field, value in expected_summaries().items()}
+    rows = (
+        Client.objects.filter(pk__in=client_ids)
+        .annotate(**expected)
+        .values("pk", *SUMMARY_FIELDS, *expected)
+    )
+    return [
+        row["pk"]
+        for row in rows
+        if any(row[field] != row[f"expected_{field}"] for field in SUMMARY_FIELDS)
+    ]
+
+
+def verify_summaries(queryset=None, *, chunk_size: int = 1000, repair: bool = False):
+    """Yield ``(checked, drifted_ids)`` per chunk, repairing drifted rows when asked."""
+    queryset = Client.objects.all() if queryset is None else queryset
+    for chunk in _id_chunks(queryset, chunk_size):
+        drifted = find_drift(chunk)
+        if drifted and repair:
+            refresh_summaries(drifted)
+        yield len(chunk), drifted
@@ -0,0 +1,101 @@
+"""Background tasks executed by ``manage.py run_worker``."""
+from __future__ import annotations
+
+from collections.abc import Iterable
+from functools import partial
+from typing import Any
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import send_mail
+from django.db import transaction
+
+from crm.deletion import purge_client, purge_user, soft_delete_clients, soft_delete_user
+from crm.jobs import set_progress, task
+from crm.models import Job
+from crm.reassignment import Strategy, check_targets, transfer_book
+
+User = get_user_model()
+
+
+@task("crm.send_welcome_email", max_attempts=3)
+def send_welcome_email(*, user_id: int) -> None:
+    user = User.objects.filter(pk=user_id).first()
+    if not user or not user.email:
+        return
+    send_mail(
+        subject="Bem-vindo ao clientesCRM",
+        message=f"Olá {user.get_full_name() or user.username}, sua conta foi criada com sucesso.",
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[user.email],
+    )
+
+
+@task("crm.reassign_book", bind=True, max_attempts=3)
+def reassign_book(
+    job: Job,
+    *,
+    from_user_id: int,
+    to_user_ids: list[int],
+    strategy: str,
+    chunk_size: int | None = None,
+) -> dict[str, Any]:
+    return transfer_book(
+        from_user_id,
+        to_user_ids,
+        strategy=strategy,
+        chunk_size=chunk_size,
+        progress=partial(set_progress, job),
+    )
+
+
+def enqueue_reassignment(
+    from_user_id: int,
+    to_user_ids: list[int],
+    strategy: str = Strategy.ROUND_ROBIN,
+    chunk_size: int | None = None,
+) -> Job:
+    """Validate and queue a book transfer; one active transfer per departing rep."""
+    check_targets(from_user_id, to_user_ids)
+    return reassign_book.enqueue(
+        from_user_id=from_user_id,
+        to_user_ids=list(to_user_ids),
+        strategy=str(strategy),
+        chunk_size=chunk_size,
+        dedup_key=f"reassign-book:{from_user_id}",
+    )
+
+
+@task("crm.purge_deleted_client", bind=True, max_attempts=5)
+def purge_deleted_client(job: Job, *, client_id: int) -> dict[str, int]:
+    return purge_client(client_id, progress=partial(set_progress, job))
+
+
+@task("crm.purge_deleted_user", bind=True, max_attempts=5)
+def purge_deleted_user(job: Job, *, user_id: int) -> dict[str, Any]:
+    return purge_user(user_id, progress=partial(set_progress, job))
+
+
+def schedule_client_deletion(client_ids: Iterable[int]) -> list[Job]:
+    """Hide the clients now and queue the purge of each one."""
+    with transaction.atomic():
+        return [
+            purge_deleted_client.enqueue(client_id=client_id, dedup_key=f"purge-client:{client_id}")
+            for client_id in soft_delete_clients(client_ids)
+        ]
+
+
+def schedule_user_deletion(user_id: int) -> Job:
+    """Deactivate the user, hide their clients and queue the purge."""
+    with transaction.atomic():
+        soft_delete_user(user_id)
+        return purge_deleted_user.enqueue(user_id=user_id, dedup_key=f"purge-user:{user_id}")
+
+
+@task("crm.refresh_forecast", max_attempts=2)
+def refresh_forecast() -> dict[str, Any]:
+    # Imported lazily: NumPy adds noticeably to boot time.
+    from crm.forecast import compute_forecast
+
+    result = compute_forecast()
+    return {"fingerprint": result["fingerprint"], "open_leads": result["open_leads"]}
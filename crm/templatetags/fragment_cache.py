@@ -0,0 +1,35 @@
+"""``{% fragment "<family>" <version> %}…{% endfragment %}`` versioned fragment caching."""
+from __future__ import annotations
+
+from django import template
+
+from crm.fragments import FAMILIES, get_or_render
+
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, family, fragment_version) -> None:
+        self.nodelist = nodelist
+        self.family = family
+        self.fragment_version = fragment_version
+
+    def render(self, context) -> str:
+        family = self.family.resolve(context)
+        if family not in FAMILIES:
+            raise template.TemplateSyntaxError(f"Família de fragmento desconhecida: {family!r}")
+        fragment_version = self.fragment_version.resolve(context)
+        if not fragment_version:
+            # A missing version would make every fragment of the family share one key.
+            return self.nodelist.render(context)
+        return get_or_render(family, str(fragment_version), lambda: self.nodelist.render(context))
+
+
+@register.tag("fragment")
+def do_fragment(parser, token) -> FragmentNode:
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' espera uma família e uma versão.")
+    nodelist = parser.parse(("endfragment",))
+    parser.delete_first_token()
+    return FragmentNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]))
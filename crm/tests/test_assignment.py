@@ -0,0 +1,145 @@
+"""Tests for automatic lead assignment."""
+from __future__ import annotations
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from model_bakery import baker
+
+from crm import assignment
+from crm.assignment import AssignmentEngine, assign_leads
+from crm.models import Client, Lead, LeadStatus
+
+pytestmark = pytest.mark.django_db
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def _fresh_engine(settings):
+    settings.ASSIGNMENT_VALUE_WEIGHT = 0
+    assignment.engine.invalidate()
+    yield
+    assignment.engine.invalidate()
+
+
+def make_rep(capacity: int, open_leads: int = 0, value: int = 0):
+    rep = baker.make(User, is_active=True)
+    rep.profile.lead_capacity = capacity
+    rep.profile.save()
+    client = baker.make(Client, owner=rep)
+    for _ in range(open_leads):
+        baker.make(Lead, client=client, assigned_to=rep, status=LeadStatus.NEW, value=value)
+    return rep
+
+
+def unassigned_leads(count: int) -> list[Lead]:
+    client = baker.make(Client, owner=baker.make(User))
+    return baker.make(Lead, client=client, status=LeadStatus.NEW, value=0, _quantity=count)
+
+
+def take(engine: AssignmentEngine, picks: int) -> list[int | None]:
+    """Pick ``picks`` times, adding each lead to its rep's load as ``assign_leads`` does."""
+    taken = []
+    for _ in range(picks):
+        user_id = engine.pick()
+        engine.move(None, (user_id, 0))
+        taken.append(user_id)
+    return taken
+
+
+def sign_up(client, username: str):
+    response = client.post(
+        reverse("crm:signup"),
+        {
+            "username": username,
+            "first_name": "Nova",
+            "last_name": "Conta",
+            "email": f"{username}@example.com",
+            "password1": "uma-senha-longa-42",
+            "password2": "uma-senha-longa-42",
+        },
+    )
+    assert response.status_code == 302
+    return User.objects.get(username=username)
+
+
+def test_new_signup_is_never_picked(client) -> None:
+    rep = baker.make(User, is_active=True)
+    rep.profile.lead_capacity = 10
+    rep.profile.save()
+    newcomer = sign_up(client, "novato")
+    engine = AssignmentEngine()
+
+    picks = {engine.pick() for _ in range(20)}
+
+    assert picks == {rep.pk}
+    assert newcomer.pk not in engine.loads()
+
+
+def test_no_rep_has_opted_in(client) -> None:
+    sign_up(client, "novato")
+
+    assert AssignmentEngine().pick() is None
+
+
+def test_least_loaded_reps_are_picked_until_the_loads_even_out() -> None:
+    busy, first, second = make_rep(10, open_leads=4), make_rep(10), make_rep(10)
+    engine = AssignmentEngine()
+
+    taken = take(engine, 11)
+
+    assert busy.pk not in taken[:8]
+    assert taken[:2] == [first.pk, second.pk]
+    assert {rep.open_leads for rep in engine.loads().values()} == {5}
+    assert taken.count(busy.pk) == 1
+
+
+def test_full_reps_are_skipped_until_a_lead_leaves_them(settings) -> None:
+    settings.ASSIGNMENT_VALUE_WEIGHT = 1
+    settings.ASSIGNMENT_VALUE_UNIT = 100_000
+    # The spare rep's pipeline makes their load higher than the full rep's.
+    full, spare = make_rep(2, open_leads=2), make_rep(3, open_leads=1, value=200_000)
+    engine = AssignmentEngine()
+    assert engine.loads()[full.pk].load() < engine.loads()[spare.pk].load()
+
+    assert take(engine, 2) == [spare.pk] * 2
+
+    engine.move((full.pk, 0), None)
+    assert take(engine, 1) == [full.pk]
+
+    # Everyone at capacity: plain round robin.
+    assert sorted(take(engine, 4)) == sorted([full.pk, spare.pk] * 2)
+
+
+def test_batch_fills_reps_in_proportion_to_their_capacity() -> None:
+    reps = [make_rep(1), make_rep(2), make_rep(3)]
+    leads = unassigned_leads(6)
+
+    assigned = assign_leads(Lead.objects.filter(pk__in=[lead.pk for lead in leads]), chunk_size=4)
+
+    assert len(assigned) == 6
+    counts = [Lead.objects.filter(assigned_to=rep).count() for rep in reps]
+    assert counts == [1, 2, 3]
+    assert [assignment.engine.loads()[rep.pk].open_leads for rep in reps] == [1, 2, 3]
+
+
+def test_leads_assigned_concurrently_are_kept_and_the_loads_reread(monkeypatch) -> None:
+    first, second = make_rep(10), make_rep(10)
+    other = baker.make(User)
+    leads = unassigned_leads(4)
+    pick = assignment.engine.pick
+
+    def pick_while_someone_else_assigns(industry: str = "") -> int | None:
+        Lead.objects.filter(pk=leads[1].pk).update(assigned_to=other)
+        return pick(industry)
+
+    monkeypatch.setattr(assignment.engine, "pick", pick_while_someone_else_assigns)
+    assigned = assign_leads(Lead.objects.filter(pk__in=[lead.pk for lead in leads]))
+
+    assert sorted(assigned) == sorted([leads[0].pk, leads[2].pk, leads[3].pk])
+    assert Lead.objects.get(pk=leads[1].pk).assigned_to_id == other.pk
+    loads = assignment.engine.loads()
+    assert loads[first.pk].open_leads + loads[second.pk].open_leads == 3
+    for rep in (first, second):
+        assert loads[rep.pk].open_leads == Lead.objects.filter(assigned_to=rep).count()
@@ -0,0 +1,119 @@
+"""Tests for the signed API tokens and their revocation."""
+from __future__ import annotations
+
+import json
+import time
+
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.exceptions import AuthenticationFailed
+
+from crm.authentication import (
+    _b64decode,
+    _b64encode,
+    issue_token,
+    revoke_token,
+    revoke_user_tokens,
+    verify_token,
+)
+from crm.models import ApiTokenRevocation
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def rep():
+    return baker.make("auth.User", is_active=True)
+
+
+def get_clients(client, token: str):
+    return client.get(reverse("crm-api:client-list"), HTTP_AUTHORIZATION=f"Bearer {token}")
+
+
+def test_issued_token_verifies_and_authenticates(client, rep) -> None:
+    token, claims = issue_token(rep)
+
+    assert verify_token(token) == claims
+    assert claims["uid"] == rep.pk
+    assert claims["role"] == "user"
+    assert get_clients(client, token).status_code == 200
+
+
+def test_expired_token_is_refused(rep, monkeypatch) -> None:
+    token, claims = issue_token(rep, ttl=60)
+    monkeypatch.setattr(time, "time", lambda: claims["exp"] + 1)
+
+    with pytest.raises(AuthenticationFailed, match="expirado"):
+        verify_token(token)
+
+
+def test_token_with_a_bad_signature_is_refused(client, rep) -> None:
+    token, claims = issue_token(rep)
+    key_id, payload, signature = token.split(".")
+    other = baker.make("auth.User", is_superuser=True, is_active=True)
+    forged = _b64encode(json.dumps({**json.loads(_b64decode(payload)), "uid": other.pk}).encode())
+
+    for bad in (f"{key_id}.{forged}.{signature}", f"{key_id}.{payload}.{signature[:-2]}xx"):
+        with pytest.raises(AuthenticationFailed, match="Assinatura"):
+            verify_token(bad)
+        assert get_clients(client, bad).status_code == 401
+
+
+def test_revoking_one_token_leaves_the_others(client, rep) -> None:
+    revoked, claims = issue_token(rep)
+    kept, _claims = issue_token(rep)
+
+    revoke_token(claims)
+    cache.clear()
+
+    with pytest.raises(AuthenticationFailed, match="revogado"):
+        verify_token(revoked)
+    assert get_clients(client, revoked).status_code == 401
+    assert get_clients(client, kept).status_code == 200
+
+
+def test_revoke_endpoint_revokes_the_presented_token(client, rep) -> None:
+    token, _claims = issue_token(rep)
+
+    response = client.post(reverse("crm-api:token-revoke"), HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    assert response.status_code == 204
+    assert get_clients(client, token).status_code == 401
+
+
+def test_revoking_a_user_refuses_every_earlier_token(client, rep) -> None:
+    earlier = [issue_token(rep)[0] for _ in range(2)]
+    bystander, _claims = issue_token(baker.make("auth.User", is_active=True))
+
+    revoke_user_tokens(rep)
+    cache.clear()
+    time.sleep(0.002)
+    later, _claims = issue_token(rep)
+
+    for token in earlier:
+        with pytest.raises(AuthenticationFailed, match="revogado"):
+            verify_token(token)
+        assert get_clients(client, token).status_code == 401
+    assert get_clients(client, later).status_code == 200
+    assert get_clients(client, bystander).status_code == 200
+
+
+def test_expired_revocations_are_dropped_on_the_next_revocation(rep) -> None:
+    _token, claims = issue_token(rep, ttl=60)
+    revoke_token({**claims, "exp": time.time() - 1})
+
+    revoke_token(claims)
+
+    assert list(ApiTokenRevocation.objects.values_list("jti", flat=True)) == [claims["jti"]]
+
+
+def test_deactivated_user_is_refused_at_once(client, rep) -> None:
+    token, _claims = issue_token(rep)
+    assert get_clients(client, token).status_code == 200
+
+    rep.is_active = False
+    rep.save(update_fields=["is_active"])
+
+    assert get_clients(client, token).status_code == 401
@@ -0,0 +1,90 @@
+"""Tests for the client and user typeahead lookups."""
+from __future__ import annotations
+
+import pytest
+from django.urls import reverse
+from model_bakery import baker
+
+from crm.autocomplete import search_clients, search_users
+from crm.models import Client
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def reps():
+    alice = baker.make("auth.User", username="alice", is_active=True)
+    bob = baker.make("auth.User", username="bob", is_active=True)
+    for name in ("Padaria Central", "Pastelaria Sol", "Mercado Pao Doce"):
+        baker.make(Client, owner=alice, name=name, company=f"{name} Ltda")
+    baker.make(Client, owner=bob, name="Padaria do Bob")
+    return alice, bob
+
+
+def names(rows: list[dict]) -> list[str]:
+    return [row["text"] for row in rows]
+
+
+def test_rep_only_finds_their_own_clients(reps) -> None:
+    alice, bob = reps
+
+    assert names(search_clients(alice, "pada")) == ["Padaria Central"]
+    assert names(search_clients(bob, "pada")) == ["Padaria do Bob"]
+
+
+def test_superuser_finds_every_client(reps) -> None:
+    admin = baker.make("auth.User", is_superuser=True)
+
+    assert names(search_clients(admin, "PADA")) == ["Padaria Central", "Padaria do Bob"]
+
+
+def test_terms_shorter_than_the_minimum_return_nothing(reps, settings) -> None:
+    alice, _bob = reps
+    settings.AUTOCOMPLETE_MIN_CHARS = 3
+
+    assert search_clients(alice, " p a ") == []
+    assert search_users("al") == []
+    assert names(search_clients(alice, "pas")) == ["Pastelaria Sol"]
+
+
+def test_results_stop_at_the_limit(reps, settings) -> None:
+    alice, _bob = reps
+    settings.AUTOCOMPLETE_LIMIT = 1
+
+    assert names(search_clients(alice, "pa")) == ["Padaria Central"]
+    assert len(search_clients(alice, "pa", limit=5)) == 2
+
+
+def test_prefix_matches_come_before_substring_matches(reps, settings) -> None:
+    alice, _bob = reps
+    baker.make(Client, owner=alice, name="A Pao Quente")
+    baker.make(Client, owner=alice, name="Pao de Queijo")
+    settings.AUTOCOMPLETE_TRIGRAM = True
+
+    assert names(search_clients(alice, "pao")) == [
+        "Pao de Queijo",
+        "A Pao Quente",
+        "Mercado Pao Doce",
+    ]
+
+    settings.AUTOCOMPLETE_TRIGRAM = False
+    assert names(search_clients(alice, "pao")) == ["Pao de Queijo"]
+
+
+def test_user_search_matches_names_of_active_users(reps) -> None:
+    baker.make("auth.User", username="carla", first_name="Alina", last_name="Souza")
+    baker.make("auth.User", username="alberto", is_active=False)
+
+    rows = search_users("al")
+
+    assert [row["detail"] for row in rows] == ["alice", "carla"]
+    assert rows[1]["text"] == "Alina Souza"
+
+
+def test_view_scopes_to_the_logged_in_rep(client, reps) -> None:
+    alice, _bob = reps
+    client.force_login(alice)
+
+    response = client.get(reverse("crm:autocomplete-clients"), {"q": "padaria"})
+
+    assert names(response.json()["results"]) == ["Padaria Central"]
@@ -0,0 +1,53 @@
+"""Tests for the incremental change feed."""
+from __future__ import annotations
+
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+from model_bakery import baker
+
+from crm import changefeed
+from crm.models import Client, TombstoneResource
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def _no_settle_delay(settings) -> None:
+    settings.CHANGE_FEED_SETTLE_SECONDS = 0
+
+
+def page(user, cursor: changefeed.FeedCursor, limit: int = 10) -> dict:
+    return changefeed.changes(
+        Client.objects.filter(owner=user), TombstoneResource.CLIENT, user, cursor, limit
+    )
+
+
+def test_pages_cover_every_change_once() -> None:
+    user = baker.make("auth.User")
+    clients = baker.make(Client, owner=user, _quantity=3)
+
+    first = page(user, changefeed.initial_cursor(), limit=2)
+    second = page(user, first["cursor"], limit=2)
+
+    assert first["has_more"] and not second["has_more"]
+    seen = [client.pk for client in first["rows"] + second["rows"]]
+    assert sorted(seen) == sorted(client.pk for client in clients)
+
+
+def test_idle_scope_does_not_expire_the_cursor(settings, monkeypatch) -> None:
+    user = baker.make("auth.User")
+    baker.make(Client, owner=user)
+    other = baker.make(Client)
+    other.delete()  # a tombstone outside the user's scope
+    cursor = page(user, changefeed.initial_cursor())["cursor"]
+
+    # Synced daily, with no deletion in scope for longer than the retention window.
+    later = timezone.now()
+    for _day in range(settings.TOMBSTONE_RETENTION_DAYS + 5):
+        later += timedelta(days=1)
+        monkeypatch.setattr(changefeed.timezone, "now", lambda moment=later: moment)
+        cursor = page(user, cursor)["cursor"]
+
+    assert cursor.deleted_at > later - timedelta(days=1)
@@ -0,0 +1,103 @@
+"""Tests for the brotli/gzip response compression middleware."""
+from __future__ import annotations
+
+import gzip
+import zlib
+
+import pytest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory
+
+from crm.compression import CompressionMiddleware, negotiate
+
+brotli = pytest.importorskip("brotli")
+
+BODY = b'{"leads":[' + b",".join(b'{"id":%d,"status":"new"}' % n for n in range(100)) + b"]}"
+
+
+def respond(response, accept_encoding: str | None = "br, gzip"):
+    headers = {"Accept-Encoding": accept_encoding} if accept_encoding is not None else {}
+    request = RequestFactory().get("/api/leads/", headers=headers)
+    return CompressionMiddleware(lambda request: response)(request)
+
+
+def json_response(body: bytes = BODY) -> HttpResponse:
+    return HttpResponse(body, content_type="application/json")
+
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "expected"),
+    [
+        ("gzip, deflate, br", "br"),
+        ("gzip", "gzip"),
+        ("br;q=0.5, gzip;q=0.8", "gzip"),
+        ("br;q=0, gzip", "gzip"),
+        ("*", "br"),
+        ("*;q=0, gzip", "gzip"),
+        ("identity", None),
+        ("", None),
+    ],
+)
+def test_negotiate_honours_q_values(accept_encoding, expected) -> None:
+    assert negotiate(accept_encoding) == expected
+
+
+def test_brotli_when_the_client_accepts_it() -> None:
+    response = respond(json_response())
+
+    assert response["Content-Encoding"] == "br"
+    assert brotli.decompress(response.content) == BODY
+    assert response["Content-Length"] == str(len(response.content))
+    assert response["Vary"] == "Accept-Encoding"
+
+
+def test_gzip_when_brotli_is_not_accepted() -> None:
+    response = respond(json_response(), "gzip")
+
+    assert response["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.content) == BODY
+
+
+def test_uncompressed_but_varied_without_accept_encoding() -> None:
+    response = respond(json_response(), None)
+
+    assert not response.has_header("Content-Encoding")
+    assert response.content == BODY
+    assert response["Vary"] == "Accept-Encoding"
+
+
+def test_small_bodies_are_left_alone(settings) -> None:
+    settings.COMPRESSION_MIN_SIZE = len(BODY) + 1
+
+    response = respond(json_response())
+
+    assert not response.has_header("Content-Encoding")
+    assert not response.has_header("Vary")
+    assert response.content == BODY
+
+
+def test_html_is_never_compressed() -> None:
+    response = respond(HttpResponse(BODY, content_type="text/html"))
+
+    assert not response.has_header("Content-Encoding")
+    assert response.content == BODY
+
+
+def test_strong_etag_becomes_weak() -> None:
+    original = json_response()
+    original["ETag"] = '"abc"'
+
+    assert respond(original)["ETag"] == 'W/"abc"'
+
+
+def test_streaming_csv_is_compressed_chunk_by_chunk() -> None:
+    chunks = [b"id,status\r\n"] + [b"%d,new\r\n" % n for n in range(50)]
+    response = respond(StreamingHttpResponse(iter(chunks), content_type="text/csv"), "gzip")
+
+    parts = list(response.streaming_content)
+
+    assert response["Content-Encoding"] == "gzip"
+    assert len(parts) > 1
+    decompressor = zlib.decompressobj(31)
+    assert decompressor.decompress(parts[0]) == chunks[0]
+    assert gzip.decompress(b"".join(parts)) == b"".join(chunks)
@@ -0,0 +1,134 @@
+"""Tests for soft-deleted clients and their purge."""
+from __future__ import annotations
+
+import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from model_bakery import baker
+
+from crm.assignment import engine
+from crm.deletion import purge_client, soft_delete_clients
+from crm.models import (
+    Client,
+    Interaction,
+    Lead,
+    LeadStageChange,
+    LeadStatus,
+    Tombstone,
+    TombstoneResource,
+)
+from crm.snapshot import LeadSnapshot
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def hidden():
+    """A rep with one live and one soft-deleted client, each with a lead and a note."""
+    user = baker.make("auth.User")
+    live, gone = baker.make(Client, owner=user, _quantity=2)
+    for client in (live, gone):
+        baker.make(Lead, client=client, assigned_to=user, status=LeadStatus.NEW, value=100)
+        baker.make(Interaction, client=client, author=user)
+    soft_delete_clients([gone.pk])
+    return user, live, gone
+
+
+def test_purge_writes_one_client_tombstone(hidden) -> None:
+    _user, _live, gone = hidden
+
+    purge_client(gone.pk, pause=0)
+
+    assert not Client.all_objects.filter(pk=gone.pk).exists()
+    tombstones = Tombstone.objects.filter(resource=TombstoneResource.CLIENT, object_id=gone.pk)
+    assert tombstones.count() == 1
+
+
+def hidden_client(user, rows: int) -> Client:
+    client = baker.make(Client, owner=user)
+    for _ in range(rows):
+        lead = baker.make(Lead, client=client, assigned_to=user, status=LeadStatus.NEW, value=10)
+        lead.status = LeadStatus.PROPOSAL
+        lead.save()
+        baker.make(Interaction, client=client, author=user)
+    soft_delete_clients([client.pk])
+    return client
+
+
+def test_purge_cost_does_not_grow_with_the_rows(hidden) -> None:
+    user, _live, _gone = hidden
+    queries = []
+    for rows in (2, 6):
+        client = hidden_client(user, rows)
+        with CaptureQueriesContext(connection) as captured:
+            counts = purge_client(client.pk, chunk_size=10, pause=0)
+        assert counts == {"interactions": rows, "leads": rows, "clients": 1}
+        queries.append(len(captured))
+
+    assert queries[0] == queries[1]
+
+
+def test_purge_writes_row_tombstones_and_drops_stage_history(
+    hidden, django_capture_on_commit_callbacks
+) -> None:
+    user, _live, gone = hidden
+    user.profile.lead_capacity = 5
+    user.profile.save()
+    lead = Lead.objects.get(client=gone)
+    interaction = Interaction.objects.get(client=gone)
+    assert LeadStageChange.objects.filter(lead=lead).exists()
+    assert engine.loads()[user.pk].open_leads == 2
+
+    with django_capture_on_commit_callbacks(execute=True):
+        purge_client(gone.pk, pause=0)
+
+    tombstones = Tombstone.objects.values_list("resource", "object_id", "owner_id", "user_id")
+    assert (TombstoneResource.LEAD, lead.pk, user.pk, user.pk) in tombstones
+    assert (TombstoneResource.INTERACTION, interaction.pk, user.pk, user.pk) in tombstones
+    assert not LeadStageChange.objects.filter(lead_id=lead.pk).exists()
+    assert engine.loads()[user.pk].open_leads == 1
+
+
+@pytest.mark.parametrize("snapshot", [False, True])
+def test_dashboard_leaves_out_hidden_clients(client, hidden, snapshot) -> None:
+    user, live, _gone = hidden
+    client.force_login(user)
+
+    with override_settings(LEAD_SNAPSHOT_ENABLED=snapshot):
+        context = client.get(reverse("dashboard:index")).context
+
+    assert context["leads_total"] == 1
+    assert context["interactions_total"] == 1
+    assert [row.client_id for row in context["recent_interactions"]] == [live.pk]
+
+
+def test_snapshot_refresh_drops_leads_of_hidden_clients(hidden, settings) -> None:
+    user, live, _gone = hidden
+    settings.LEAD_SNAPSHOT_REFRESH_SECONDS = 0
+    snapshot = LeadSnapshot()
+    assert snapshot.aggregates(user).total == 1
+
+    soft_delete_clients([live.pk])
+
+    assert snapshot.aggregates(user).total == 0
+
+
+def test_lead_views_refuse_leads_of_hidden_clients(client, hidden) -> None:
+    user, _live, gone = hidden
+    lead = Lead.objects.get(client=gone)
+    client.force_login(user)
+
+    assert client.get(reverse("crm:lead-update", args=[lead.pk])).status_code == 404
+    client.post(reverse("crm:lead-stage", args=[lead.pk]), {"status": LeadStatus.WON})
+    lead.refresh_from_db()
+    assert lead.status == LeadStatus.NEW
+
+
+def test_interaction_form_refuses_hidden_clients(client, hidden) -> None:
+    user, live, gone = hidden
+    client.force_login(user)
+
+    assert client.get(reverse("crm:interaction-create", args=[gone.pk])).status_code == 404
+    assert client.get(reverse("crm:interaction-create", args=[live.pk])).status_code == 200
@@ -0,0 +1,129 @@
+"""The API filters are answered from the indexes declared for them."""
+from __future__ import annotations
+
+import json
+from datetime import UTC, date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+
+from crm.filters import ClientFilter, InteractionFilter, LeadFilter
+from crm.models import Client, Interaction, InteractionType, Lead, LeadStatus
+from crm.plan_checks import index_name
+
+pytestmark = [
+    pytest.mark.django_db,
+    pytest.mark.skipif(
+        connection.vendor != "postgresql", reason="EXPLAIN output is PostgreSQL-specific"
+    ),
+]
+
+User = get_user_model()
+
+OWNER_BASE = 10_000
+# Large enough that each filter's index beats a sequential scan on cost, and below
+# ANALYZE's 30,000-row sample, so the statistics (and the plans) are deterministic.
+CLIENTS = 8_000
+ROWS = 24_000
+# About 100 and 1,000 hours of rows: a composite index pays off on the wider range.
+RECENT = "2025-12-28T00:00:00Z"
+WIDE = "2025-11-20T00:00:00Z"
+# Times are spread with this prime so they do not follow the physical row order,
+# which would make any single-column range scan look cheapest.
+SCATTER = 7919
+
+CASES = [
+    (LeadFilter, Lead, {"status": ["won"], "value_min": "4900"}, ("status", "value")),
+    (
+        LeadFilter,
+        Lead,
+        {"expected_close_date_after": "2026-01-01", "expected_close_date_before": "2026-03-31"},
+        ("expected_close_date",),
+    ),
+    (LeadFilter, Lead, {"source": "origem-7"}, ("source",)),
+    (LeadFilter, Lead, {"updated_since": RECENT}, ("updated_at", "id")),
+    (ClientFilter, Client, {"industry": "Setor 7"}, ("industry",)),
+    (
+        ClientFilter,
+        Client,
+        {"owner": str(OWNER_BASE), "created_after": WIDE},
+        ("owner", "created_at"),
+    ),
+    (ClientFilter, Client, {"created_after": RECENT}, ("created_at",)),
+    (
+        InteractionFilter,
+        Interaction,
+        {"interaction_type": ["call"], "occurred_after": WIDE},
+        ("interaction_type", "occurred_at"),
+    ),
+    (InteractionFilter, Interaction, {"occurred_after": RECENT}, ("occurred_at",)),
+    (InteractionFilter, Interaction, {"follow_up_due": "2025-01-31"}, ("follow_up_date",)),
+]
+
+
+@pytest.fixture(scope="module")
+def seeded(django_db_setup, django_db_blocker):
+    """Tens of thousands of rows with varied values, analysed like a real table.
+
+    Nothing steers the planner: an index shows up in the plan only because the
+    filter's SQL can use it and it is the cheapest way to answer it.
+    """
+    with django_db_blocker.unblock():
+        owners = User.objects.bulk_create(
+            User(pk=OWNER_BASE + n, username=f"filtros-{n}") for n in range(20)
+        )
+        clients = Client.objects.bulk_create(
+            Client(name=f"Cliente {n}", owner=owners[n % 20], industry=f"Setor {n % 50}")
+            for n in range(CLIENTS)
+        )
+        statuses = list(LeadStatus.values)
+        Lead.objects.bulk_create(
+            Lead(
+                client=clients[n % CLIENTS],
+                status=statuses[n % len(statuses)],
+                source=f"origem-{n % 40}",
+                value=Decimal(n % 5_000),
+                expected_close_date=date(2025, 1, 1) + timedelta(days=n % 730),
+            )
+            for n in range(ROWS)
+        )
+        types = list(InteractionType.values)
+        start = datetime(2026, 1, 1, tzinfo=UTC)
+        Interaction.objects.bulk_create(
+            Interaction(
+                client=clients[n % CLIENTS],
+                interaction_type=types[n % len(types)],
+                notes="",
+                occurred_at=start - timedelta(hours=n * SCATTER % 6_000),
+                follow_up_date=date(2025, 1, 1) + timedelta(days=n) if n % 10 == 0 else None,
+            )
+            for n in range(ROWS)
+        )
+        with connection.cursor() as cursor:
+            # auto_now stamps every row alike; spread them out, like the occurrences.
+            for table, column in (("crm_client", "created_at"), ("crm_lead", "updated_at")):
+                cursor.execute(
+                    f"UPDATE {table} SET {column} = "
+                    f"timestamptz '2026-01-01' - (id * {SCATTER} % 2000) * interval '1 hour'"
+                )
+            cursor.execute("ANALYZE crm_client, crm_lead, crm_interaction")
+        yield
+        call_command("flush", interactive=False, verbosity=0)
+
+
+def plan_indexes(node: dict) -> set[str]:
+    names = {node["Index Name"]} if "Index Name" in node else set()
+    for child in node.get("Plans", ()):
+        names |= plan_indexes(child)
+    return names
+
+
+@pytest.mark.parametrize(("filterset", "model", "params", "fields"), CASES)
+def test_filter_uses_its_index(seeded, filterset, model, params, fields) -> None:
+    queryset = filterset(params, queryset=model.objects.order_by()).qs
+    plan = json.loads(queryset.explain(format="json"))[0]["Plan"]
+
+    assert index_name(model, *fields) in plan_indexes(plan)
@@ -0,0 +1,142 @@
+"""Tests for the stored revenue forecast."""
+from __future__ import annotations
+
+import pytest
+from django.contrib.auth.models import Group
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+
+from crm.deletion import soft_delete_clients
+from crm.forecast import (
+    REFRESH_TASK,
+    compute_forecast,
+    get_forecast,
+    load_pipeline,
+    pipeline_fingerprint,
+    simulate,
+    visible_forecast,
+)
+from crm.models import Client, ForecastSnapshot, Job, JobStatus, Lead, LeadStatus
+from crm.tasks import refresh_forecast
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def _small_forecast(settings) -> None:
+    settings.FORECAST_SIMULATIONS = 200
+
+
+@pytest.fixture
+def pipeline():
+    alice, bob = baker.make("auth.User", _quantity=2)
+    for owner in (alice, bob):
+        client = baker.make(Client, owner=owner)
+        baker.make(Lead, client=client, status=LeadStatus.PROPOSAL, value=1000, _quantity=2)
+    return alice, bob
+
+
+def queued_refreshes() -> int:
+    return Job.objects.filter(task=REFRESH_TASK, status=JobStatus.QUEUED).count()
+
+
+def test_first_request_queues_the_run_instead_of_computing(pipeline) -> None:
+    assert get_forecast() is None
+    assert get_forecast() is None
+
+    assert queued_refreshes() == 1
+    assert not ForecastSnapshot.objects.exists()
+
+
+def test_worker_result_is_served_from_the_database(pipeline) -> None:
+    alice, _bob = pipeline
+    refresh_forecast()
+
+    forecast = get_forecast()
+
+    assert forecast["stale"] is False
+    assert forecast["open_leads"] == 4
+    assert queued_refreshes() == 0
+    assert list(visible_forecast(forecast, alice)["reps"]) == [str(alice.pk)]
+
+
+def test_changed_pipeline_serves_the_previous_run_as_stale(pipeline) -> None:
+    alice, _bob = pipeline
+    refresh_forecast()
+    baker.make(Lead, client=Client.objects.filter(owner=alice).first(), status=LeadStatus.NEW)
+
+    forecast = get_forecast()
+
+    assert forecast["stale"] is True
+    assert forecast["open_leads"] == 4
+    assert queued_refreshes() == 1
+
+    refresh_forecast()
+
+    assert get_forecast()["open_leads"] == 5
+    assert ForecastSnapshot.objects.count() == 1
+
+
+def test_page_says_the_forecast_is_being_computed(client, pipeline) -> None:
+    alice, _bob = pipeline
+    client.force_login(alice)
+
+    response = client.get(reverse("dashboard:forecast"))
+
+    assert response.status_code == 200
+    assert "A previsão está sendo calculada" in response.content.decode()
+
+    refresh_forecast()
+    response = client.get(reverse("dashboard:forecast"))
+
+    assert "200 simulações sobre 4 leads abertos" in response.content.decode()
+
+
+def test_leads_of_hidden_clients_are_left_out(pipeline) -> None:
+    alice, _bob = pipeline
+    refresh_forecast()
+    before = pipeline_fingerprint()
+
+    soft_delete_clients(Client.objects.filter(owner=alice).values_list("pk", flat=True))
+
+    assert pipeline_fingerprint() != before
+    assert get_forecast()["stale"] is True
+    refresh_forecast()
+    forecast = get_forecast()
+    assert forecast["open_leads"] == 2
+    assert str(alice.pk) not in forecast["reps"]
+
+
+def test_reps_are_simulated_in_bounded_blocks(settings) -> None:
+    settings.FORECAST_HORIZON_MONTHS = 6
+    settings.FORECAST_CHUNK_CELLS = 200 * 6 * 2
+    reps = baker.make("auth.User", _quantity=5)
+    team = baker.make(Group)
+    team.user_set.add(reps[0], reps[3])
+    close = timezone.localdate()
+    for rep in reps:
+        client = baker.make(Client, owner=rep)
+        baker.make(
+            Lead,
+            client=client,
+            status=LeadStatus.PROPOSAL,
+            value=1000,
+            expected_close_date=close,
+            _quantity=3,
+        )
+
+    blocks = list(simulate(load_pipeline(close), close, seed=1))
+
+    assert [(first, block.shape) for first, block in blocks] == [
+        (0, (200, 2, 6)),
+        (2, (200, 2, 6)),
+        (4, (200, 1, 6)),
+    ]
+
+    result = compute_forecast()
+    expected = [row["expected"][0] for row in result["reps"].values()]
+    assert len(expected) == 5
+    assert result["total"]["expected"][0] == pytest.approx(sum(expected), abs=0.05)
+    members = [result["reps"][rep.pk]["expected"][0] for rep in (reps[0], reps[3])]
+    assert result["teams"][team.pk]["expected"][0] == pytest.approx(sum(members), abs=0.05)
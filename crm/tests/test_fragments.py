@@ -0,0 +1,119 @@
+"""Tests for the versioned fragment cache."""
+from __future__ import annotations
+
+from datetime import datetime
+
+import pytest
+from django.template import Context, Template, TemplateSyntaxError
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+
+from crm.fragments import client_version, fragment_cache, group_version, lead_version
+from crm.models import Client, Interaction, Lead, LeadStatus
+
+pytestmark = pytest.mark.django_db
+
+CARD = Template(
+    '{% load fragment_cache %}{% fragment "lead_card" version %}{{ text }}{% endfragment %}'
+)
+
+
+@pytest.fixture(autouse=True)
+def _empty_cache(settings):
+    settings.FRAGMENT_CACHE_ENABLED = True
+    fragment_cache().clear()
+    yield
+    fragment_cache().clear()
+
+
+@pytest.fixture
+def lead() -> Lead:
+    rep = baker.make("auth.User", first_name="Ana", last_name="Lima")
+    client = baker.make(Client, owner=rep, name="Padaria Central")
+    return baker.make(Lead, client=client, assigned_to=rep, status=LeadStatus.NEW, value=100)
+
+
+def card_version(lead: Lead) -> str:
+    return lead_version(Lead.objects.select_related("client", "assigned_to").get(pk=lead.pk))
+
+
+def row_version(client: Client) -> str:
+    return client_version(Client.objects.select_related("owner").get(pk=client.pk))
+
+
+def test_lead_version_follows_the_rows_on_the_card(lead) -> None:
+    seen = {card_version(lead)}
+    assert card_version(lead) in seen
+
+    changes = [
+        lambda: Lead.objects.get(pk=lead.pk).save(),
+        lambda: Client.objects.get(pk=lead.client_id).save(),
+        lambda: baker.make(
+            Interaction, client=lead.client, occurred_at=timezone.make_aware(datetime(2026, 5, 4))
+        ),
+        lambda: type(lead.assigned_to).objects.filter(pk=lead.assigned_to_id).update(
+            first_name="Bia"
+        ),
+        lambda: Lead.objects.filter(pk=lead.pk).update(assigned_to=None),
+    ]
+    for change in changes:
+        change()
+        version = card_version(lead)
+        assert version not in seen
+        seen.add(version)
+
+
+def test_client_version_follows_the_summary_and_owner(lead) -> None:
+    client = lead.client
+    seen = {row_version(client)}
+    assert row_version(client) in seen
+
+    changes = [
+        lambda: baker.make(Lead, client=client, status=LeadStatus.PROPOSAL, value=50),
+        lambda: type(client.owner).objects.filter(pk=client.owner_id).update(last_name="Souza"),
+        lambda: Client.objects.filter(pk=client.pk).update(next_follow_up_date="2026-06-01"),
+    ]
+    for change in changes:
+        change()
+        version = row_version(client)
+        assert version not in seen
+        seen.add(version)
+
+
+def test_group_version_follows_its_members() -> None:
+    base = group_version("new", "Novo", members=["a", "b"])
+
+    assert group_version("new", "Novo", members=iter(["a", "b"])) == base
+    assert group_version("new", "Novo", members=["a", "c"]) != base
+    assert group_version("new", "Novo", members=["b", "a"]) != base
+    assert group_version("won", "Ganho", members=["a", "b"]) != base
+
+
+def test_tag_serves_the_cached_html_until_the_version_changes() -> None:
+    assert CARD.render(Context({"version": "v1", "text": "primeiro"})) == "primeiro"
+    assert CARD.render(Context({"version": "v1", "text": "segundo"})) == "primeiro"
+    assert CARD.render(Context({"version": "v2", "text": "segundo"})) == "segundo"
+    assert CARD.render(Context({"version": "", "text": "sem versão"})) == "sem versão"
+
+
+def test_tag_rejects_unknown_families() -> None:
+    template = Template('{% load fragment_cache %}{% fragment "other" "v1" %}x{% endfragment %}')
+
+    with pytest.raises(TemplateSyntaxError):
+        template.render(Context())
+
+
+def test_pages_show_edits_made_after_they_were_cached(client, lead) -> None:
+    client.force_login(lead.assigned_to)
+    for name in ("crm:lead-list", "crm:client-list", "crm:pipeline"):
+        assert "Padaria Central" in client.get(reverse(name)).content.decode()
+
+    stored = Client.objects.get(pk=lead.client_id)
+    stored.name = "Padaria Nova"
+    stored.save()
+
+    for name in ("crm:lead-list", "crm:client-list", "crm:pipeline"):
+        html = client.get(reverse(name)).content.decode()
+        assert "Padaria Nova" in html
+        assert "Padaria Central" not in html
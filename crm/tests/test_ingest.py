@@ -0,0 +1,67 @@
+"""Tests for the idempotent interaction ingest."""
+from __future__ import annotations
+
+import pytest
+from django.utils import timezone
+from model_bakery import baker
+
+from crm.ingest import _insert, ingest_interactions
+from crm.models import Client, Interaction
+
+pytestmark = pytest.mark.django_db
+
+
+def item(client: Client, key: str) -> dict:
+    return {
+        "idempotency_key": key,
+        "client_id": client.pk,
+        "interaction_type": "note",
+        "subject": "",
+        "notes": "Ligação",
+        "occurred_at": timezone.now(),
+        "follow_up_date": None,
+    }
+
+
+def test_keys_are_scoped_to_their_author() -> None:
+    alice, bob = baker.make("auth.User", _quantity=2)
+    alice_client = baker.make(Client, owner=alice)
+    bob_client = baker.make(Client, owner=bob)
+    ingest_interactions([item(alice_client, "k-1")], user=alice)
+
+    result = ingest_interactions([item(bob_client, "k-1")], user=bob)
+
+    assert result["accepted"] == 1
+    assert result["duplicates"] == 0
+    assert Interaction.objects.filter(idempotency_key="k-1").count() == 2
+
+
+def test_retried_batch_is_reported_as_duplicates() -> None:
+    user = baker.make("auth.User")
+    client = baker.make(Client, owner=user)
+    batch = [item(client, "k-1"), item(client, "k-2"), item(client, "k-1")]
+
+    first = ingest_interactions(batch, user=user)
+    second = ingest_interactions(batch, user=user)
+
+    assert (first["accepted"], first["duplicates"]) == (2, 1)
+    assert (second["accepted"], second["duplicates"]) == (0, 3)
+
+
+def test_insert_skips_keys_stored_concurrently(django_assert_num_queries) -> None:
+    user = baker.make("auth.User")
+    client = baker.make(Client, owner=user)
+    baker.make(Interaction, client=client, author=user, idempotency_key="k-1")
+    rows = [
+        Interaction(
+            client=client, author=user, notes="", occurred_at=timezone.now(), idempotency_key=key
+        )
+        for key in ("k-1", "k-2")
+    ]
+
+    # One conflict-ignoring INSERT and one SELECT of the keys, whatever collides.
+    with django_assert_num_queries(2):
+        inserted = _insert(rows)
+
+    assert [row.idempotency_key for row in inserted] == ["k-2"]
+    assert inserted[0].pk == Interaction.objects.get(author=user, idempotency_key="k-2").pk
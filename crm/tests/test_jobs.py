@@ -0,0 +1,162 @@
+"""Tests for the database-backed job queue."""
+from __future__ import annotations
+
+import threading
+from datetime import timedelta
+
+import pytest
+from django.db import connection, transaction
+from django.utils import timezone
+
+from crm import jobs
+from crm.models import Job, JobStatus
+
+pytestmark = pytest.mark.django_db
+
+
+@jobs.task("tests.returns_set")
+def returns_set() -> set[int]:
+    return {1, 2}
+
+
+@jobs.task("tests.noop")
+def noop() -> None:
+    return None
+
+
+@jobs.task("tests.fails", max_attempts=3)
+def fails() -> None:
+    raise RuntimeError("boom")
+
+
+def running_job(*, attempts: int, max_attempts: int = 3, age: int = 3600) -> Job:
+    return Job.objects.create(
+        task="tests.returns_set",
+        status=JobStatus.RUNNING,
+        attempts=attempts,
+        max_attempts=max_attempts,
+        locked_by="gone:1",
+        locked_at=timezone.now() - timedelta(seconds=age),
+    )
+
+
+def test_requeue_stale_fails_jobs_on_their_last_attempt() -> None:
+    retry = running_job(attempts=1)
+    exhausted = running_job(attempts=3)
+    fresh = running_job(attempts=3, age=0)
+
+    assert jobs.requeue_stale(timeout=60) == 1
+
+    retry.refresh_from_db()
+    exhausted.refresh_from_db()
+    fresh.refresh_from_db()
+    assert retry.status == JobStatus.QUEUED
+    assert exhausted.status == JobStatus.FAILED
+    assert exhausted.finished_at is not None
+    assert fresh.status == JobStatus.RUNNING
+
+
+# execute_job closes stale connections, which needs real transactions around it.
+@pytest.mark.django_db(transaction=True)
+def test_result_that_is_not_json_fails_the_job() -> None:
+    job = running_job(attempts=1, age=0)
+
+    assert jobs.execute_job(job.pk)[1] == "failed"
+
+    job.refresh_from_db()
+    assert job.status == JobStatus.FAILED
+    assert "not JSON-serializable" in job.last_error
+
+
+def test_claim_takes_due_jobs_by_priority() -> None:
+    low = jobs.enqueue("tests.noop", priority=0)
+    high = jobs.enqueue("tests.noop", priority=5)
+    later = jobs.enqueue("tests.noop", priority=9, run_at=timezone.now() + timedelta(hours=1))
+
+    assert jobs.claim("w:1", limit=1) == [high.pk]
+    assert jobs.claim("w:2", limit=5) == [low.pk]
+    assert jobs.claim("w:3", limit=5) == []
+
+    low.refresh_from_db()
+    later.refresh_from_db()
+    assert (low.status, low.locked_by, low.attempts) == (JobStatus.RUNNING, "w:2", 1)
+    assert later.status == JobStatus.QUEUED
+
+
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="SKIP LOCKED needs PostgreSQL")
+@pytest.mark.django_db(transaction=True)
+def test_claim_skips_rows_locked_by_another_worker() -> None:
+    locked = jobs.enqueue("tests.noop", priority=5)
+    free = jobs.enqueue("tests.noop")
+    holding, release = threading.Event(), threading.Event()
+
+    def hold_lock() -> None:
+        try:
+            with transaction.atomic():
+                Job.objects.select_for_update().get(pk=locked.pk)
+                holding.set()
+                release.wait(10)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=hold_lock)
+    thread.start()
+    try:
+        assert holding.wait(10)
+        assert jobs.claim("w:1", limit=5) == [free.pk]
+    finally:
+        release.set()
+        thread.join()
+    assert jobs.claim("w:2", limit=5) == [locked.pk]
+
+
+def test_dedup_key_returns_the_active_job() -> None:
+    first = jobs.enqueue("tests.noop", dedup_key="once")
+
+    assert jobs.enqueue("tests.noop", dedup_key="once").pk == first.pk
+
+    Job.objects.filter(pk=first.pk).update(status=JobStatus.SUCCEEDED)
+    assert jobs.enqueue("tests.noop", dedup_key="once").pk != first.pk
+
+
+def test_requeued_job_can_be_claimed_again() -> None:
+    job = running_job(attempts=1)
+
+    jobs.requeue_stale(timeout=60)
+
+    job.refresh_from_db()
+    assert (job.status, job.locked_by, job.locked_at) == (JobStatus.QUEUED, "", None)
+    assert jobs.claim("w:2", limit=1) == [job.pk]
+    job.refresh_from_db()
+    assert job.attempts == 2
+
+
+def test_retry_delay_backs_off_exponentially(settings) -> None:
+    settings.JOB_RETRY_BASE_DELAY = 10
+    settings.JOB_RETRY_MAX_DELAY = 60
+
+    assert 8 <= jobs.retry_delay(1) <= 12
+    assert 32 <= jobs.retry_delay(3) <= 48
+    assert 48 <= jobs.retry_delay(10) <= 72
+
+
+@pytest.mark.django_db(transaction=True)
+def test_failing_task_is_retried_with_backoff_then_failed(settings) -> None:
+    settings.JOB_RETRY_BASE_DELAY = 10
+    job = jobs.enqueue("tests.fails")
+
+    assert jobs.claim("w:1", limit=1) == [job.pk]
+    before = timezone.now()
+    assert jobs.execute_job(job.pk)[1] == "retried"
+
+    job.refresh_from_db()
+    assert job.status == JobStatus.QUEUED
+    assert (job.locked_by, job.locked_at) == ("", None)
+    assert "RuntimeError: boom" in job.last_error
+    assert timedelta(seconds=8) <= job.run_at - before <= timedelta(seconds=13)
+
+    Job.objects.filter(pk=job.pk).update(attempts=3, status=JobStatus.RUNNING)
+    assert jobs.execute_job(job.pk)[1] == "failed"
+    job.refresh_from_db()
+    assert job.status == JobStatus.FAILED
+    assert job.finished_at is not None
@@ -0,0 +1,163 @@
+"""Tests for the mbox/.eml importer."""
+from __future__ import annotations
+
+from io import StringIO
+from pathlib import Path
+
+import pytest
+from django.core.management import call_command
+from model_bakery import baker
+
+from crm.mail_ingest import (
+    _init_worker,
+    ingest_archives,
+    load_index,
+    mbox_messages,
+    parse_unit,
+    plan_units,
+)
+from crm.models import Client, Interaction, InteractionType
+
+pytestmark = pytest.mark.django_db
+
+
+def message(number: int, sender: str, to: str, body: str, **headers: str) -> str:
+    lines = [
+        f"From: {sender}",
+        f"To: {to}",
+        f"Subject: Assunto {number}",
+        f"Date: Mon, 4 May 2026 10:{number:02d}:00 -0300",
+        f"Message-ID: <{number}@example.com>",
+        *(f"{name.replace('_', '-')}: {value}" for name, value in headers.items()),
+        "",
+        body,
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def mbox(path: Path, *messages: str) -> Path:
+    path.write_text(
+        "".join(f"From sender@example.com Mon May  4 10:00:00 2026\n{text}" for text in messages)
+    )
+    return path
+
+
+@pytest.fixture
+def book():
+    rep = baker.make("auth.User", email="ana@empresa.com", is_active=True)
+    padaria = baker.make(Client, owner=rep, email="contato@padaria.com")
+    mercado = baker.make(Client, owner=rep, email="compras@mercado.com")
+    return rep, padaria, mercado
+
+
+@pytest.fixture
+def archive(tmp_path, book) -> Path:
+    return mbox(
+        tmp_path / "inbox.mbox",
+        message(1, "Ana <ana@empresa.com>", "contato@padaria.com", "Proposta enviada."),
+        message(2, "spam@example.com", "ana@empresa.com", "Oferta imperdível."),
+        message(
+            3,
+            "Compras <COMPRAS@Mercado.com>",
+            "ana@empresa.com",
+            "Fechado.\n\nOn Mon, 4 May 2026 Ana wrote:\n> Proposta enviada.\n> Abraços",
+            Cc="Padaria <contato@padaria.com>",
+        ),
+    )
+
+
+def test_chunks_split_at_from_lines_and_read_every_message_once(archive) -> None:
+    whole = list(mbox_messages(str(archive), 0, archive.stat().st_size))
+    assert len(whole) == 3
+
+    for chunk_bytes in (1, 7, 50, 200, 10_000):
+        units = plan_units([archive], chunk_bytes)
+        parts = [
+            raw for unit in units for raw in mbox_messages(unit.paths[0], unit.start, unit.end)
+        ]
+        assert parts == whole, chunk_bytes
+
+
+def test_messages_match_clients_by_address(archive, book) -> None:
+    rep, padaria, mercado = book
+    _init_worker(load_index())
+
+    (unit,) = plan_units([archive], 2**20)
+    result = parse_unit(unit)
+
+    assert (result.messages, result.unmatched, result.errors) == (3, 1, 0)
+    rows = sorted((row[1], row[3]) for row in result.rows)
+    assert rows == [
+        (padaria.pk, "Assunto 1"),
+        (padaria.pk, "Assunto 3"),
+        (mercado.pk, "Assunto 3"),
+    ]
+    assert {row[2] for row in result.rows} == {rep.pk}
+
+
+def test_quoted_replies_are_left_out_of_the_notes(archive, book) -> None:
+    _rep, _padaria, mercado = book
+
+    ingest_archives([archive], workers=1, chunk_bytes=2**20, batch_size=10)
+
+    reply = Interaction.objects.get(client=mercado)
+    assert reply.notes == "Fechado."
+    assert reply.interaction_type == InteractionType.EMAIL
+
+
+def test_html_bodies_are_converted_to_text(tmp_path, book) -> None:
+    _rep, padaria, _mercado = book
+    (tmp_path / "one.eml").write_text(
+        message(
+            4,
+            "contato@padaria.com",
+            "ana@empresa.com",
+            "<html><head><style>p{}</style></head><body><p>Pedido</p>"
+            "<blockquote>&gt; antigo</blockquote></body></html>",
+            Content_Type="text/html; charset=utf-8",
+        )
+    )
+
+    ingest_archives([tmp_path], workers=1, chunk_bytes=2**20, batch_size=10)
+
+    assert Interaction.objects.get(client=padaria).notes == "Pedido"
+
+
+def test_rerun_skips_done_units_and_keys_dedupe_the_rest(tmp_path, archive, book) -> None:
+    _rep, padaria, _mercado = book
+    state = tmp_path / "state.json"
+    options = {"workers": 1, "chunk_bytes": 64, "batch_size": 2, "state_path": state}
+
+    first = ingest_archives([archive], **options)
+    again = ingest_archives([archive], **options)
+
+    assert (first.inserted, first.duplicates) == (3, 0)
+    assert again.units_skipped == again.units_total == first.units_total
+    assert again.messages == again.inserted == 0
+
+    state.unlink()
+    (tmp_path / "copy.eml").write_text(
+        message(1, "ana@empresa.com", "contato@padaria.com", "Proposta enviada.")
+    )
+    restarted = ingest_archives([archive, tmp_path / "copy.eml"], **options)
+
+    assert (restarted.inserted, restarted.duplicates) == (0, 4)
+    assert Interaction.objects.filter(client=padaria).count() == 2
+    assert Client.objects.get(pk=padaria.pk).interaction_count == 2
+
+
+def test_command_reports_the_import(tmp_path, archive, book) -> None:
+    out = StringIO()
+
+    call_command(
+        "ingest_mail",
+        str(archive),
+        "--workers=1",
+        f"--state={tmp_path / 'state.json'}",
+        stdout=out,
+        stderr=StringIO(),
+    )
+
+    assert "3 interações importadas de 3 mensagens" in out.getvalue()
+    assert (tmp_path / "state.json").exists()
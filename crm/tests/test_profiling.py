@@ -0,0 +1,79 @@
+"""Tests for the on-demand request profiler."""
+from __future__ import annotations
+
+import runpy
+from pathlib import Path
+
+import pytest
+from django.conf import settings as django_settings
+from django.urls import reverse
+from model_bakery import baker
+
+from crm.models import RequestProfile
+from crm.profiling import TOKEN_HEADER, make_token
+
+pytestmark = pytest.mark.django_db
+
+SETTINGS_FILE = Path(django_settings.BASE_DIR) / "core" / "settings.py"
+
+
+@pytest.fixture
+def staff():
+    return baker.make("auth.User", is_staff=True, is_active=True)
+
+
+def get_dashboard(client, user, token: str | None):
+    client.force_login(user)
+    headers = {TOKEN_HEADER: token} if token else {}
+    return client.get(reverse("dashboard:index"), headers=headers)
+
+
+def test_profiling_is_off_unless_the_environment_enables_it(monkeypatch) -> None:
+    monkeypatch.delenv("PROFILING_ENABLED", raising=False)
+
+    assert runpy.run_path(str(SETTINGS_FILE))["PROFILING_ENABLED"] is False
+
+
+def test_disabled_profiler_ignores_a_valid_token(client, staff, settings) -> None:
+    settings.PROFILING_ENABLED = False
+
+    response = get_dashboard(client, staff, make_token(staff))
+
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response
+    assert not RequestProfile.objects.exists()
+
+
+@pytest.mark.parametrize("case", ["no_token", "bad_token", "someone_elses_token", "not_staff"])
+def test_enabled_profiler_only_samples_staff_with_their_own_token(
+    client, staff, settings, case
+) -> None:
+    settings.PROFILING_ENABLED = True
+    user, token = staff, make_token(staff)
+    if case == "no_token":
+        token = None
+    elif case == "bad_token":
+        token = token[:-2] + "xx"
+    elif case == "someone_elses_token":
+        token = make_token(baker.make("auth.User", is_staff=True))
+    else:
+        user = baker.make("auth.User", is_staff=False, is_active=True)
+        token = make_token(user)
+
+    response = get_dashboard(client, user, token)
+
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response
+    assert not RequestProfile.objects.exists()
+
+
+def test_enabled_profiler_records_the_staff_request(client, staff, settings) -> None:
+    settings.PROFILING_ENABLED = True
+
+    response = get_dashboard(client, staff, make_token(staff))
+
+    profile = RequestProfile.objects.get()
+    assert response["X-Profile-Id"] == str(profile.pk)
+    assert profile.user == staff
+    assert profile.status_code == 200
+    assert profile.query_count > 0
@@ -0,0 +1,157 @@
+"""Tests for the bulk transfer of a rep's book."""
+from __future__ import annotations
+
+import threading
+from datetime import date
+
+import pytest
+from django.db import connection, transaction
+from django.utils import timezone
+from model_bakery import baker
+
+from crm import jobs
+from crm.assignment import engine
+from crm.models import Client, Interaction, Job, JobStatus, Lead, LeadStatus
+from crm.reassignment import Distributor, Strategy, transfer_book
+from crm.tasks import enqueue_reassignment
+
+pytestmark = pytest.mark.django_db
+
+
+def make_rep(capacity: int = 0):
+    rep = baker.make("auth.User", is_active=True)
+    if capacity:
+        rep.profile.lead_capacity = capacity
+        rep.profile.save()
+    return rep
+
+
+def make_book(rep, clients: int) -> list[Client]:
+    """``clients`` clients of ``rep``, each with an open lead and a follow-up of theirs."""
+    book = []
+    for n in range(clients):
+        client = baker.make(Client, owner=rep, name=f"Cliente {n}")
+        baker.make(Lead, client=client, assigned_to=rep, status=LeadStatus.NEW, value=100)
+        baker.make(Interaction, client=client, author=rep, follow_up_date=date(2026, 6, 1))
+        book.append(client)
+    return book
+
+
+def owners(clients: list[Client]) -> list[int]:
+    return [Client.objects.get(pk=client.pk).owner_id for client in clients]
+
+
+def test_round_robin_transfer_moves_everything_in_chunks() -> None:
+    rep, first, second = make_rep(), make_rep(), make_rep()
+    book = make_book(rep, 5)
+    elsewhere = baker.make(Lead, client=baker.make(Client, owner=first), assigned_to=rep)
+    reports = []
+
+    result = transfer_book(
+        rep.pk,
+        [first.pk, second.pk],
+        chunk_size=2,
+        progress=lambda **values: reports.append(values),
+    )
+
+    assert owners(book) == [first.pk, second.pk, first.pk, second.pk, first.pk]
+    for client in book:
+        client = Client.objects.get(pk=client.pk)
+        assert set(client.leads.values_list("assigned_to_id", flat=True)) == {client.owner_id}
+        assert set(client.interactions.values_list("author_id", flat=True)) == {client.owner_id}
+    elsewhere.refresh_from_db()
+    assert elsewhere.assigned_to_id == second.pk
+    assert (result["clients"], result["leads"], result["follow_ups"]) == (5, 6, 5)
+    assert result["per_target"][str(first.pk)]["clients"] == 3
+    assert [report["clients"] for report in reports if "clients" in report] == [0, 2, 4, 5, 5]
+    assert not Lead.objects.filter(assigned_to=rep).exists()
+
+
+def test_balanced_transfer_evens_out_the_books() -> None:
+    rep, busy, idle = make_rep(), make_rep(), make_rep()
+    make_book(busy, 2)
+    book = make_book(rep, 4)
+
+    result = transfer_book(rep.pk, [busy.pk, idle.pk], strategy=Strategy.BALANCED, chunk_size=3)
+
+    assert owners(book) == [idle.pk, idle.pk, busy.pk, idle.pk]
+    assert result["per_target"][str(idle.pk)]["clients"] == 3
+
+
+def test_distributor_skips_excluded_targets() -> None:
+    first, second = make_rep(), make_rep()
+    distributor = Distributor([first.pk, second.pk], Strategy.ROUND_ROBIN)
+
+    assert distributor.pick(exclude={first.pk}) == second.pk
+    assert distributor.pick() == first.pk
+    assert distributor.pick(exclude={first.pk, second.pk}) is None
+
+
+def test_name_conflicts_keep_the_client_with_the_rep() -> None:
+    rep, first, second = make_rep(), make_rep(), make_rep()
+    (client,) = make_book(rep, 1)
+    for target in (first, second):
+        baker.make(Client, owner=target, name=client.name)
+
+    result = transfer_book(rep.pk, [first.pk, second.pk])
+
+    assert result["skipped_clients"] == [client.pk]
+    assert owners([client]) == [rep.pk]
+    assert Lead.objects.get(client=client).assigned_to_id == rep.pk
+
+
+def test_transfer_makes_the_engine_reread_the_loads(django_capture_on_commit_callbacks) -> None:
+    rep, target = make_rep(capacity=10), make_rep(capacity=10)
+    make_book(rep, 3)
+    engine.invalidate()
+    assert engine.loads()[target.pk].open_leads == 0
+
+    with django_capture_on_commit_callbacks(execute=True):
+        transfer_book(rep.pk, [target.pk])
+
+    loads = engine.loads()
+    assert (loads[rep.pk].open_leads, loads[target.pk].open_leads) == (0, 3)
+
+
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="lock_timeout needs PostgreSQL")
+@pytest.mark.django_db(transaction=True)
+def test_locked_chunk_fails_the_attempt_and_the_retry_finishes(settings) -> None:
+    settings.REASSIGN_LOCK_TIMEOUT_MS = 100
+    settings.REASSIGN_CHUNK_SIZE = 2
+    rep, target = make_rep(), make_rep()
+    book = make_book(rep, 4)
+    locked_lead = Lead.objects.get(client=book[3])
+    job = enqueue_reassignment(rep.pk, [target.pk])
+    holding, release = threading.Event(), threading.Event()
+
+    def hold_lock() -> None:
+        try:
+            with transaction.atomic():
+                Lead.objects.select_for_update().get(pk=locked_lead.pk)
+                holding.set()
+                release.wait(10)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=hold_lock)
+    thread.start()
+    try:
+        assert holding.wait(10)
+        assert jobs.claim("w:1", limit=1) == [job.pk]
+        assert jobs.execute_job(job.pk)[1] == "retried"
+    finally:
+        release.set()
+        thread.join()
+
+    job.refresh_from_db()
+    assert "lock timeout" in job.last_error
+    # The first chunk was committed; the locked one was rolled back whole.
+    assert owners(book) == [target.pk, target.pk, rep.pk, rep.pk]
+
+    Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+    assert jobs.claim("w:2", limit=1) == [job.pk]
+    assert jobs.execute_job(job.pk)[1] == "succeeded"
+
+    job.refresh_from_db()
+    assert owners(book) == [target.pk] * 4
+    assert (job.result["clients"], job.result["leads"]) == (2, 2)
@@ -0,0 +1,55 @@
+"""Tests for the orjson-backed API renderer and parser."""
+from __future__ import annotations
+
+import io
+from datetime import UTC, date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from crm.renderers import FastJSONParser, FastJSONRenderer, dumps
+
+DATA = {
+    "value": Decimal("1234.50"),
+    "created_at": datetime(2026, 3, 4, 5, 6, 7, 891_000, tzinfo=UTC),
+    "local": datetime(2026, 3, 4, 5, 6, 7, tzinfo=timezone(timedelta(hours=-3))),
+    "close": date(2026, 3, 31),
+    "name": "Ação\u2028linha",
+    "nested": [{"id": 1, "value": Decimal("0.10")}],
+    3: None,
+}
+
+
+def test_output_matches_drf_renderer() -> None:
+    assert FastJSONRenderer().render(DATA) == JSONRenderer().render(DATA)
+
+
+def test_decimal_and_datetime_formats() -> None:
+    rendered = dumps(DATA)
+
+    assert b'"value":1234.5,' in rendered
+    assert b'"nested":[{"id":1,"value":0.1}]' in rendered
+    assert b'"created_at":"2026-03-04T05:06:07.891000Z"' in rendered
+    assert b'"local":"2026-03-04T05:06:07-03:00"' in rendered
+    assert b'"close":"2026-03-31"' in rendered
+    assert '"name":"Ação\\u2028linha"'.encode() in rendered
+
+
+def test_indent_requested_by_the_client_pretty_prints() -> None:
+    rendered = FastJSONRenderer().render({"a": 1}, "application/json; indent=4", {})
+
+    assert rendered == b'{\n  "a": 1\n}'
+
+
+def test_empty_body_renders_as_nothing() -> None:
+    assert FastJSONRenderer().render(None) == b""
+
+
+def test_parser_reads_json_and_rejects_garbage() -> None:
+    parser = FastJSONParser()
+
+    assert parser.parse(io.BytesIO(b'{"a": [1, 2.5]}')) == {"a": [1, 2.5]}
+    with pytest.raises(ParseError):
+        parser.parse(io.BytesIO(b"{nope"))
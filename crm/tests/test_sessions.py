@@ -0,0 +1,107 @@
+"""Tests for the session engine that skips unchanged saves."""
+from __future__ import annotations
+
+from importlib import import_module
+
+import pytest
+from django.contrib.auth import SESSION_KEY
+from django.urls import reverse
+from model_bakery import baker
+
+from crm.sessions import SessionStore, store_class
+
+pytestmark = pytest.mark.django_db
+
+ENGINES = [
+    "django.contrib.sessions.backends.db",
+    "django.contrib.sessions.backends.cached_db",
+    "django.contrib.sessions.backends.cache",
+]
+
+
+@pytest.fixture(params=ENGINES)
+def store(request, monkeypatch):
+    """A ``store_class`` for each engine, with the writes that reach the base engine."""
+    base = import_module(request.param).SessionStore
+    writes: list[bool] = []
+    save = base.save
+
+    def counting_save(self, must_create: bool = False) -> None:
+        writes.append(must_create)
+        save(self, must_create=must_create)
+
+    monkeypatch.setattr(base, "save", counting_save)
+    cls = store_class(request.param)
+    session = cls()
+    session["cart"] = [1, 2]
+    session.save()
+    writes.clear()
+    return cls, session.session_key, writes
+
+
+def test_unchanged_session_is_not_written_back(store) -> None:
+    cls, key, writes = store
+    session = cls(session_key=key)
+
+    session["cart"] = [1, 2]
+    assert session.modified
+    session.save()
+
+    assert writes == []
+
+
+def test_changed_session_is_saved(store) -> None:
+    cls, key, writes = store
+    session = cls(session_key=key)
+
+    session["cart"] = [1, 2, 3]
+    session.save()
+
+    assert writes == [False]
+    assert cls(session_key=key)["cart"] == [1, 2, 3]
+
+
+def test_cycled_key_is_saved(store) -> None:
+    cls, key, writes = store
+    session = cls(session_key=key)
+    assert session["cart"] == [1, 2]
+
+    session.cycle_key()
+    session.save()
+
+    assert writes == [True, False]
+    assert session.session_key != key
+    assert not cls().exists(key)
+    assert cls(session_key=session.session_key)["cart"] == [1, 2]
+
+
+def test_save_every_request_always_writes(store, settings) -> None:
+    settings.SESSION_SAVE_EVERY_REQUEST = True
+    cls, key, writes = store
+    session = cls(session_key=key)
+
+    session["cart"] = [1, 2]
+    session.save()
+
+    assert writes == [False]
+
+
+def test_login_cycles_the_key_and_stores_the_user(client) -> None:
+    user = baker.make("auth.User", username="ana", is_active=True)
+    user.set_password("uma-senha-longa-42")
+    user.save()
+    anonymous = client.session
+    anonymous["cart"] = [1, 2]
+    anonymous.save()
+    before = anonymous.session_key
+
+    response = client.post(
+        reverse("login"), {"username": "ana", "password": "uma-senha-longa-42"}
+    )
+
+    assert response.status_code == 302
+    after = client.session.session_key
+    assert after != before
+    assert not SessionStore().exists(before)
+    session = SessionStore(session_key=after)
+    assert (session[SESSION_KEY], session["cart"]) == (str(user.pk), [1, 2])
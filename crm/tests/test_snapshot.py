@@ -0,0 +1,120 @@
+"""Tests for the columnar lead snapshot behind the dashboard numbers."""
+from __future__ import annotations
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from model_bakery import baker
+
+from crm.models import Client, Lead, LeadStatus
+from crm.snapshot import LeadSnapshot, PipelineAggregates
+from crm.summaries import OPEN_STATUSES
+
+pytestmark = pytest.mark.django_db
+
+TODAY = date(2026, 5, 4)
+
+
+@pytest.fixture(autouse=True)
+def _refresh_on_every_read(settings) -> None:
+    settings.LEAD_SNAPSHOT_REFRESH_SECONDS = 0
+    settings.LEAD_SNAPSHOT_FULL_RELOAD_SECONDS = 3600
+
+
+@pytest.fixture
+def book():
+    ana, bia = baker.make("auth.User", _quantity=2)
+    padaria = baker.make(Client, owner=ana)
+    mercado = baker.make(Client, owner=bia)
+    for client, assignee, status, value, close in (
+        (padaria, ana, LeadStatus.NEW, "100.10", date(2026, 5, 1)),
+        (padaria, bia, LeadStatus.PROPOSAL, "250.00", None),
+        (padaria, ana, LeadStatus.WON, "999.99", date(2026, 4, 1)),
+        (mercado, bia, LeadStatus.WON, "40.00", None),
+        (mercado, None, LeadStatus.CONTACT, "75.25", date(2026, 6, 1)),
+        (mercado, None, LeadStatus.WON, "12.00", None),
+    ):
+        baker.make(
+            Lead,
+            client=client,
+            assigned_to=assignee,
+            status=status,
+            value=Decimal(value),
+            expected_close_date=close,
+        )
+    admin = baker.make("auth.User", is_superuser=True)
+    return ana, bia, admin, padaria, mercado
+
+
+def sql_aggregates(user) -> PipelineAggregates:
+    """What the dashboard's SQL path computes for ``user``."""
+    leads = Lead.objects.filter(client__deleted_at__isnull=True)
+    if not user.is_superuser:
+        leads = leads.filter(Q(assigned_to=user) | Q(client__owner=user))
+    rows = {
+        row["status"]: row
+        for row in leads.values("status").annotate(total=Count("id"), amount=Sum("value"))
+    }
+    won = leads.filter(status=LeadStatus.WON).values("assigned_to").annotate(total=Sum("value"))
+    return PipelineAggregates(
+        counts={status: rows.get(status, {}).get("total", 0) for status in LeadStatus.values},
+        values={
+            status: rows[status]["amount"] if status in rows else Decimal("0.00")
+            for status in LeadStatus.values
+        },
+        won_by_user={row["assigned_to"]: row["total"] for row in won},
+        overdue=leads.filter(status__in=OPEN_STATUSES, expected_close_date__lt=TODAY).count(),
+    )
+
+
+def assert_matches_sql(snapshot: LeadSnapshot, *users) -> None:
+    for user in users:
+        assert snapshot.aggregates(user, TODAY) == sql_aggregates(user), user
+
+
+def test_refresh_keeps_the_snapshot_equal_to_sql(book, django_assert_num_queries) -> None:
+    ana, bia, admin, padaria, mercado = book
+    snapshot = LeadSnapshot()
+    assert_matches_sql(snapshot, ana, bia, admin)
+
+    # Upserts: a new lead and an edited one.
+    baker.make(Lead, client=mercado, assigned_to=ana, status=LeadStatus.WON, value=5)
+    edited = Lead.objects.get(client=padaria, status=LeadStatus.PROPOSAL)
+    edited.status, edited.value = LeadStatus.WON, Decimal("300.00")
+    edited.save()
+    with django_assert_num_queries(3):
+        snapshot.columns()
+    assert_matches_sql(snapshot, ana, bia, admin)
+
+    # A delete leaves a tombstone.
+    Lead.objects.get(client=padaria, status=LeadStatus.NEW).delete()
+    assert_matches_sql(snapshot, ana, bia, admin)
+
+    # An owner change touches the client only; its leads follow the new owner.
+    Lead.objects.update(updated_at=timezone.now() - timedelta(days=1))
+    mercado.owner = ana
+    mercado.save()
+    assert_matches_sql(snapshot, ana, bia, admin)
+    assert snapshot.aggregates(bia, TODAY).counts[LeadStatus.CONTACT] == 0
+    assert snapshot.aggregates(ana, TODAY).counts[LeadStatus.CONTACT] == 1
+
+
+def test_full_reload_picks_up_writes_the_refresh_cannot_see(book, settings) -> None:
+    ana, bia, admin, padaria, _mercado = book
+    snapshot = LeadSnapshot()
+    assert_matches_sql(snapshot, ana, bia, admin)
+
+    # Writes that leave updated_at behind the watermarks are invisible to a refresh.
+    long_ago = timezone.now() - timedelta(days=1)
+    leads = Lead.objects.filter(client=padaria)
+    leads.filter(status=LeadStatus.NEW).update(status=LeadStatus.LOST, updated_at=long_ago)
+    leads.filter(status=LeadStatus.PROPOSAL).update(value=1, updated_at=long_ago)
+    assert snapshot.aggregates(admin, TODAY) != sql_aggregates(admin)
+    assert snapshot.aggregates(admin, TODAY).counts[LeadStatus.LOST] == 0
+
+    settings.LEAD_SNAPSHOT_FULL_RELOAD_SECONDS = 0
+    assert_matches_sql(snapshot, ana, bia, admin)
+    assert snapshot.aggregates(admin, TODAY).counts[LeadStatus.LOST] == 1
@@ -0,0 +1,91 @@
+"""Tests for the multi-dimensional lead stats."""
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+
+import pytest
+from django.db import connection
+from model_bakery import baker
+
+from crm import stats
+from crm.models import Client, Lead, LeadStatus
+
+pytestmark = pytest.mark.django_db
+
+DIMENSIONS = ["status", "industry", "close_month"]
+MEASURES = ["count", "sum_value", "avg_value"]
+
+PATHS = [
+    pytest.param(
+        stats._grouping_sets_query,
+        id="grouping_sets",
+        marks=pytest.mark.skipif(
+            connection.vendor != "postgresql", reason="GROUPING SETS path is PostgreSQL-only"
+        ),
+    ),
+    pytest.param(stats._multi_pass, id="multi_pass"),
+]
+
+
+@pytest.fixture
+def leads() -> list[Lead]:
+    owner = baker.make("auth.User")
+    clients = [
+        baker.make(Client, owner=owner, industry=industry) for industry in ("Varejo", "Saúde")
+    ]
+    statuses = [LeadStatus.NEW, LeadStatus.WON, LeadStatus.LOST]
+    closes = [date(2026, 1, 10), date(2026, 1, 25), date(2026, 2, 3), None]
+    return [
+        baker.make(
+            Lead,
+            client=clients[n % 2],
+            status=statuses[n % 3],
+            value=Decimal(10_037 + 3_701 * n).scaleb(-2),
+            expected_close_date=closes[n % 4],
+        )
+        for n in range(24)
+    ]
+
+
+def expected(leads: list[Lead], grouping: str) -> list[dict]:
+    """The same rows, aggregated in Python."""
+    keys = {
+        "status": lambda lead: lead.status,
+        "industry": lambda lead: lead.client.industry,
+        "close_month": lambda lead: (
+            lead.expected_close_date.replace(day=1) if lead.expected_close_date else None
+        ),
+    }
+    rows = []
+    for group in stats.grouping_sets(DIMENSIONS, grouping):
+        buckets: dict[tuple, list[Decimal]] = defaultdict(list)
+        for lead in leads:
+            buckets[tuple(keys[name](lead) for name in group)].append(lead.value)
+        for values_key, values in buckets.items():
+            row = {"grouping": list(group)}
+            row.update({name: None for name in DIMENSIONS})
+            row.update(dict(zip(group, values_key)))
+            total = sum(values, Decimal(0))
+            row["count"] = len(values)
+            row["sum_value"] = total.quantize(stats.CENTS, rounding=ROUND_HALF_UP)
+            row["avg_value"] = (total / len(values)).quantize(stats.CENTS, rounding=ROUND_HALF_UP)
+            rows.append(row)
+    return rows
+
+
+def ordered(rows: list[dict]) -> list[dict]:
+    return sorted(rows, key=lambda row: repr([row["grouping"], *map(str, row.values())]))
+
+
+@pytest.mark.parametrize("grouping", stats.GROUPINGS)
+@pytest.mark.parametrize("path", PATHS)
+def test_both_paths_return_the_same_totals(leads, path, grouping) -> None:
+    for lead in leads:
+        lead.refresh_from_db()
+    sets = stats.grouping_sets(DIMENSIONS, grouping)
+
+    rows = path(Lead.objects.all(), DIMENSIONS, MEASURES, sets)
+
+    assert ordered(rows) == ordered(expected(leads, grouping))
@@ -0,0 +1,127 @@
+"""Tests for the incrementally maintained client summary columns."""
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils import timezone
+from model_bakery import baker
+
+from crm.models import Client, Interaction, Lead, LeadStatus
+from crm.summaries import SUMMARY_FIELDS
+
+pytestmark = pytest.mark.django_db
+
+NOON = timezone.make_aware(datetime(2026, 5, 4, 12, 0))
+
+
+@pytest.fixture
+def clients() -> tuple[Client, Client]:
+    owner = baker.make("auth.User")
+    return tuple(baker.make(Client, owner=owner, _quantity=2))
+
+
+def stored(*clients: Client) -> dict[int, dict]:
+    rows = Client.objects.filter(pk__in=[client.pk for client in clients])
+    return {row["pk"]: row for row in rows.values("pk", *SUMMARY_FIELDS)}
+
+
+def assert_in_sync(*clients: Client) -> dict[int, dict]:
+    """The signal-maintained columns equal what ``rebuild_client_summaries`` derives."""
+    before = stored(*clients)
+    call_command("rebuild_client_summaries", "--verify", stdout=StringIO())
+    call_command("rebuild_client_summaries", stdout=StringIO())
+    assert stored(*clients) == before
+    return before
+
+
+def lead(client: Client, status: str, value: str) -> Lead:
+    return baker.make(Lead, client=client, status=status, value=Decimal(value))
+
+
+def test_lead_create_update_move_and_delete(clients) -> None:
+    first, second = clients
+    open_lead = lead(first, LeadStatus.NEW, "100.00")
+    lead(first, LeadStatus.PROPOSAL, "250.50")
+    lead(first, LeadStatus.LOST, "999.00")
+    summary = assert_in_sync(first, second)[first.pk]
+    assert summary["open_lead_count"] == 2
+    assert summary["open_lead_value"] == Decimal("350.50")
+
+    open_lead.value = Decimal("120.00")
+    open_lead.save()
+    assert_in_sync(first, second)
+
+    open_lead.status = LeadStatus.WON
+    open_lead.save()
+    summary = assert_in_sync(first, second)[first.pk]
+    assert summary["open_lead_count"] == 1
+    assert summary["won_value"] == Decimal("120.00")
+
+    open_lead.client = second
+    open_lead.status = LeadStatus.CONTACT
+    open_lead.value = Decimal("80.00")
+    open_lead.save()
+    summaries = assert_in_sync(first, second)
+    assert summaries[first.pk]["won_value"] == Decimal("0.00")
+    assert summaries[second.pk]["open_lead_value"] == Decimal("80.00")
+
+    open_lead.delete()
+    Lead.objects.filter(client=first, status=LeadStatus.PROPOSAL).get().delete()
+    summaries = assert_in_sync(first, second)
+    assert summaries[first.pk]["open_lead_count"] == 0
+    assert summaries[second.pk]["open_lead_count"] == 0
+
+
+def test_interaction_create_update_move_and_delete(clients) -> None:
+    first, second = clients
+    older = baker.make(
+        Interaction, client=first, occurred_at=NOON, follow_up_date=date(2026, 6, 1)
+    )
+    latest = baker.make(
+        Interaction,
+        client=first,
+        occurred_at=NOON + timedelta(days=2),
+        follow_up_date=date(2026, 5, 20),
+    )
+    summary = assert_in_sync(first, second)[first.pk]
+    assert summary["interaction_count"] == 2
+    assert summary["last_interaction_at"] == NOON + timedelta(days=2)
+    assert summary["next_follow_up_date"] == date(2026, 5, 20)
+
+    latest.occurred_at = NOON - timedelta(days=1)
+    latest.follow_up_date = None
+    latest.save()
+    summary = assert_in_sync(first, second)[first.pk]
+    assert summary["last_interaction_at"] == NOON
+    assert summary["next_follow_up_date"] == date(2026, 6, 1)
+
+    older.client = second
+    older.save()
+    summaries = assert_in_sync(first, second)
+    assert summaries[first.pk]["interaction_count"] == 1
+    assert summaries[first.pk]["next_follow_up_date"] is None
+    assert summaries[second.pk]["last_interaction_at"] == NOON
+
+    older.delete()
+    latest.delete()
+    summaries = assert_in_sync(first, second)
+    assert summaries[first.pk]["interaction_count"] == 0
+    assert summaries[first.pk]["last_interaction_at"] is None
+    assert summaries[second.pk]["interaction_count"] == 0
+
+
+def test_verify_reports_writes_that_bypass_the_signals(clients) -> None:
+    first, _second = clients
+    lead(first, LeadStatus.NEW, "100.00")
+    Lead.objects.filter(client=first).update(status=LeadStatus.WON)
+
+    with pytest.raises(CommandError):
+        call_command("rebuild_client_summaries", "--verify", stdout=StringIO())
+
+    call_command("rebuild_client_summaries", stdout=StringIO())
+    assert stored(first)[first.pk]["won_value"] == Decimal("100.00")
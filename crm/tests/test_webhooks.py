@@ -0,0 +1,223 @@
+"""Tests for webhook URL checks and the dispatcher against the local stub receiver."""
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import socket
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+from django.conf import settings
+from model_bakery import baker
+
+from crm import webhook_dispatcher
+from crm.models import DeliveryStatus, WebhookDelivery, WebhookEndpoint, WebhookEvent
+from crm.serializers import WebhookEndpointSerializer
+from crm.webhook_dispatcher import dispatch_once
+
+pytestmark = pytest.mark.django_db
+
+STUB_PATH = Path(settings.BASE_DIR) / "scripts" / "webhook_stub_server.py"
+
+
+def load_stub():
+    spec = importlib.util.spec_from_file_location("webhook_stub_server", STUB_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+stub = load_stub()
+
+
+@pytest.fixture
+def receiver():
+    """Start the stub receiver on a free port; yields a function that configures it."""
+    options = argparse.Namespace(delay=0, secret="", fail_rate=0.0, status=503, retry_after=None)
+    stats = stub.Stats()
+    stats.hosts = []
+    base = stub.make_handler(options, stats)
+
+    class Handler(base):
+        def do_POST(self) -> None:  # noqa: N802 - http.server naming
+            stats.hosts.append(self.headers["Host"])
+            super().do_POST()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def configure(**changes):
+        vars(options).update(changes)
+        return f"http://127.0.0.1:{server.server_port}/hooks", stats
+
+    yield configure
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def resolve(monkeypatch):
+    """Make ``hooks.example`` resolve to the given addresses; returns the lookups made."""
+    lookups = []
+    real = socket.getaddrinfo
+
+    def configure(*addresses: str):
+        def getaddrinfo(host, port, *args, **kwargs):
+            if host != "hooks.example":
+                return real(host, port, *args, **kwargs)
+            lookups.append(host)
+            return [
+                (socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port))
+                for address in addresses
+            ]
+
+        monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+        return lookups
+
+    return configure
+
+
+def queue(
+    url: str, count: int = 3, **endpoint_fields
+) -> tuple[WebhookEndpoint, list[WebhookDelivery]]:
+    endpoint = baker.make(WebhookEndpoint, url=url, **{"batch_size": 2, **endpoint_fields})
+    deliveries = [
+        WebhookDelivery.objects.create(
+            endpoint=endpoint,
+            event=WebhookEvent.objects.create(
+                event_type="interaction.logged", key=f"test:{number}", payload={"n": number}
+            ),
+        )
+        for number in range(count)
+    ]
+    return endpoint, deliveries
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "http://127.0.0.1:8000/",
+        "http://localhost/",
+        "http://10.0.0.5/hook",
+        "http://192.168.1.10/hook",
+        "http://169.254.169.254/latest/meta-data/",
+        "http://[::1]/hook",
+        "ftp://203.0.113.10/hook",
+    ],
+)
+def test_serializer_rejects_internal_urls(url: str) -> None:
+    serializer = WebhookEndpointSerializer(data={"url": url})
+
+    assert not serializer.is_valid()
+    assert "url" in serializer.errors
+
+
+def test_dispatcher_delivers_signed_batches(receiver, settings) -> None:
+    settings.WEBHOOK_ALLOW_PRIVATE_URLS = True
+    url, stats = receiver()
+    endpoint, deliveries = queue(url)
+    receiver(secret=endpoint.secret)
+
+    result = dispatch_once()
+
+    assert (result.requests, result.delivered) == (2, 3)
+    assert (stats.requests, stats.events) == (2, 3)
+    assert set(
+        WebhookDelivery.objects.filter(pk__in=[d.pk for d in deliveries]).values_list(
+            "status", flat=True
+        )
+    ) == {DeliveryStatus.DELIVERED}
+
+
+def test_dispatcher_retries_failed_batches(receiver, settings) -> None:
+    settings.WEBHOOK_ALLOW_PRIVATE_URLS = True
+    url, _stats = receiver(fail_rate=1.0, status=503, retry_after=120)
+    _endpoint, [delivery] = queue(url, count=1)
+
+    result = dispatch_once()
+
+    delivery.refresh_from_db()
+    assert result.retried == 1
+    assert delivery.status == DeliveryStatus.PENDING
+    assert (delivery.attempts, delivery.response_status) == (1, 503)
+    assert (delivery.next_attempt_at - delivery.event.created_at).total_seconds() >= 120
+
+
+def test_gone_deactivates_the_endpoint(receiver, settings) -> None:
+    settings.WEBHOOK_ALLOW_PRIVATE_URLS = True
+    url, _stats = receiver(fail_rate=1.0, status=410)
+    endpoint, _deliveries = queue(url, count=1)
+
+    result = dispatch_once()
+
+    endpoint.refresh_from_db()
+    assert result.endpoints_disabled == {endpoint.pk}
+    assert not endpoint.is_active
+
+
+def test_private_url_is_refused_at_send_time(receiver) -> None:
+    url, stats = receiver()
+    _endpoint, [delivery] = queue(url, count=1)
+
+    result = dispatch_once()
+
+    delivery.refresh_from_db()
+    assert result.retried == 1
+    assert stats.requests == 0
+    assert delivery.response_status is None
+    assert delivery.last_error.startswith("URL recusada:")
+
+
+def test_request_goes_to_the_address_that_was_checked(receiver, resolve, settings) -> None:
+    settings.WEBHOOK_ALLOW_PRIVATE_URLS = True
+    url, stats = receiver()
+    lookups = resolve("127.0.0.1")
+    hooks_url = url.replace("127.0.0.1", "hooks.example")
+    queue(hooks_url, count=1)
+
+    result = dispatch_once()
+
+    assert result.delivered == 1
+    assert lookups == ["hooks.example"]
+    assert stats.hosts == [hooks_url.split("/")[2]]
+
+
+def test_host_with_any_internal_address_is_refused(receiver, resolve) -> None:
+    url, stats = receiver()
+    resolve("93.184.215.14", "127.0.0.1")
+    _endpoint, [delivery] = queue(url.replace("127.0.0.1", "hooks.example"), count=1)
+
+    result = dispatch_once()
+
+    delivery.refresh_from_db()
+    assert result.retried == 1
+    assert stats.requests == 0
+    assert "endereço interno (127.0.0.1)" in delivery.last_error
+
+
+def test_round_ends_inside_the_lease(receiver, settings, monkeypatch) -> None:
+    settings.WEBHOOK_ALLOW_PRIVATE_URLS = True
+    settings.WEBHOOK_TIMEOUT = 2
+    settings.WEBHOOK_LEASE_SECONDS = 4
+    monkeypatch.setattr(webhook_dispatcher, "LEASE_MARGIN", 0.5)
+    url, stats = receiver(delay=1.2)
+    _endpoint, deliveries = queue(url, count=3, batch_size=1, max_concurrency=1)
+
+    started = time.monotonic()
+    result = dispatch_once()
+
+    assert time.monotonic() - started < settings.WEBHOOK_LEASE_SECONDS
+    # The third request would start 2.4s in, with 1.1s of lease left for a 2s timeout.
+    assert (result.requests, result.delivered, result.deferred) == (2, 2, 1)
+    assert stats.requests == 2
+    rows = WebhookDelivery.objects.filter(pk__in=[d.pk for d in deliveries]).order_by("pk")
+    assert [(row.status, row.attempts) for row in rows] == [
+        (DeliveryStatus.DELIVERED, 1),
+        (DeliveryStatus.DELIVERED, 1),
+        (DeliveryStatus.PENDING, 0),
+    ]
+    assert all(row.locked_until is None for row in rows)
@@ -0,0 +1,138 @@
+"""Keyset-paginated activity timeline for the client detail page."""
+from __future__ import annotations
+
+import base64
+import binascii
+import heapq
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import islice
+
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+
+from crm.models import Client, Interaction, Lead
+
+TIMELINE_PAGE_SIZE = 25
+
+# Tie-breaker between sources when two events share the same timestamp.
+KIND_RANK = {"lead": 0, "interaction": 1}
+
+
+@dataclass(frozen=True)
+class TimelineEntry:
+    kind: str
+    occurred_at: datetime
+    pk: int
+    obj: Interaction | Lead
+
+    @property
+    def sort_key(self) -> tuple[datetime, int, int]:
+        return (self.occurred_at, KIND_RANK[self.kind], self.pk)
+
+
+@dataclass(frozen=True)
+class Cursor:
+    occurred_at: datetime
+    kind: str
+    pk: int
+
+    def encode(self) -> str:
+        raw = f"{self.occurred_at.isoformat()}|{self.kind}|{self.pk}".encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> Cursor:
+        """Parse a cursor produced by :meth:`encode`, raising ``ValueError`` if malformed."""
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+            stamp, kind, pk = raw.split("|")
+        except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+            raise ValueError("Cursor inválido.") from exc
+        occurred_at = parse_datetime(stamp)
+        if occurred_at is None or kind not in KIND_RANK or not pk.isdigit():
+            raise ValueError("Cursor inválido.")
+        return cls(occurred_at=occurred_at, kind=kind, pk=int(pk))
+
+
+def _count_subquery(model, **filters) -> Subquery:
+    return Subquery(
+        model.objects.filter(client=OuterRef("pk"), **filters)
+        .order_by()
+        .values("client")
+        .annotate(total=Count("pk"))
+        .values("total")[:1],
+        output_field=IntegerField(),
+    )
+
+
+def client_summary_annotations() -> dict[str, Coalesce]:
+    """Counts for the client detail page that are not kept on ``Client`` itself.
+
+    Interaction counts and pipeline values are denormalised columns (see
+    :mod:`crm.summaries`); these two are only needed on the detail page.
+    """
+    return {
+        "pending_follow_ups": Coalesce(
+            _count_subquery(Interaction, follow_up_date__isnull=False), 0
+        ),
+        "leads_total": Coalesce(_count_subquery(Lead), 0),
+    }
+
+
+def _after_cursor(field: str, kind: str, cursor: Cursor | None) -> Q:
+    """Keyset predicate selecting rows that sort strictly after ``cursor`` (descending)."""
+    if cursor is None:
+        return Q()
+    rank, cursor_rank = KIND_RANK[kind], KIND_RANK[cursor.kind]
+    if rank < cursor_rank:
+        return Q(**{f"{field}__lte": cursor.occurred_at})
+    if rank > cursor_rank:
+        return Q(**{f"{field}__lt": cursor.occurred_at})
+    return Q(**{f"{field}__lt": cursor.occurred_at}) | Q(
+        **{field: cursor.occurred_at, "pk__lt": cursor.pk}
+    )
+
+
+def _interaction_entries(client: Client, cursor: Cursor | None, limit: int):
+    qs = (
+        Interaction.objects.filter(client=client)
+        .filter(_after_cursor("occurred_at", "interaction", cursor))
+        .select_related("author")
+        .order_by("-occurred_at", "-pk")[:limit]
+    )
+    return (TimelineEntry("interaction", item.occurred_at, item.pk, item) for item in qs)
+
+
+def _lead_entries(client: Client, cursor: Cursor | None, limit: int):
+    qs = (
+        Lead.objects.filter(client=client)
+        .filter(_after_cursor("created_at", "lead", cursor))
+        .select_related("assigned_to")
+        .order_by("-created_at", "-pk")[:limit]
+    )
+    return (TimelineEntry("lead", item.created_at, item.pk, item) for item in qs)
+
+
+def client_timeline(
+    client: Client,
+    cursor: Cursor | None = None,
+    limit: int = TIMELINE_PAGE_SIZE,
+) -> tuple[list[TimelineEntry], Cursor | None]:
+    """Return one page of the merged timeline and the cursor for the next page.
+
+    Each source reads at most ``limit + 1`` rows from its ``(client_id, timestamp)``
+    index, so the cost of a page does not depend on the size of the account.
+    """
+    merged = heapq.merge(
+        _interaction_entries(client, cursor, limit + 1),
+        _lead_entries(client, cursor, limit + 1),
+        key=lambda entry: entry.sort_key,
+        reverse=True,
+    )
+    entries = list(islice(merged, limit + 1))
+    if len(entries) <= limit:
+        return entries, None
+    last = entries[limit - 1]
+    return entries[:limit], Cursor(occurred_at=last.occurred_at, kind=last.kind, pk=last.pk)
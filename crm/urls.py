@@ -14,6 +14,11 @@ urlpatterns = [
     path("clients/", views.ClientListView.as_view(), name="client-list"),
     path("clients/new/", views.ClientCreateView.as_view(), name="client-create"),
     path("clients/<int:pk>/", views.ClientDetailView.as_view(), name="client-detail"),
+    path(
+        "clients/<int:pk>/timeline/",
+        views.ClientTimelineView.as_view(),
+        name="client-timeline",
+    ),
     path("clients/<int:pk>/edit/", views.ClientUpdateView.as_view(), name="client-update"),
     path(
         "clients/<int:client_pk>/interactions/new/",
@@ -25,6 +30,12 @@ urlpatterns = [
         views.mark_interaction_completed,
         name="interaction-complete",
     ),
+    path(
+        "autocomplete/clients/",
+        views.ClientAutocompleteView.as_view(),
+        name="autocomplete-clients",
+    ),
+    path("autocomplete/users/", views.UserAutocompleteView.as_view(), name="autocomplete-users"),
     path("leads/", views.LeadListView.as_view(), name="lead-list"),
     path("leads/new/", views.LeadCreateView.as_view(), name="lead-create"),
     path("leads/<int:pk>/", views.LeadDetailView.as_view(), name="lead-detail"),
@@ -7,14 +7,22 @@ from django.contrib import messages
 from django.contrib.auth import login
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.models import User
-from django.db.models import Count, Q
-from django.shortcuts import redirect
+from django.db.models import F, Q
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.template.loader import render_to_string
 from django.urls import reverse_lazy
 from django.utils import timezone
 from django.views.generic import CreateView, DetailView, ListView, TemplateView, UpdateView, View
 
+from crm.assignment import assignee_for
+from crm.autocomplete import search_clients, search_users, visible_clients
+from crm.filters import ClientFilter
 from crm.forms import ClientForm, InteractionForm, LeadForm, ProfileForm, SignUpForm
+from crm.fragments import client_version, group_version, lead_version
 from crm.models import Client, Interaction, Lead, LeadStatus, Profile
+from crm.tasks import send_welcome_email
+from crm.timeline import Cursor, client_summary_annotations, client_timeline
 
 
 class RoleRequiredMixin(UserPassesTestMixin):
@@ -38,9 +46,22 @@ class ClientListView(LoginRequiredMixin, ListView):
     template_name = "crm/client_list.html"
     context_object_name = "clients"
     paginate_by = 15
+    orderings = {
+        # (name, owner) is unique and indexed, so it needs no further tie-breaker.
+        "name": ("Nome", ["name", "owner_id"]),
+        "recent": (
+            "Interação mais recente",
+            [F("last_interaction_at").desc(nulls_last=True), "pk"],
+        ),
+        "follow_up": ("Próximo follow-up", [F("next_follow_up_date").asc(nulls_last=True), "pk"]),
+        "pipeline": ("Pipeline aberto", ["-open_lead_value", "pk"]),
+        "won": ("Valor ganho", ["-won_value", "pk"]),
+        "activity": ("Mais interações", ["-interaction_count", "pk"]),
+    }
 
     def get_queryset(self):  # type: ignore[override]
-        qs = super().get_queryset().select_related("owner")
+        qs = ClientFilter(self.request.GET, queryset=super().get_queryset()).qs
+        qs = qs.select_related("owner")
         if not self.request.user.is_superuser:
             qs = qs.filter(owner=self.request.user)
         search = self.request.GET.get("q")
@@ -51,7 +72,18 @@ class ClientListView(LoginRequiredMixin, ListView):
                 | Q(email__icontains=search)
                 | Q(phone__icontains=search)
             )
-        return qs
+        _, ordering = self.orderings.get(self.request.GET.get("order", ""), self.orderings["name"])
+        return qs.order_by(*ordering)
+
+    def get_context_data(self, **kwargs):  # type: ignore[override]
+        context = super().get_context_data(**kwargs)
+        context["orderings"] = [(key, label) for key, (label, _) in self.orderings.items()]
+        for client in context["clients"]:
+            client.fragment_version = client_version(client)
+        context["clients_version"] = group_version(
+            members=(client.fragment_version for client in context["clients"])
+        )
+        return context
 
 
 class ClientDetailView(LoginRequiredMixin, DetailView):
@@ -60,11 +92,44 @@ class ClientDetailView(LoginRequiredMixin, DetailView):
     context_object_name = "client"
 
     def get_queryset(self):  # type: ignore[override]
-        qs = super().get_queryset().select_related("owner").prefetch_related("interactions", "leads")
+        qs = super().get_queryset().select_related("owner").annotate(**client_summary_annotations())
         if self.request.user.is_superuser:
             return qs
         return qs.filter(owner=self.request.user)
 
+    def get_context_data(self, **kwargs):  # type: ignore[override]
+        context = super().get_context_data(**kwargs)
+        entries, next_cursor = client_timeline(self.object)
+        context["timeline"] = entries
+        context["timeline_next"] = next_cursor.encode() if next_cursor else ""
+        return context
+
+
+class ClientTimelineView(LoginRequiredMixin, View):
+    """Serve further timeline pages for the infinite scroll on the client detail page."""
+
+    http_method_names = ["get"]
+
+    def get(self, request, *args, **kwargs):  # type: ignore[override]
+        qs = Client.objects.all()
+        if not request.user.is_superuser:
+            qs = qs.filter(owner=request.user)
+        client = get_object_or_404(qs, pk=kwargs.get("pk"))
+        cursor = None
+        token = request.GET.get("cursor")
+        if token:
+            try:
+                cursor = Cursor.decode(token)
+            except ValueError as exc:
+                return HttpResponseBadRequest(str(exc))
+        entries, next_cursor = client_timeline(client, cursor)
+        html = render_to_string(
+            "crm/client_timeline_items.html",
+            {"timeline": entries, "client": client},
+            request=request,
+        )
+        return JsonResponse({"html": html, "next": next_cursor.encode() if next_cursor else ""})
+
 
 class ClientCreateView(LoginRequiredMixin, CreateView):
     model = Client
@@ -93,6 +158,24 @@ class ClientUpdateView(LoginRequiredMixin, UpdateView):
         return super().form_valid(form)
 
 
+class ClientAutocompleteView(LoginRequiredMixin, View):
+    """``?q=`` typeahead over the clients the user may pick in lead/interaction forms."""
+
+    http_method_names = ["get"]
+
+    def get(self, request, *args, **kwargs):  # type: ignore[override]
+        return JsonResponse({"results": search_clients(request.user, request.GET.get("q", ""))})
+
+
+class UserAutocompleteView(LoginRequiredMixin, View):
+    """``?q=`` typeahead over the active users a lead can be assigned to."""
+
+    http_method_names = ["get"]
+
+    def get(self, request, *args, **kwargs):  # type: ignore[override]
+        return JsonResponse({"results": search_users(request.GET.get("q", ""))})
+
+
 class LeadListView(LoginRequiredMixin, ListView):
     model = Lead
     template_name = "crm/lead_list.html"
@@ -104,7 +187,7 @@ class LeadListView(LoginRequiredMixin, ListView):
             super()
             .get_queryset()
             .select_related("client", "assigned_to")
-            .annotate(interaction_count=Count("client__interactions"))
+            .filter(client__deleted_at__isnull=True)
         )
         status = self.request.GET.get("status")
         if status:
@@ -116,6 +199,11 @@ class LeadListView(LoginRequiredMixin, ListView):
     def get_context_data(self, **kwargs):  # type: ignore[override]
         context = super().get_context_data(**kwargs)
         context["statuses"] = LeadStatus.choices
+        for lead in context["leads"]:
+            lead.fragment_version = lead_version(lead)
+        context["leads_version"] = group_version(
+            members=(lead.fragment_version for lead in context["leads"])
+        )
         return context
 
 
@@ -125,11 +213,21 @@ class LeadDetailView(LoginRequiredMixin, DetailView):
     context_object_name = "lead"
 
     def get_queryset(self):  # type: ignore[override]
-        qs = super().get_queryset().select_related("client", "assigned_to")
+        qs = (
+            super()
+            .get_queryset()
+            .select_related("client", "assigned_to")
+            .filter(client__deleted_at__isnull=True)
+        )
         if self.request.user.is_superuser:
             return qs
         return qs.filter(Q(assigned_to=self.request.user) | Q(client__owner=self.request.user))
 
+    def get_context_data(self, **kwargs):  # type: ignore[override]
+        context = super().get_context_data(**kwargs)
+        context["statuses"] = LeadStatus.choices
+        return context
+
 
 class LeadCreateView(LoginRequiredMixin, CreateView):
     model = Lead
@@ -145,6 +243,9 @@ class LeadCreateView(LoginRequiredMixin, CreateView):
         return kwargs
 
     def form_valid(self, form):  # type: ignore[override]
+        lead = form.instance
+        if lead.assigned_to_id is None:
+            lead.assigned_to_id = assignee_for(lead.client, lead.status)
         messages.success(self.request, "Lead criado com sucesso.")
         return super().form_valid(form)
 
@@ -155,7 +256,7 @@ class LeadUpdateView(LoginRequiredMixin, UpdateView):
     template_name = "crm/lead_form.html"
 
     def get_queryset(self):  # type: ignore[override]
-        qs = super().get_queryset()
+        qs = super().get_queryset().filter(client__deleted_at__isnull=True)
         if self.request.user.is_superuser:
             return qs
         return qs.filter(Q(assigned_to=self.request.user) | Q(client__owner=self.request.user))
@@ -174,7 +275,11 @@ class LeadStageUpdateView(LoginRequiredMixin, View):
     http_method_names = ["post"]
 
     def post(self, request, *args, **kwargs):  # type: ignore[override]
-        lead = Lead.objects.filter(pk=kwargs.get("pk")).select_related("client").first()
+        lead = (
+            Lead.objects.filter(pk=kwargs.get("pk"), client__deleted_at__isnull=True)
+            .select_related("client")
+            .first()
+        )
         if not lead:
             messages.error(request, "Lead não encontrado.")
             return redirect("crm:lead-list")
@@ -196,11 +301,18 @@ class InteractionCreateView(LoginRequiredMixin, CreateView):
     form_class = InteractionForm
     template_name = "crm/interaction_form.html"
 
+    def get_client(self) -> Client | None:
+        """The client from the URL, if any; 404 when it is deleted or not visible."""
+        client_id = self.kwargs.get("client_pk")
+        if not client_id:
+            return None
+        return get_object_or_404(visible_clients(self.request.user), pk=client_id)
+
     def get_initial(self):  # type: ignore[override]
         initial = super().get_initial()
-        client_id = self.kwargs.get("client_pk")
-        if client_id:
-            initial["client"] = Client.objects.filter(pk=client_id).first()
+        client = self.get_client()
+        if client:
+            initial["client"] = client
         initial.setdefault("occurred_at", timezone.now())
         return initial
 
@@ -215,8 +327,7 @@ class InteractionCreateView(LoginRequiredMixin, CreateView):
 
     def get_context_data(self, **kwargs):  # type: ignore[override]
         context = super().get_context_data(**kwargs)
-        client_id = self.kwargs.get("client_pk")
-        context["client"] = Client.objects.filter(pk=client_id).first() if client_id else None
+        context["client"] = self.get_client()
         return context
 
     def get_form_kwargs(self):  # type: ignore[override]
@@ -250,6 +361,7 @@ class SignUpView(CreateView):
     def form_valid(self, form):  # type: ignore[override]
         response = super().form_valid(form)
         login(self.request, self.object)
+        send_welcome_email.enqueue(user_id=self.object.pk)
         messages.success(self.request, "Bem-vindo ao clientesCRM!")
         return response
 
@@ -257,21 +369,31 @@ class SignUpView(CreateView):
 class PipelineBoardView(LoginRequiredMixin, TemplateView):
     template_name = "crm/pipeline_board.html"
 
-    def get_context_data(self, **kwargs):  # type: ignore[override]
-        context = super().get_context_data(**kwargs)
-        queryset = Lead.objects.select_related("client", "assigned_to")
+    def get_queryset(self):
+        queryset = Lead.objects.select_related("client", "assigned_to").filter(
+            client__deleted_at__isnull=True
+        )
         if not self.request.user.is_superuser:
             queryset = queryset.filter(
                 Q(assigned_to=self.request.user) | Q(client__owner=self.request.user)
             )
+        return queryset
+
+    def get_context_data(self, **kwargs):  # type: ignore[override]
+        context = super().get_context_data(**kwargs)
+        queryset = self.get_queryset()
         board = {status: [] for status, _ in LeadStatus.choices}
         for lead in queryset:
+            lead.fragment_version = lead_version(lead)
             board.setdefault(lead.status, []).append(lead)
         columns = [
             {
                 "key": key,
                 "label": label,
                 "leads": board.get(key, []),
+                "version": group_version(
+                    key, label, members=(lead.fragment_version for lead in board.get(key, []))
+                ),
             }
             for key, label in LeadStatus.choices
         ]
@@ -0,0 +1,360 @@
+"""Deliver queued webhook events over a shared asyncio HTTP client.
+
+Each round claims due deliveries with ``SELECT … FOR UPDATE SKIP LOCKED`` and leases
+them for ``WEBHOOK_LEASE_SECONDS`` so several dispatchers can run side by side and
+a crashed one only delays its claim. Claimed deliveries are grouped per endpoint
+into batches of ``endpoint.batch_size`` events, posted concurrently through one
+``httpx.AsyncClient`` (at most ``WEBHOOK_MAX_CONNECTIONS`` sockets overall and
+``endpoint.max_concurrency`` requests per endpoint), and the outcomes are written
+back once the round's requests have finished. Database work stays outside the event
+loop, so the ORM is only used synchronously. A request only starts while it can
+still finish (``WEBHOOK_TIMEOUT``) well inside the round's lease and is cut off
+when the lease runs out, so the outcomes are recorded before another dispatcher can
+claim the same deliveries; batches that did not get to start are handed back
+without using up an attempt.
+
+The endpoint host may have been re-pointed since the URL was saved, so
+:class:`PublicAddressTransport` resolves it when connecting, checks the addresses
+with ``crm.webhooks.public_addresses`` and opens the socket to one of exactly those
+addresses (TLS still verifies the certificate for the host name). A DNS answer that
+changes between the check and the connection therefore cannot redirect a request;
+a refused host is retried like a failed request.
+
+A 2xx response delivers the whole batch. ``410 Gone`` deactivates the endpoint.
+Anything else, including timeouts, is retried with exponential backoff (or after
+the ``Retry-After`` the endpoint asked for) until ``WEBHOOK_MAX_ATTEMPTS``.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import timedelta
+from itertools import groupby
+from typing import Any
+
+import httpcore
+import httpx
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from crm.models import DeliveryStatus, WebhookDelivery, WebhookEndpoint
+from crm.renderers import dumps
+from crm.webhooks import SIGNATURE_HEADER, UnsafeURL, public_addresses, sign
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "clientesCRM-webhooks/1"
+# Time kept free at the end of a lease for writing the round's outcomes.
+LEASE_MARGIN = 5.0
+
+
+@dataclass(frozen=True)
+class Batch:
+    endpoint_id: int
+    url: str
+    secret: str
+    max_concurrency: int
+    deliveries: tuple[tuple[int, int], ...]  # (delivery pk, attempts so far)
+    body: bytes
+
+
+@dataclass(frozen=True)
+class BatchResult:
+    batch: Batch
+    status_code: int | None
+    error: str = ""
+    retry_after: float | None = None
+    sent: bool = True
+
+    @property
+    def delivered(self) -> bool:
+        return self.status_code is not None and 200 <= self.status_code < 300
+
+
+@dataclass
+class DispatchStats:
+    requests: int = 0
+    delivered: int = 0
+    retried: int = 0
+    failed: int = 0
+    deferred: int = 0
+    endpoints_disabled: set[int] = field(default_factory=set)
+
+    def add(self, other: DispatchStats) -> None:
+        self.requests += other.requests
+        self.delivered += other.delivered
+        self.retried += other.retried
+        self.failed += other.failed
+        self.deferred += other.deferred
+        self.endpoints_disabled |= other.endpoints_disabled
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "failed": self.failed,
+            "deferred": self.deferred,
+            "endpoints_disabled": sorted(self.endpoints_disabled),
+        }
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter, capped at ``WEBHOOK_RETRY_MAX_DELAY`` seconds."""
+    base = settings.WEBHOOK_RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0)
+    return min(base, settings.WEBHOOK_RETRY_MAX_DELAY) * random.uniform(0.8, 1.2)
+
+
+def _retry_after(response: httpx.Response) -> float | None:
+    value = response.headers.get("Retry-After", "")
+    return min(float(value), settings.WEBHOOK_RETRY_MAX_DELAY) if value.isdigit() else None
+
+
+def claim(limit: int) -> list[Batch]:
+    """Lease up to ``limit`` due deliveries and build their request batches."""
+    now = timezone.now()
+    with transaction.atomic():
+        due = list(
+            WebhookDelivery.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+                status=DeliveryStatus.PENDING,
+                next_attempt_at__lte=now,
+                endpoint__is_active=True,
+            )
+            .order_by("next_attempt_at", "pk")
+            .values_list("pk", flat=True)[:limit]
+        )
+        WebhookDelivery.objects.filter(pk__in=due).update(
+            locked_until=now + timedelta(seconds=settings.WEBHOOK_LEASE_SECONDS)
+        )
+    rows = (
+        WebhookDelivery.objects.filter(pk__in=due)
+        .select_related("endpoint", "event")
+        .order_by("endpoint_id", "event_id")
+    )
+    batches = []
+    for _endpoint_id, deliveries in groupby(rows, key=lambda row: row.endpoint_id):
+        deliveries = list(deliveries)
+        endpoint = deliveries[0].endpoint
+        size = max(endpoint.batch_size, 1)
+        for start in range(0, len(deliveries), size):
+            chunk = deliveries[start : start + size]
+            events = [
+                {
+                    "id": delivery.event_id,
+                    "type": delivery.event.event_type,
+                    "created_at": delivery.event.created_at,
+                    "data": delivery.event.payload,
+                }
+                for delivery in chunk
+            ]
+            batches.append(
+                Batch(
+                    endpoint_id=endpoint.pk,
+                    url=endpoint.url,
+                    secret=endpoint.secret,
+                    max_concurrency=endpoint.max_concurrency,
+                    deliveries=tuple((delivery.pk, delivery.attempts) for delivery in chunk),
+                    body=dumps({"events": events}),
+                )
+            )
+    return batches
+
+
+class PublicAddressBackend(httpcore.AsyncNetworkBackend):
+    """Opens TCP connections only to addresses that pass ``public_addresses``."""
+
+    def __init__(self) -> None:
+        self._backend = httpcore.AnyIOBackend()
+
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: float | None = None,
+        local_address: str | None = None,
+        socket_options=None,
+    ) -> httpcore.AsyncNetworkStream:
+        addresses = await asyncio.to_thread(public_addresses, host, port)
+        error: Exception = httpcore.ConnectError(f"{host} has no address")
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(
+                    address, port, timeout, local_address, socket_options
+                )
+            except httpcore.ConnectError as exc:
+                error = exc
+        raise error
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+class PublicAddressTransport(httpx.AsyncHTTPTransport):
+    """``httpx`` transport whose connections go through :class:`PublicAddressBackend`."""
+
+    def __init__(self, limits: httpx.Limits) -> None:
+        # Environment proxies would resolve the endpoint host themselves, unchecked.
+        super().__init__(limits=limits, trust_env=False)
+        # httpx takes no network backend, so replace the pool it built with one that
+        # has the same settings and ours.
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(trust_env=False),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            network_backend=PublicAddressBackend(),
+        )
+
+
+async def _post(
+    client: httpx.AsyncClient, semaphore: asyncio.Semaphore, batch: Batch, deadline: float
+) -> BatchResult:
+    headers = {
+        "Content-Type": "application/json",
+        "User-Agent": USER_AGENT,
+        SIGNATURE_HEADER: sign(batch.secret, batch.body),
+    }
+    async with semaphore:
+        loop = asyncio.get_running_loop()
+        if deadline - loop.time() < settings.WEBHOOK_TIMEOUT:
+            return BatchResult(batch, None, sent=False)
+        try:
+            async with asyncio.timeout_at(deadline):
+                response = await client.post(batch.url, content=batch.body, headers=headers)
+        except UnsafeURL as exc:
+            return BatchResult(batch, None, error=f"URL recusada: {exc}")
+        except TimeoutError:
+            return BatchResult(batch, None, error="Tempo do lease esgotado.")
+        except httpx.HTTPError as exc:
+            return BatchResult(batch, None, error=f"{type(exc).__name__}: {exc}")
+    return BatchResult(
+        batch,
+        response.status_code,
+        error="" if response.is_success else response.text[:500],
+        retry_after=_retry_after(response),
+    )
+
+
+async def send(batches: list[Batch], deadline: float) -> list[BatchResult]:
+    """Post every batch, with at most ``max_concurrency`` requests per endpoint.
+
+    ``deadline`` is the ``time.monotonic()`` by which every request must be over.
+    """
+    semaphores = {
+        batch.endpoint_id: asyncio.Semaphore(max(batch.max_concurrency, 1)) for batch in batches
+    }
+    limits = httpx.Limits(
+        max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+    )
+    async with httpx.AsyncClient(
+        transport=PublicAddressTransport(limits),
+        timeout=settings.WEBHOOK_TIMEOUT,
+        follow_redirects=False,
+    ) as client:
+        return await asyncio.gather(
+            *(_post(client, semaphores[batch.endpoint_id], batch, deadline) for batch in batches)
+        )
+
+
+def record(results: list[BatchResult]) -> DispatchStats:
+    """Persist the outcome of each batch on its deliveries."""
+    stats = DispatchStats(requests=sum(result.sent for result in results))
+    now = timezone.now()
+    retries: dict[tuple[int, int | None, str, float], list[int]] = defaultdict(list)
+    deferred: list[int] = []
+    for result in results:
+        ids = [pk for pk, _attempts in result.batch.deliveries]
+        if not result.sent:
+            deferred += ids
+            continue
+        if result.delivered:
+            WebhookDelivery.objects.filter(pk__in=ids).update(
+                status=DeliveryStatus.DELIVERED,
+                attempts=F("attempts") + 1,
+                response_status=result.status_code,
+                last_error="",
+                locked_until=None,
+                delivered_at=now,
+            )
+            stats.delivered += len(ids)
+            continue
+        if result.status_code == 410:
+            WebhookEndpoint.objects.filter(pk=result.batch.endpoint_id).update(
+                is_active=False, updated_at=now
+            )
+            stats.endpoints_disabled.add(result.batch.endpoint_id)
+        for pk, attempts in result.batch.deliveries:
+            key = (attempts + 1, result.status_code, result.error, result.retry_after or 0)
+            retries[key].append(pk)
+    # One UPDATE per distinct outcome rather than one per delivery.
+    for (attempts, status_code, error, retry_after), ids in retries.items():
+        changes: dict[str, Any] = {
+            "attempts": attempts,
+            "response_status": status_code,
+            "last_error": error,
+            "locked_until": None,
+        }
+        if attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+            changes["status"] = DeliveryStatus.FAILED
+            stats.failed += len(ids)
+        else:
+            delay = max(retry_delay(attempts), retry_after)
+            changes["next_attempt_at"] = now + timedelta(seconds=delay)
+            stats.retried += len(ids)
+        WebhookDelivery.objects.filter(pk__in=ids).update(**changes)
+    if deferred:
+        WebhookDelivery.objects.filter(pk__in=deferred).update(locked_until=None)
+        stats.deferred = len(deferred)
+    return stats
+
+
+def dispatch_once(limit: int | None = None) -> DispatchStats:
+    """Claim, send and record one round of deliveries."""
+    if settings.WEBHOOK_TIMEOUT + LEASE_MARGIN >= settings.WEBHOOK_LEASE_SECONDS:
+        raise ImproperlyConfigured(
+            f"WEBHOOK_LEASE_SECONDS must exceed WEBHOOK_TIMEOUT by more than {LEASE_MARGIN}s."
+        )
+    # Taken before claiming, so it can only end before the lease does.
+    deadline = time.monotonic() + settings.WEBHOOK_LEASE_SECONDS - LEASE_MARGIN
+    batches = claim(limit or settings.WEBHOOK_CLAIM_LIMIT)
+    if not batches:
+        return DispatchStats()
+    results = asyncio.run(send(batches, deadline))
+    return record(results)
+
+
+class Dispatcher:
+    """Runs delivery rounds until stopped (or, with ``burst``, until nothing is due)."""
+
+    def __init__(self, *, poll_interval: float = 1.0, limit: int | None = None) -> None:
+        self.poll_interval = poll_interval
+        self.limit = limit
+        self.stats = DispatchStats()
+        self._stopping = threading.Event()
+
+    def stop(self, *_: object) -> None:
+        self._stopping.set()
+
+    def run(self, *, burst: bool = False) -> DispatchStats:
+        while not self._stopping.is_set():
+            close_old_connections()
+            round_stats = dispatch_once(self.limit)
+            self.stats.add(round_stats)
+            if round_stats.requests or round_stats.deferred:
+                logger.info("Webhook round: %s", round_stats.summary())
+                continue
+            if burst:
+                break
+            self._stopping.wait(self.poll_interval)
+        return self.stats
@@ -0,0 +1,211 @@
+"""Webhook outbox: which endpoints an event goes to, and how requests are signed.
+
+Events are captured from ``crm.signals`` (and from bulk ingestion) in the same
+transaction as the change: a :class:`~crm.models.WebhookEvent` row plus one pending
+:class:`~crm.models.WebhookDelivery` per subscribed endpoint. If the change rolls
+back, so does the event, and a committed change always has its deliveries queued.
+Nothing is written when no endpoint subscribes. Event keys are unique, so recording
+the same event twice queues it once. ``crm.webhook_dispatcher`` sends the deliveries.
+
+Every request carries ``X-CRM-Signature: t=<unix time>,v1=<hex>`` where ``v1`` is
+the HMAC-SHA256 of ``"<t>." + body`` under the endpoint's secret; receivers should
+recompute it and reject stale timestamps.
+
+Endpoint URLs are checked by :func:`check_url` when saved, and the dispatcher
+connects only to the addresses :func:`public_addresses` returns for the host at
+connection time: only ``http``/``https`` URLs whose host resolves to public
+addresses are called, so a subscription cannot make the server reach loopback,
+private, link-local (cloud metadata) or other internal addresses.
+``WEBHOOK_ALLOW_PRIVATE_URLS`` lifts the address check for local testing.
+"""
+from __future__ import annotations
+
+import hashlib
+import hmac
+import ipaddress
+import socket
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from typing import Any
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from crm.models import (
+    Interaction,
+    Lead,
+    WebhookDelivery,
+    WebhookEndpoint,
+    WebhookEvent,
+    WebhookEventType,
+)
+
+User = get_user_model()
+
+SIGNATURE_HEADER = "X-CRM-Signature"
+URL_SCHEMES = ("http", "https")
+
+
+class UnsafeURL(ValueError):
+    """The endpoint URL may not be called from the server."""
+
+
+@dataclass(frozen=True)
+class OutboundEvent:
+    event_type: str
+    key: str
+    data: dict[str, Any]
+    # Users whose records the event concerns (client owner, assignee or author).
+    audience: frozenset[int] = field(default_factory=frozenset)
+
+
+def sign(secret: str, body: bytes, timestamp: int | None = None) -> str:
+    """Value of the signature header for ``body``."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256)
+    return f"t={timestamp},v1={digest.hexdigest()}"
+
+
+def public_addresses(host: str, port: int) -> list[str]:
+    """Resolve ``host``; raise :class:`UnsafeURL` if any of its addresses is internal."""
+    try:
+        resolved = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError) as exc:
+        raise UnsafeURL(f"Não foi possível resolver {host}.") from exc
+    addresses = []
+    for *_family_type_proto, _canonname, sockaddr in resolved:
+        address = ipaddress.ip_address(str(sockaddr[0]).split("%")[0])
+        if not settings.WEBHOOK_ALLOW_PRIVATE_URLS and (
+            not address.is_global or address.is_multicast
+        ):
+            raise UnsafeURL(f"{host} aponta para um endereço interno ({address}).")
+        addresses.append(str(sockaddr[0]))
+    return list(dict.fromkeys(addresses))
+
+
+def check_url(url: str) -> None:
+    """Raise :class:`UnsafeURL` unless ``url`` is http(s) on a host with only public addresses."""
+    parts = urlsplit(url)
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError as exc:
+        raise UnsafeURL("Porta inválida.") from exc
+    if parts.scheme not in URL_SCHEMES or not parts.hostname:
+        raise UnsafeURL("A URL deve usar http ou https.")
+    if settings.WEBHOOK_ALLOW_PRIVATE_URLS:
+        return
+    public_addresses(parts.hostname, port)
+
+
+def enabled() -> bool:
+    """Whether any endpoint is active; bulk writers skip building events otherwise."""
+    return WebhookEndpoint.objects.filter(is_active=True).exists()
+
+
+def _subscribers(event_types: set[str]) -> list[tuple[int, set[int] | None, list[str] | None]]:
+    """Active endpoints as ``(pk, audience, event types)``; ``None`` audience means all."""
+    endpoints = list(
+        WebhookEndpoint.objects.filter(is_active=True).values(
+            "pk", "user_id", "user__is_superuser", "group_id", "event_types"
+        )
+    )
+    endpoints = [
+        endpoint
+        for endpoint in endpoints
+        if not endpoint["event_types"] or event_types & set(endpoint["event_types"])
+    ]
+    group_ids = {endpoint["group_id"] for endpoint in endpoints if endpoint["group_id"]}
+    members: dict[int, set[int]] = {}
+    if group_ids:
+        for user_id, group_id in User.groups.through.objects.filter(
+            group_id__in=group_ids
+        ).values_list("user_id", "group_id"):
+            members.setdefault(group_id, set()).add(user_id)
+    subscribers = []
+    for endpoint in endpoints:
+        if endpoint["group_id"]:
+            audience = {endpoint["user_id"], *members.get(endpoint["group_id"], ())}
+        elif endpoint["user__is_superuser"]:
+            audience = None
+        else:
+            audience = {endpoint["user_id"]}
+        subscribers.append((endpoint["pk"], audience, endpoint["event_types"] or None))
+    return subscribers
+
+
+def record_events(events: Iterable[OutboundEvent]) -> int:
+    """Write outbox rows for ``events``; returns the number of deliveries queued.
+
+    Call inside the transaction that makes the change.
+    """
+    events = list(events)
+    if not events:
+        return 0
+    subscribers = _subscribers({event.event_type for event in events})
+    routes = {
+        event.key: [
+            pk
+            for pk, audience, types in subscribers
+            if (types is None or event.event_type in types)
+            and (audience is None or audience & event.audience)
+        ]
+        for event in events
+    }
+    events = [event for event in events if routes[event.key]]
+    if not events:
+        return 0
+    WebhookEvent.objects.bulk_create(
+        [
+            WebhookEvent(event_type=event.event_type, key=event.key, payload=event.data)
+            for event in events
+        ],
+        ignore_conflicts=True,
+    )
+    event_ids = dict(WebhookEvent.objects.filter(key__in=list(routes)).values_list("key", "pk"))
+    deliveries = [
+        WebhookDelivery(endpoint_id=endpoint_id, event_id=event_ids[event.key])
+        for event in events
+        for endpoint_id in routes[event.key]
+    ]
+    WebhookDelivery.objects.bulk_create(deliveries, ignore_conflicts=True)
+    return len(deliveries)
+
+
+def lead_stage_changed(
+    lead: Lead, previous_status: str | None, owner_id: int | None
+) -> OutboundEvent:
+    return OutboundEvent(
+        event_type=WebhookEventType.LEAD_STAGE_CHANGED,
+        key=f"lead:{lead.pk}:{lead.updated_at.isoformat()}",
+        data={
+            "lead_id": lead.pk,
+            "client_id": lead.client_id,
+            "previous_status": previous_status,
+            "status": lead.status,
+            "value": str(lead.value),
+            "assigned_to_id": lead.assigned_to_id,
+            "changed_at": lead.updated_at.isoformat(),
+        },
+        audience=frozenset(filter(None, (owner_id, lead.assigned_to_id))),
+    )
+
+
+def interaction_logged(interaction: Interaction, owner_id: int | None) -> OutboundEvent:
+    return OutboundEvent(
+        event_type=WebhookEventType.INTERACTION_LOGGED,
+        key=f"interaction:{interaction.pk}",
+        data={
+            "interaction_id": interaction.pk,
+            "client_id": interaction.client_id,
+            "interaction_type": interaction.interaction_type,
+            "subject": interaction.subject,
+            "occurred_at": interaction.occurred_at.isoformat(),
+            "follow_up_date": (
+                interaction.follow_up_date.isoformat() if interaction.follow_up_date else None
+            ),
+            "author_id": interaction.author_id,
+        },
+        audience=frozenset(filter(None, (owner_id, interaction.author_id))),
+    )
@@ -3,10 +3,11 @@ from __future__ import annotations
 
 from django.urls import path
 
-from dashboard.views import DashboardView
+from dashboard.views import DashboardView, ForecastView
 
 app_name = "dashboard"
 
 urlpatterns = [
     path("", DashboardView.as_view(), name="index"),
+    path("forecast/", ForecastView.as_view(), name="forecast"),
 ]
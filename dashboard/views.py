@@ -1,14 +1,21 @@
 """Dashboard views for analytics."""
 from __future__ import annotations
 
+from datetime import date
 from decimal import Decimal
+from typing import Any
 
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db.models import Count, Q, Sum
 from django.utils import timezone
 from django.views.generic import TemplateView
 
 from crm.models import Client, Interaction, Lead, LeadStatus
+from crm.summaries import OPEN_STATUSES
+
+User = get_user_model()
 
 
 class DashboardView(LoginRequiredMixin, TemplateView):
@@ -19,38 +26,63 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         user = self.request.user
 
         clients_qs = Client.objects.all()
-        leads_qs = Lead.objects.all()
-        interactions_qs = Interaction.objects.all()
+        leads_qs = Lead.objects.filter(client__deleted_at__isnull=True)
+        interactions_qs = Interaction.objects.filter(client__deleted_at__isnull=True)
 
         if not user.is_superuser:
             clients_qs = clients_qs.filter(owner=user)
             leads_qs = leads_qs.filter(Q(assigned_to=user) | Q(client__owner=user))
             interactions_qs = interactions_qs.filter(Q(author=user) | Q(client__owner=user))
 
-        pipeline = leads_qs.values("status").annotate(total=Count("id"), amount=Sum("value"))
-        status_map = {status: 0 for status, _ in LeadStatus.choices}
-        value_map: dict[str, Decimal | float] = {status: 0 for status, _ in LeadStatus.choices}
-        for row in pipeline:
-            status_map[row["status"]] = row["total"]
-            value_map[row["status"]] = row["amount"] or Decimal("0")
-
-        won_leads = leads_qs.filter(status=LeadStatus.WON)
-        total_leads = leads_qs.count() or 1
-        conversion_rate = (won_leads.count() / total_leads) * 100
-
-        sales_by_user = (
-            leads_qs.filter(status=LeadStatus.WON)
-            .values("assigned_to__username")
-            .annotate(total=Sum("value"))
-            .order_by("assigned_to__username")
-        )
+        if settings.LEAD_SNAPSHOT_ENABLED:
+            # Imported lazily: NumPy adds noticeably to boot time.
+            from crm.snapshot import lead_snapshot
+
+            pipeline = lead_snapshot.aggregates(user)
+            status_map: dict[str, int] = pipeline.counts
+            value_map: dict[str, Decimal | float] = dict(pipeline.values)
+            leads_total = pipeline.total
+            won_total = status_map[LeadStatus.WON]
+            overdue_total = pipeline.overdue
+            names = dict(
+                User.objects.filter(pk__in=[pk for pk in pipeline.won_by_user if pk])
+                .values_list("pk", "username")
+            )
+            # The order PostgreSQL gives the SQL path: by username, unassigned last.
+            sales_by_user = [
+                {"assigned_to__username": names.get(pk), "total": total}
+                for pk, total in sorted(
+                    pipeline.won_by_user.items(),
+                    key=lambda item: (item[0] is None, names.get(item[0], "")),
+                )
+            ]
+        else:
+            rows = leads_qs.values("status").annotate(total=Count("id"), amount=Sum("value"))
+            status_map = {status: 0 for status, _ in LeadStatus.choices}
+            value_map = {status: 0 for status, _ in LeadStatus.choices}
+            for row in rows:
+                status_map[row["status"]] = row["total"]
+                value_map[row["status"]] = row["amount"] or Decimal("0")
+            leads_total = leads_qs.count()
+            won_total = status_map[LeadStatus.WON]
+            overdue_total = leads_qs.filter(
+                status__in=OPEN_STATUSES, expected_close_date__lt=timezone.localdate()
+            ).count()
+            sales_by_user = (
+                leads_qs.filter(status=LeadStatus.WON)
+                .values("assigned_to__username")
+                .annotate(total=Sum("value"))
+                .order_by("assigned_to__username")
+            )
+        conversion_rate = (won_total / (leads_total or 1)) * 100
 
         recent_interactions = interactions_qs.select_related("client", "author")[:10]
 
         context.update(
             {
                 "clients_total": clients_qs.count(),
-                "leads_total": leads_qs.count(),
+                "leads_total": leads_total,
+                "overdue_total": overdue_total,
                 "interactions_total": interactions_qs.count(),
                 "conversion_rate": round(conversion_rate, 2),
                 "pipeline_labels": [label for _, label in LeadStatus.choices],
@@ -63,3 +95,57 @@ class DashboardView(LoginRequiredMixin, TemplateView):
             }
         )
         return context
+
+
+class ForecastView(LoginRequiredMixin, TemplateView):
+    """Monthly P10/P50/P90 revenue forecast of the open pipeline (see ``crm.forecast``)."""
+
+    template_name = "dashboard/forecast.html"
+
+    def get_context_data(self, **kwargs):  # type: ignore[override]
+        # Imported lazily: NumPy adds noticeably to boot time.
+        from crm.forecast import get_forecast, visible_forecast
+
+        context = super().get_context_data(**kwargs)
+        forecast = get_forecast()
+        if forecast is None:
+            # The first run is still queued in the worker.
+            context.update({"forecast": None, "sections": [], "stage_probabilities": []})
+            return context
+        forecast = visible_forecast(forecast, self.request.user)
+        months = [date(*map(int, label.split("-")), 1) for label in forecast["months"]]
+        sections = []
+        if forecast["total"]:
+            sections.append(self._section("Total", forecast["total"], months))
+        for team in forecast["teams"].values():
+            sections.append(self._section(f"Equipe {team['name']}", team, months))
+        for rep in sorted(forecast["reps"].values(), key=lambda row: row["label"]):
+            sections.append(self._section(rep["label"], rep, months))
+        context.update(
+            {
+                "forecast": forecast,
+                "sections": sections,
+                "stage_probabilities": [
+                    (label, forecast["stage_probabilities"][status])
+                    for status, label in LeadStatus.choices
+                    if status in forecast["stage_probabilities"]
+                ],
+            }
+        )
+        return context
+
+    @staticmethod
+    def _section(name: str, row: dict[str, Any], months: list[date]) -> dict[str, Any]:
+        return {
+            "name": name,
+            "months": [
+                {
+                    "month": month,
+                    "p10": row["p10"][index],
+                    "p50": row["p50"][index],
+                    "p90": row["p90"][index],
+                    "expected": row["expected"][index],
+                }
+                for index, month in enumerate(months)
+            ],
+        }
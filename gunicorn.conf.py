@@ -0,0 +1,55 @@
+"""Production gunicorn profile for clientesCRM.
+
+The application is imported once in the master (``preload_app``) and shared
+copy-on-write by the workers, so scaling out a replica only pays Django's
+start-up cost once. Every value can be overridden with ``GUNICORN_*`` env vars.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = _env_int("GUNICORN_WORKERS", min(multiprocessing.cpu_count() * 2 + 1, 9))
+threads = _env_int("GUNICORN_THREADS", 4)
+worker_class = "gthread" if threads > 1 else "sync"
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+timeout = _env_int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+keepalive = _env_int("GUNICORN_KEEPALIVE", 5)
+
+# Recycle workers periodically to bound memory growth; jitter avoids restarting all at once.
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 2000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", 200)
+
+# Heartbeat files on tmpfs instead of the container's overlay filesystem.
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+accesslog = os.environ.get("GUNICORN_ACCESSLOG", "-")
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOGLEVEL", "info")
+
+
+def when_ready(server) -> None:
+    """Import the URLconf (and thus every view module) before forking workers."""
+    if not server.cfg.preload_app:
+        # Django is only set up in the workers; each loads its own URLconf.
+        return
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+
+
+def post_fork(server, worker) -> None:
+    """Never share database sockets opened in the master with the workers."""
+    if not server.cfg.preload_app:
+        return
+    from django.db import connections
+
+    connections.close_all()
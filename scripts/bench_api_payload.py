@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""Measure serialization CPU time and wire size of a large lead listing.
+
+Runs against the configured database, which must be populated with
+``manage.py seed_crm``. The listing is serialized once with DRF's stock fields
+and ``JSONRenderer`` (the previous configuration) and once with the native
+fields and ``FastJSONRenderer``; each body is then compressed with every
+supported encoding.
+
+Usage::
+
+    python scripts/bench_api_payload.py --runs 5
+    python scripts/bench_api_payload.py --query "status=won" --json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from rest_framework import serializers  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from rest_framework.test import APIRequestFactory, force_authenticate  # noqa: E402
+
+from crm.api import LeadViewSet  # noqa: E402
+from crm.compression import available_encodings, compress  # noqa: E402
+from crm.management.commands.seed_crm import ADMIN_USERNAME  # noqa: E402
+from crm.renderers import FastJSONRenderer  # noqa: E402
+from crm.serializers import LeadSerializer, ModelSerializer  # noqa: E402
+
+
+def cpu_ms(func, runs: int) -> tuple[float, object]:
+    samples, result = [], None
+    for _ in range(runs):
+        started = time.process_time()
+        result = func()
+        samples.append((time.process_time() - started) * 1000)
+    return round(statistics.median(samples), 1), result
+
+
+def leads_queryset(query: str):
+    request = APIRequestFactory().get(f"/api/leads/?{query}")
+    force_authenticate(request, user=get_user_model().objects.get(username=ADMIN_USERNAME))
+    view = LeadViewSet(action_map={"get": "list"}, format_kwarg=None)
+    view.request = view.initialize_request(request)
+    return list(view.filter_queryset(view.get_queryset()))
+
+
+def run(runs: int, query: str) -> dict[str, object]:
+    leads = leads_queryset(query)
+    # Field mapping before this change: DRF formats dates/datetimes per field.
+    stock_mapping = serializers.ModelSerializer.serializer_field_mapping
+    variants = {
+        "drf": (stock_mapping, JSONRenderer()),
+        "fast": (ModelSerializer.serializer_field_mapping, FastJSONRenderer()),
+    }
+    report: dict[str, object] = {"leads": len(leads), "runs": runs, "variants": {}}
+    for name, (mapping, renderer) in variants.items():
+        ModelSerializer.serializer_field_mapping = mapping
+        try:
+            serialize_ms, data = cpu_ms(lambda: LeadSerializer(leads, many=True).data, runs)
+        finally:
+            ModelSerializer.serializer_field_mapping = variants["fast"][0]
+        render_ms, body = cpu_ms(lambda: renderer.render(data), runs)
+        encodings = {"identity": {"bytes": len(body), "cpu_ms": 0.0}}
+        for encoding in available_encodings():
+            encoding_ms, compressed = cpu_ms(lambda: compress(body, encoding), runs)
+            encodings[encoding] = {"bytes": len(compressed), "cpu_ms": encoding_ms}
+        report["variants"][name] = {
+            "serialize_cpu_ms": serialize_ms,
+            "render_cpu_ms": render_ms,
+            "encodings": encodings,
+        }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--query", default="", help="Filtros da listagem, ex.: status=won")
+    parser.add_argument("--json", action="store_true", help="Imprime o relatório em JSON.")
+    args = parser.parse_args()
+    report = run(args.runs, args.query)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{report['leads']} leads, mediana de {report['runs']} execuções (tempo de CPU)")
+    for name, variant in report["variants"].items():
+        print(
+            f"\n[{name}] serializar {variant['serialize_cpu_ms']} ms, "
+            f"renderizar {variant['render_cpu_ms']} ms"
+        )
+        for encoding, stats in variant["encodings"].items():
+            print(f"  {encoding:<9} {stats['bytes']:>12,} bytes  {stats['cpu_ms']:>8} ms")
+
+
+if __name__ == "__main__":
+    main()
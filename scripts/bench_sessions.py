@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""Count the database round-trips that sessions and flash messages cost per page view.
+
+Runs against the configured database, which must be populated with
+``manage.py seed_crm``. Each configuration runs in its own process, since
+the session engine is bound when the middleware loads:
+
+* ``db-stock``: Django's database sessions and the default message storage
+  (the previous configuration);
+* ``db``, ``cached_db``, ``signed_cookies``: ``crm.sessions`` on top of that
+  backend, with cookie-only messages.
+
+A seeded rep opens the dashboard, opens the lead list, and moves a lead to
+another stage. The stage change posts, gets a flash message and follows the
+redirect. Queries are counted per step, both in total and those touching
+``django_session``. Everything runs in a transaction that is rolled back at
+the end. ``cached_db`` uses the process-local cache here; in production it
+needs a shared ``CACHE_URL``.
+
+Usage::
+
+    python scripts/bench_sessions.py --rounds 20
+    python scripts/bench_sessions.py --json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+VARIANTS = {
+    "db-stock": "db",
+    "db": "db",
+    "cached_db": "cached_db",
+    "signed_cookies": "signed_cookies",
+}
+STEPS = ("dashboard", "lead_list", "stage_post", "stage_redirect")
+
+
+def measure(variant: str, rounds: int) -> dict[str, dict[str, float]]:
+    """Run the page views in this process and return mean queries per step."""
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+    os.environ.setdefault("DJANGO_ALLOWED_HOSTS", "testserver,localhost")
+    import django
+
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection, transaction
+    from django.test import Client, override_settings
+    from django.test.utils import CaptureQueriesContext
+
+    from crm.management.commands.seed_crm import USER_PREFIX
+    from crm.models import Lead, LeadStatus
+
+    overrides = {"ALLOWED_HOSTS": ["testserver"], "SECURE_SSL_REDIRECT": False}
+    if variant == "db-stock":
+        overrides.update(
+            SESSION_ENGINE=settings.SESSION_BASE_ENGINE,
+            MESSAGE_STORAGE="django.contrib.messages.storage.fallback.FallbackStorage",
+        )
+    totals = {step: {"queries": 0, "session_queries": 0} for step in STEPS}
+    with override_settings(**overrides), transaction.atomic():
+        lead = (
+            Lead.objects.filter(client__owner__username=f"{USER_PREFIX}-001")
+            .select_related("client__owner")
+            .first()
+        )
+        if lead is None:
+            raise SystemExit("Banco sem dados: rode manage.py seed_crm antes.")
+        client = Client()
+        client.force_login(lead.client.owner)
+        client.get("/")  # warm-up: first session read, template loading
+
+        def run(step: str, method: str, path: str, data=None) -> str:
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(client, method)(path, data or {})
+            totals[step]["queries"] += len(queries)
+            totals[step]["session_queries"] += sum(
+                "django_session" in query["sql"] for query in queries
+            )
+            return response.get("Location", "")
+
+        statuses = [LeadStatus.CONTACT, LeadStatus.PROPOSAL]
+        for index in range(rounds):
+            run("dashboard", "get", "/")
+            run("lead_list", "get", "/crm/leads/")
+            stage = f"/crm/leads/{lead.pk}/stage/"
+            location = run("stage_post", "post", stage, {"status": statuses[index % 2]})
+            run("stage_redirect", "get", location)
+        transaction.set_rollback(True)
+    return {
+        step: {key: round(value / rounds, 2) for key, value in counts.items()}
+        for step, counts in totals.items()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="Imprime o relatório em JSON.")
+    parser.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.variant:
+        print(json.dumps(measure(args.variant, args.rounds)))
+        return
+
+    report: dict[str, object] = {"rounds": args.rounds, "variants": {}}
+    for variant, backend in VARIANTS.items():
+        output = subprocess.run(
+            [sys.executable, __file__, "--variant", variant, "--rounds", str(args.rounds)],
+            env={**os.environ, "SESSION_BACKEND": backend},
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        report["variants"][variant] = json.loads(output.splitlines()[-1])
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"Consultas por requisição (média de {args.rounds} rodadas): total / django_session")
+    print(f"{'':<16}" + "".join(f"{step:>18}" for step in STEPS))
+    for variant, steps in report["variants"].items():
+        cells = "".join(
+            f"{steps[step]['queries']:>11} / {steps[step]['session_queries']:<4}" for step in STEPS
+        )
+        print(f"{variant:<16}{cells}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""Measure clientesCRM cold-start time and the slowest imports.
+
+Each run starts a fresh interpreter that builds the WSGI application and
+resolves the URLconf, i.e. the work a new gunicorn replica does before it can
+serve its first request.
+
+Usage::
+
+    python scripts/bench_startup.py --runs 10
+    python scripts/bench_startup.py --importtime --top 25
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+BOOT_SNIPPET = """
+import os
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+from core.wsgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+"""
+
+
+def boot_once(extra_args: list[str]) -> subprocess.CompletedProcess[str]:
+    return subprocess.run(
+        [sys.executable, *extra_args, "-c", BOOT_SNIPPET],
+        cwd=BASE_DIR,
+        env={**os.environ, "PYTHONPATH": str(BASE_DIR)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def bench(runs: int) -> dict[str, float]:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        boot_once([])
+        samples.append(time.perf_counter() - started)
+    return {
+        "runs": runs,
+        "min_ms": round(min(samples) * 1000, 1),
+        "median_ms": round(statistics.median(samples) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1),
+    }
+
+
+def import_profile(top: int) -> list[dict[str, object]]:
+    """Parse ``python -X importtime`` output into the ``top`` slowest imports (cumulative)."""
+    stderr = boot_once(["-X", "importtime"]).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line.partition(":")[2].split("|"))
+        rows.append(
+            {
+                "module": name,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+            }
+        )
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", action="store_true", help="Mostra os imports mais lentos.")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    report: dict[str, object] = {"boot": bench(args.runs)}
+    if args.importtime:
+        report["slowest_imports"] = import_profile(args.top)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,11 @@ set -e
 
 scripts/wait-for-postgresql.sh
 
-python manage.py collectstatic --noinput
-
-echo "Aplicando migrações..."
-python manage.py migrate --noinput || true
+# Static files are collected at image build time (see Dockerfile).
+if [ "${RUN_MIGRATIONS:-1}" = "1" ]; then
+    echo "Aplicando migrações..."
+    python manage.py migrate_with_lock
+fi
 
 echo "Iniciando servidor..."
 exec "$@"
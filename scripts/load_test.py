@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+"""Load-test a running clientesCRM with simulated reps and report latency per endpoint.
+
+Each virtual user logs in as one of the reps created by ``manage.py seed_crm`` and
+then loops until the run ends: it opens the dashboard, browses ``/crm/leads/``,
+moves leads between stages, logs interactions and pages through the API change
+feed, pausing for an exponentially distributed think time between actions. Each
+user has its own ``httpx.AsyncClient`` (and cookies) over one shared connection pool.
+
+The report gives throughput, p50/p95/p99 latency and the error rate per endpoint
+and overall. ``--json`` writes it (plus the commit and options used) to a file,
+and ``--baseline`` compares the run with such a file, so runs on two commits
+can be set side by side. The tool talks HTTP only and does not need Django.
+
+Usage::
+
+    python manage.py seed_crm
+    gunicorn core.wsgi -c gunicorn.conf.py
+    python scripts/load_test.py --users 50 --duration 60 --json load-main.json
+    python scripts/load_test.py --users 50 --duration 60 --baseline load-main.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Defaults of ``manage.py seed_crm``.
+SEED_USER_PREFIX = "seed-rep"
+SEED_PASSWORD = "seed-password"
+
+# Values of crm.models.LeadStatus and crm.models.InteractionType.
+LEAD_STATUSES = ("new", "contact", "proposal", "won", "lost")
+INTERACTION_TYPES = ("call", "email", "meeting", "note")
+
+API_RESOURCES = ("clients", "leads", "interactions")
+
+# Relative frequency of each action in a rep's session.
+SCENARIO_WEIGHTS = {
+    "dashboard": 2,
+    "browse_leads": 4,
+    "move_stage": 2,
+    "log_interaction": 2,
+    "page_api": 1,
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(samples: list[float], p: float) -> float:
+    """Linearly interpolated percentile of already sorted ``samples``."""
+    if not samples:
+        return 0.0
+    rank = (len(samples) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(samples) - 1)
+    return samples[low] + (samples[high] - samples[low]) * (rank - low)
+
+
+@dataclass
+class Recorder:
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: Counter[str] = field(default_factory=Counter)
+    statuses: dict[str, Counter[str]] = field(default_factory=lambda: defaultdict(Counter))
+
+    def add(self, endpoint: str, seconds: float, status: str, ok: bool) -> None:
+        self.latencies[endpoint].append(seconds * 1000)
+        self.statuses[endpoint][status] += 1
+        if not ok:
+            self.errors[endpoint] += 1
+
+    def _stats(self, samples: list[float], errors: int, elapsed: float) -> dict[str, Any]:
+        samples = sorted(samples)
+        stats: dict[str, Any] = {
+            "requests": len(samples),
+            "errors": errors,
+            "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+            "rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+            "mean_ms": round(sum(samples) / len(samples), 1) if samples else 0.0,
+            "max_ms": round(samples[-1], 1) if samples else 0.0,
+        }
+        for p in PERCENTILES:
+            stats[f"p{p}_ms"] = round(percentile(samples, p), 1)
+        return stats
+
+    def report(self, elapsed: float) -> dict[str, Any]:
+        endpoints = {
+            endpoint: {
+                **self._stats(samples, self.errors[endpoint], elapsed),
+                "statuses": dict(self.statuses[endpoint]),
+            }
+            for endpoint, samples in sorted(self.latencies.items())
+        }
+        everything = [sample for samples in self.latencies.values() for sample in samples]
+        return {
+            "total": self._stats(everything, sum(self.errors.values()), elapsed),
+            "endpoints": endpoints,
+        }
+
+
+class LoginFailed(Exception):
+    pass
+
+
+class Rep:
+    """One simulated user; ``client`` holds its session cookies."""
+
+    def __init__(
+        self, client: httpx.AsyncClient, recorder: Recorder, username: str, options
+    ) -> None:
+        self.client = client
+        self.recorder = recorder
+        self.username = username
+        self.options = options
+        self.lead_ids: list[int] = []
+        self.client_ids: list[int] = []
+        self.rng = random.Random(f"{options.seed}:{username}")
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        endpoint: str,
+        *,
+        expect: tuple[int, ...] = (200,),
+        **kwargs: Any,
+    ) -> httpx.Response | None:
+        headers = kwargs.pop("headers", {})
+        if method != "GET":
+            headers["X-CSRFToken"] = self.client.cookies.get("csrftoken", "")
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, headers=headers, **kwargs)
+        except httpx.HTTPError as exc:
+            self.recorder.add(endpoint, time.perf_counter() - started, type(exc).__name__, False)
+            return None
+        elapsed = time.perf_counter() - started
+        ok = response.status_code in expect and "/accounts/login/" not in response.headers.get(
+            "Location", ""
+        )
+        self.recorder.add(endpoint, elapsed, str(response.status_code), ok)
+        return response if ok else None
+
+    async def login(self) -> None:
+        await self.request("GET", "/accounts/login/", "GET /accounts/login/")
+        response = await self.request(
+            "POST",
+            "/accounts/login/",
+            "POST /accounts/login/",
+            data={"username": self.username, "password": self.options.password},
+            expect=(302,),
+        )
+        if response is None:
+            raise LoginFailed(self.username)
+        # The first feed pages tell which leads and clients this rep can act on.
+        self.lead_ids = [row["id"] for row in await self.page_api("leads", pages=1)]
+        self.client_ids = [row["id"] for row in await self.page_api("clients", pages=1)]
+
+    async def dashboard(self) -> None:
+        await self.request("GET", "/", "GET /")
+
+    async def browse_leads(self) -> None:
+        params: dict[str, Any] = {"page": self.rng.randint(1, 3)}
+        if self.rng.random() < 0.3:
+            params["status"] = self.rng.choice(LEAD_STATUSES)
+        await self.request("GET", "/crm/leads/", "GET /crm/leads/", params=params)
+
+    async def move_stage(self) -> None:
+        if not self.lead_ids:
+            return
+        await self.request(
+            "POST",
+            f"/crm/leads/{self.rng.choice(self.lead_ids)}/stage/",
+            "POST /crm/leads/<pk>/stage/",
+            data={"status": self.rng.choice(LEAD_STATUSES)},
+            expect=(302,),
+        )
+
+    async def log_interaction(self) -> None:
+        if not self.client_ids:
+            return
+        client_id = self.rng.choice(self.client_ids)
+        path = f"/crm/clients/{client_id}/interactions/new/"
+        endpoint = "/crm/clients/<pk>/interactions/new/"
+        await self.request("GET", path, f"GET {endpoint}")
+        await self.request(
+            "POST",
+            path,
+            f"POST {endpoint}",
+            data={
+                "client": client_id,
+                "interaction_type": self.rng.choice(INTERACTION_TYPES),
+                "subject": "Contato de teste de carga",
+                "notes": "Registrado por scripts/load_test.py.",
+                "occurred_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
+            },
+            expect=(302,),
+        )
+
+    async def page_api(self, resource: str | None = None, pages: int | None = None) -> list:
+        """Walk the change feed of ``resource``; returns the rows of every page read."""
+        resource = resource or self.rng.choice(API_RESOURCES)
+        path = f"/api/{resource}/changes/"
+        params: dict[str, Any] = {"limit": self.options.api_page_size}
+        rows = []
+        for _ in range(pages or self.options.api_pages):
+            response = await self.request("GET", path, f"GET {path}", params=params)
+            if response is None:
+                break
+            page = response.json()
+            rows += page["results"]
+            if not page["has_more"]:
+                break
+            params["cursor"] = page["cursor"]
+        return rows
+
+    async def run(self, deadline: float) -> None:
+        actions, weights = zip(*SCENARIO_WEIGHTS.items())
+        while time.monotonic() < deadline:
+            await getattr(self, self.rng.choices(actions, weights)[0])()
+            think = self.rng.expovariate(1 / self.options.think_time)
+            await asyncio.sleep(min(think, max(deadline - time.monotonic(), 0)))
+
+
+async def virtual_user(
+    index: int,
+    transport: httpx.AsyncHTTPTransport,
+    recorder: Recorder,
+    options,
+    deadline: float,
+) -> bool:
+    await asyncio.sleep(options.ramp_up * index / max(options.users, 1))
+    username = f"{options.user_prefix}-{index % options.reps + 1:03d}"
+    # Not closed here: closing a client would close the shared transport too.
+    client = httpx.AsyncClient(
+        base_url=options.base_url, transport=transport, timeout=options.timeout
+    )
+    rep = Rep(client, recorder, username, options)
+    try:
+        await rep.login()
+    except LoginFailed:
+        return False
+    await rep.run(deadline)
+    return True
+
+
+async def run(options) -> dict[str, Any]:
+    recorder = Recorder()
+    limits = httpx.Limits(
+        max_connections=options.connections, max_keepalive_connections=options.connections
+    )
+    async with httpx.AsyncHTTPTransport(limits=limits) as transport:
+        started = time.monotonic()
+        deadline = started + options.duration
+        logged_in = await asyncio.gather(
+            *(
+                virtual_user(index, transport, recorder, options, deadline)
+                for index in range(options.users)
+            )
+        )
+        elapsed = time.monotonic() - started
+    return {
+        "meta": {
+            "started_at": datetime.now(UTC).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "base_url": options.base_url,
+            "users": options.users,
+            "logged_in": sum(logged_in),
+            "duration_s": round(elapsed, 1),
+            "think_time_s": options.think_time,
+            "scenario_weights": SCENARIO_WEIGHTS,
+        },
+        **recorder.report(elapsed),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def print_report(report: dict[str, Any], baseline: dict[str, Any] | None) -> None:
+    meta = report["meta"]
+    print(
+        f"{meta['commit'] or '?'} · {meta['logged_in']}/{meta['users']} usuários · "
+        f"{meta['duration_s']} s · {meta['base_url']}"
+    )
+    header = f"{'endpoint':<44}{'req':>7}{'req/s':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'erros':>8}"
+    print(header)
+    rows = [*report["endpoints"].items(), ("TOTAL", report["total"])]
+    for endpoint, stats in rows:
+        print(
+            f"{endpoint:<44}{stats['requests']:>7}{stats['rps']:>8}{stats['p50_ms']:>8}"
+            f"{stats['p95_ms']:>8}{stats['p99_ms']:>8}{stats['error_rate']:>8.1%}"
+        )
+    if baseline is None:
+        return
+    print(f"\nComparado a {baseline['meta'].get('commit') or 'baseline'} (p95 e req/s):")
+    previous = {**baseline["endpoints"], "TOTAL": baseline["total"]}
+    for endpoint, stats in rows:
+        before = previous.get(endpoint)
+        if not before or not before["p95_ms"]:
+            continue
+        change = (stats["p95_ms"] - before["p95_ms"]) / before["p95_ms"]
+        print(
+            f"{endpoint:<44}p95 {before['p95_ms']:>8} → {stats['p95_ms']:<8} ({change:+.0%})  "
+            f"req/s {before['rps']} → {stats['rps']}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=20, help="Usuários simultâneos.")
+    parser.add_argument("--duration", type=float, default=60.0, help="Duração (s).")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="Tempo para iniciar todos (s).")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Pausa média entre ações.")
+    parser.add_argument("--reps", type=int, default=20, help="Vendedores do seed_crm a usar.")
+    parser.add_argument("--user-prefix", default=SEED_USER_PREFIX)
+    parser.add_argument("--password", default=SEED_PASSWORD)
+    parser.add_argument("--api-pages", type=int, default=3, help="Páginas da API por visita.")
+    parser.add_argument("--api-page-size", type=int, default=100)
+    parser.add_argument("--connections", type=int, default=100, help="Limite de conexões.")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", type=Path, help="Grava o relatório neste arquivo.")
+    parser.add_argument("--baseline", type=Path, help="Relatório JSON para comparação.")
+    options = parser.parse_args()
+
+    if not re.match(r"https?://", options.base_url):
+        parser.error("--base-url deve começar com http:// ou https://")
+    baseline = json.loads(options.baseline.read_text()) if options.baseline else None
+    report = asyncio.run(run(options))
+    if options.json:
+        options.json.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n")
+    print_report(report, baseline)
+    return 0 if report["meta"]["logged_in"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+"""Local webhook receiver for exercising ``manage.py run_webhook_dispatcher``.
+
+Accepts the dispatcher's batches and checks their ``X-CRM-Signature`` when a secret
+is given. It prints one JSON line per request and can inject failures, latency and
+``Retry-After`` so that retries, backoff and concurrency limits can be watched.
+It only uses the standard library and does not need Django.
+
+Usage::
+
+    python scripts/webhook_stub_server.py --port 8765 --secret <endpoint secret>
+    python scripts/webhook_stub_server.py --fail-rate 0.3 --status 503 --delay 0.2
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import hmac
+import json
+import random
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def signature_ok(secret: str, body: bytes, header: str, tolerance: int = 300) -> bool:
+    try:
+        parts = dict(item.split("=", 1) for item in header.split(","))
+        timestamp = int(parts["t"])
+    except (KeyError, ValueError):
+        return False
+    expected = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256)
+    fresh = abs(time.time() - timestamp) <= tolerance
+    return fresh and hmac.compare_digest(expected.hexdigest(), parts.get("v1", ""))
+
+
+class Stats:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.events = 0
+
+
+def make_handler(options: argparse.Namespace, stats: Stats) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:  # noqa: N802 - http.server naming
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with stats.lock:
+                stats.in_flight += 1
+                stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+            try:
+                time.sleep(options.delay)
+                valid = not options.secret or signature_ok(
+                    options.secret, body, self.headers.get("X-CRM-Signature", "")
+                )
+                events = json.loads(body or b"{}").get("events", [])
+                if not valid:
+                    status = 401
+                elif random.random() < options.fail_rate:
+                    status = options.status
+                else:
+                    status = 200
+                with stats.lock:
+                    stats.requests += 1
+                    stats.events += len(events) if status == 200 else 0
+                    line = {
+                        "path": self.path,
+                        "status": status,
+                        "events": [event["id"] for event in events],
+                        "signature_valid": valid,
+                        "in_flight": stats.in_flight,
+                        "accepted_events": stats.events,
+                    }
+                print(json.dumps(line), flush=True)
+                self.send_response(status)
+                if status != 200 and options.retry_after is not None:
+                    self.send_header("Retry-After", str(options.retry_after))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            finally:
+                with stats.lock:
+                    stats.in_flight -= 1
+
+        def log_message(self, *_: object) -> None:
+            pass
+
+    return Handler
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--secret", default="", help="Segredo do endpoint; vazio não valida.")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fração de falhas (0-1).")
+    parser.add_argument("--status", type=int, default=503, help="Status das falhas injetadas.")
+    parser.add_argument("--delay", type=float, default=0.0, help="Latência por requisição (s).")
+    parser.add_argument("--retry-after", type=int, help="Retry-After enviado nas falhas.")
+    options = parser.parse_args()
+
+    stats = Stats()
+    server = ThreadingHTTPServer((options.host, options.port), make_handler(options, stats))
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"Recebendo webhooks em http://{options.host}:{options.port}/", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(
+            json.dumps(
+                {
+                    "requests": stats.requests,
+                    "accepted_events": stats.events,
+                    "peak_in_flight": stats.peak_in_flight,
+                }
+            ),
+            file=sys.stderr,
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+const AUTOCOMPLETE_DELAY_MS = 200;
+
+/**
+ * Replace a `<select data-autocomplete-url>` with a search box backed by a datalist.
+ * The select stays in the form (hidden) and holds the chosen id.
+ *
+ * @param {HTMLSelectElement} select
+ */
+function setupAutocomplete(select) {
+    const url = select.dataset.autocompleteUrl;
+    const input = document.createElement("input");
+    const list = document.createElement("datalist");
+    list.id = `${select.id}-options`;
+    input.type = "search";
+    input.id = `${select.id}-search`;
+    input.className = select.className;
+    input.autocomplete = "off";
+    input.placeholder = "Digite para buscar…";
+    input.setAttribute("list", list.id);
+    input.required = select.required;
+    const current = select.selectedOptions[0];
+    input.value = current && current.value ? current.textContent.trim() : "";
+
+    /** @type {Map<string, {id: number, text: string}>} */
+    let choices = new Map();
+    let timer = 0;
+    /** @type {AbortController | null} */
+    let pending = null;
+
+    function choose(id, text) {
+        select.replaceChildren();
+        if (!select.required || id === "") {
+            select.append(new Option("", ""));
+        }
+        if (id !== "") {
+            select.append(new Option(text, String(id), true, true));
+        }
+        select.dispatchEvent(new Event("change", { bubbles: true }));
+    }
+
+    async function search(term) {
+        if (pending) pending.abort();
+        pending = new AbortController();
+        try {
+            const response = await fetch(`${url}?q=${encodeURIComponent(term)}`, {
+                headers: { Accept: "application/json" },
+                signal: pending.signal,
+            });
+            if (!response.ok) return;
+            const { results } = await response.json();
+            const seen = new Map(results.map((item) => [item.text, 0]));
+            results.forEach((item) => seen.set(item.text, seen.get(item.text) + 1));
+            choices = new Map();
+            list.replaceChildren(
+                ...results.map((item) => {
+                    // Repeated names (e.g. across owners) get their detail and id appended.
+                    const label = seen.get(item.text) > 1
+                        ? `${item.text} · ${item.detail || ""} #${item.id}`
+                        : item.text;
+                    choices.set(label, item);
+                    return new Option(item.detail || "", label);
+                }),
+            );
+        } catch (error) {
+            if (error.name !== "AbortError") throw error;
+        }
+    }
+
+    input.addEventListener("input", () => {
+        const picked = choices.get(input.value);
+        if (picked) {
+            choose(picked.id, picked.text);
+            return;
+        }
+        if (input.value.trim() === "") {
+            choose("", "");
+        }
+        window.clearTimeout(timer);
+        timer = window.setTimeout(() => search(input.value.trim()), AUTOCOMPLETE_DELAY_MS);
+    });
+
+    // Leaving the box without picking a suggestion restores the current choice.
+    input.addEventListener("change", () => {
+        if (choices.has(input.value)) return;
+        const selected = select.selectedOptions[0];
+        input.value = selected && selected.value ? selected.textContent.trim() : "";
+    });
+
+    select.hidden = true;
+    select.required = false;
+    select.after(input, list);
+    const label = document.querySelector(`label[for="${select.id}"]`);
+    if (label) label.htmlFor = input.id;
+}
+
+document.addEventListener("DOMContentLoaded", () => {
+    document.querySelectorAll("select[data-autocomplete-url]").forEach(setupAutocomplete);
+});